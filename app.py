@@ -5,15 +5,12 @@ from datetime import datetime
 
 from finance_ai.storage.db import init_db
 from finance_ai.storage.repository import TransactionRepository
-from finance_ai.ingestion.parser_csv import parse_csv
-from finance_ai.ingestion.parser_ofx import parse_ofx
-from finance_ai.processing.normalize import normalize_transactions
-from finance_ai.processing.dedupe import compute_hashes, filter_new_transactions
-from finance_ai.processing.enrich import enrich_transactions
-from finance_ai.intelligence.categorizer import categorize_transactions
+from finance_ai.ingestion.pipeline import IngestionPipeline
+from finance_ai.ingestion.batch import ingest_jobs, jobs_from_uploads
 from finance_ai.intelligence.insights import compute_insights
+from finance_ai.intelligence.ml_categorizer import train_in_background, train_model
 from finance_ai.intelligence.commentary import render_commentary
-from finance_ai.ui.components import render_overview_cards, render_charts, render_transactions_table
+from finance_ai.ui.components import render_overview_cards, render_charts, render_transactions_table, render_bank_profiles, render_near_duplicates, render_rules_editor, render_transfers
 from finance_ai.ui.portfolio.user_details import render_user_details
 from finance_ai.ui.portfolio.portfolios import render_current_portfolios
 from finance_ai.ui.portfolio.income import render_income
@@ -27,6 +24,9 @@ st.set_page_config(page_title="Finance AI Workbook", layout="wide")
 
 DATA_DIR = os.path.join(os.getcwd(), "data")
 DB_PATH = os.path.join(DATA_DIR, "finance.db")
+# Newest rows shown in the transactions table when not searching
+TABLE_ROWS = 5000
+UPLOAD_TYPES = ["csv", "ofx", "qfx", "parquet", "pq", "arrow", "feather", "ipc", "jsonl", "ndjson"]
 
 @st.cache_resource
 def get_repo():
@@ -89,43 +89,75 @@ if nav == "Portfolio Analysis":
 
 else:
     st.title("Spending Analyzer")
-    st.caption("Privacy-first: all data stays local. Upload CSV/OFX, get insights.")
+    st.caption("Privacy-first: all data stays local. Upload CSV/OFX/Parquet, get insights.")
 
     # Initialize repository when Spending Analyzer is active
     repo = get_repo()
 
     # Upload & Ingestion (moved from sidebar to main content)
     st.subheader("Upload Transactions")
-    uploaded = st.file_uploader("CSV or OFX/QFX", type=["csv", "ofx", "qfx"]) 
+    uploaded = st.file_uploader("CSV, OFX/QFX, Parquet, Arrow or JSON Lines", type=UPLOAD_TYPES)
     commit_btn = st.button("Ingest Uploaded File")
 
     if uploaded is not None and commit_btn:
-        ext = os.path.splitext(uploaded.name)[1].lower()
         try:
-            if ext == ".csv":
-                df = parse_csv(uploaded)
-            elif ext in (".ofx", ".qfx"):
-                df = parse_ofx(uploaded)
-            else:
-                st.error("Unsupported file type.")
-                df = None
-            if df is not None and not df.empty:
-                df = normalize_transactions(df)
-                df = compute_hashes(df)
-                existing = set(repo.get_existing_hashes())
-                df_new = filter_new_transactions(df, existing)
-                if df_new.empty:
-                    st.info("No new transactions found (deduplicated).")
-                else:
-                    df_new = enrich_transactions(df_new)
-                    df_new = categorize_transactions(df_new)
-                    inserted = repo.insert_transactions(df_new)
-                    st.success(f"Ingested {inserted} new transactions.")
-            else:
+            # Files are streamed in row chunks to keep memory flat
+            pipeline = IngestionPipeline(repo)
+            inserted, skipped = pipeline.ingest(uploaded)
+            for warning in pipeline.warnings:
+                st.warning(warning)
+            if inserted == 0 and skipped == 0:
                 st.warning("No transactions parsed from file.")
+            elif inserted == 0:
+                st.info("No new transactions found (deduplicated).")
+            else:
+                st.success(f"Ingested {inserted} new transactions.")
+                # New rule labels may have arrived; update the fallback category model off the UI thread
+                train_in_background(repo)
         except Exception as e:
             st.exception(e)
 
+    # Batch import: statements are prepared in parallel worker processes
+    with st.expander("Batch import (multiple statements or .zip archives)"):
+        batch_files = st.file_uploader(
+            "Statements or ZIP archives",
+            type=UPLOAD_TYPES + ["zip"],
+            accept_multiple_files=True,
+            key="batch_upload",
+        )
+        if batch_files and st.button("Ingest Batch"):
+            try:
+                jobs = jobs_from_uploads((f.name, f.getvalue()) for f in batch_files)
+                result = ingest_jobs(jobs, repo)
+                st.success(
+                    f"Processed {result['files']} statements: {result['inserted']} new transactions, "
+                    f"{result['skipped']} duplicates skipped."
+                )
+                for name, error in result['errors'] + result['warnings']:
+                    st.warning(f"{name}: {error}")
+                if result['inserted']:
+                    train_in_background(repo)
+            except Exception as e:
+                st.exception(e)
+
+    with st.expander("Bank profiles (learned CSV layouts)"):
+        render_bank_profiles(repo)
+
+    with st.expander("Categorization rules"):
+        render_rules_editor(repo)
+
+    with st.expander("Category model (local fallback for uncategorized rows)"):
+        st.caption("Trained on rule-categorized descriptions and your corrections; it only fills rows the rules leave uncategorized.")
+        if st.button("Retrain from scratch"):
+            result = train_model(repo, full=True)
+            st.success(f"Trained on {result['trained_on']} labelled descriptions.")
+
+    with st.expander("Possible duplicates (same charge in overlapping statements)"):
+        render_near_duplicates(repo)
+
+    with st.expander("Linked transfers (left out of spend and income)"):
+        render_transfers(repo)
+
     # Filters
     st.subheader("Filters")
     col1, col2, col3 = st.columns(3)
@@ -134,13 +166,18 @@ else:
     with col2:
         end_date = st.date_input("End date", value=datetime.now().date())
     with col3:
-        category_filter = st.text_input("Category contains", value="")
+        search = st.text_input("Search", value="", placeholder='e.g. coffee, "whole foods", uber')
 
-    # Data fetch
-    df_all = repo.fetch_transactions(start_date=start_date, end_date=end_date, category_contains=category_filter)
+    # Data fetch: a search narrows the rows, so its metrics come from the matches;
+    # otherwise they come from the monthly rollups and only the newest rows are read
+    if search:
+        df_all = repo.fetch_transactions(start_date=start_date, end_date=end_date, search=search)
+        metrics = compute_insights(df_all)
+    else:
+        df_all = repo.fetch_transactions(start_date=start_date, end_date=end_date, order_by='date', descending=True, limit=TABLE_ROWS)
+        metrics = compute_insights(repo=repo, start_date=start_date, end_date=end_date)
 
     # Overview cards
-    metrics = compute_insights(df_all)
     render_overview_cards(metrics)
 
     # Charts
@@ -153,4 +190,10 @@ else:
 
     # Table
     st.subheader("Transactions")
-    render_transactions_table(df_all)
+    if search:
+        st.caption("Best matches first")
+        render_transactions_table(repo.search_transactions(search, start_date=start_date, end_date=end_date), ranked=True, repo=repo)
+    else:
+        if len(df_all) == TABLE_ROWS:
+            st.caption(f"Newest {TABLE_ROWS:,} transactions")
+        render_transactions_table(df_all, repo=repo)
@@ -1,6 +1,33 @@
+import os
+from typing import Optional
+
 from pydantic import BaseModel
 
 class AppConfig(BaseModel):
     db_echo: bool = False
+    # SQLite page cache per connection; index inserts for large imports stay in memory
+    sqlite_cache_mb: int = 64
+    # Rows per transaction for bulk inserts
+    insert_batch_rows: int = 100_000
+    # Inserts at least this large, and at least as large as the table, run as
+    # one transaction with secondary indexes and search indexing rebuilt after
+    bulk_load_rows: int = 200_000
+    # Local fallback category model (see intelligence/ml_categorizer.py)
+    category_model_path: str = os.path.join("data", "category_model.npz")
+    # Model predictions below this probability stay Uncategorized
+    category_min_confidence: float = 0.6
+    # LLM fallback (see intelligence/llm_categorizer.py); any chat-completions
+    # URL, e.g. the local stand-in at http://127.0.0.1:8765/v1/chat/completions.
+    # Off when unset.
+    llm_endpoint: Optional[str] = os.environ.get("FINANCE_AI_LLM_ENDPOINT")
+    # Sent as "Authorization: Bearer <key>" when set
+    llm_api_key: Optional[str] = os.environ.get("FINANCE_AI_LLM_API_KEY")
+    llm_model: str = "local"
+    llm_batch_size: int = 50
+    llm_concurrency: int = 4
+    llm_max_retries: int = 3
+    llm_timeout: float = 30.0
+    # After the endpoint is found unreachable, skip it for this long (seconds)
+    llm_down_seconds: float = 60.0
 
 CONFIG = AppConfig()
@@ -0,0 +1,236 @@
+import argparse
+import io
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from finance_ai.ingestion.parser_csv import parse_csv
+from finance_ai.ingestion.parser_ofx import parse_ofx
+from finance_ai.ingestion.parser_arrow import ARROW_FORMATS, arrow_format, parse_arrow
+from finance_ai.ingestion.manifest import bytes_fingerprint, drop_covered, file_fingerprint, spans_range, update_spans
+from finance_ai.ingestion.profiles import BankProfile, profile_for
+from finance_ai.ingestion.pipeline import IngestionPipeline, copy_on_write, dropped_warning
+from finance_ai.processing.dedupe import compute_hashes
+
+# Batch ingestion: statements are parsed and prepared in a process pool, and a
+# single writer (the calling process) dedupes and inserts through the repository.
+
+STATEMENT_EXTS = (".csv", ".ofx", ".qfx") + tuple(ARROW_FORMATS)
+
+# (display name, file or archive path, archive member, in-memory bytes)
+Job = Tuple[str, Optional[str], Optional[str], Optional[bytes]]
+
+
+def _is_statement(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in STATEMENT_EXTS
+
+
+def _is_zip(name: str) -> bool:
+    return name.lower().endswith(".zip")
+
+
+def _member_names(zf: zipfile.ZipFile) -> List[str]:
+    return [
+        info.filename for info in zf.infolist()
+        if not info.is_dir() and not info.filename.startswith("__MACOSX/") and _is_statement(info.filename)
+    ]
+
+
+def discover_statements(path: str) -> List[Job]:
+    """List statement jobs under a directory, a .zip archive, or a single file."""
+    if os.path.isdir(path):
+        jobs: List[Job] = []
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for f in sorted(files):
+                if _is_zip(f) or _is_statement(f):
+                    jobs.extend(discover_statements(os.path.join(root, f)))
+        return jobs
+    if _is_zip(path):
+        with zipfile.ZipFile(path) as zf:
+            return [(f"{os.path.basename(path)}:{m}", path, m, None) for m in _member_names(zf)]
+    if _is_statement(path):
+        return [(path, path, None, None)]
+    raise ValueError(f"Unsupported batch source: {path}")
+
+
+def jobs_from_uploads(files: Iterable[Tuple[str, bytes]]) -> List[Job]:
+    """Build jobs from uploaded (name, bytes) pairs; .zip uploads are read member by member."""
+    jobs: List[Job] = []
+    for name, data in files:
+        if _is_zip(name):
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                jobs.extend((f"{name}:{m}", None, m, zf.read(m)) for m in _member_names(zf))
+        elif _is_statement(name):
+            jobs.append((name, None, None, data))
+    return jobs
+
+
+# Set in each worker by _init_worker: manifest state at the start of the batch
+_KNOWN_FILES: set = set()
+_WINDOWS: dict = {}
+_PROFILES: dict = {}
+
+
+def _init_worker(known_files: set, windows: dict, profiles: dict) -> None:
+    global _KNOWN_FILES, _WINDOWS, _PROFILES
+    _KNOWN_FILES = known_files
+    _WINDOWS = windows
+    _PROFILES = profiles
+
+
+def _parse(name: str, fh) -> Tuple[pd.DataFrame, Optional[BankProfile], bool, Optional[str]]:
+    # Returns (frame, bank profile, whether the profile was newly inferred, why
+    # a stored profile was set aside). fh may be a path: Arrow formats
+    # memory-map it, the rest open it here.
+    fmt = arrow_format(name)
+    if fmt is not None:
+        return parse_arrow(fh, fmt), None, False, None
+    if isinstance(fh, str):
+        with open(fh, "rb") as f:
+            return _parse(name, f)
+    if os.path.splitext(name)[1].lower() == ".csv":
+        profile, is_new, mismatch = profile_for(fh, _PROFILES.get)
+        return parse_csv(fh, profile), profile, is_new, mismatch
+    return parse_ofx(fh), None, False, None
+
+
+def _fingerprint(path: Optional[str], member: Optional[str], data: Optional[bytes]) -> Tuple[str, int]:
+    if data is not None:
+        return bytes_fingerprint(data)
+    if member is not None:
+        with zipfile.ZipFile(path) as zf, zf.open(member) as fh:
+            return file_fingerprint(fh)
+    with open(path, "rb") as fh:
+        return file_fingerprint(fh)
+
+
+def _prepare_statement(job: Job) -> dict:
+    # Runs in a worker process: fingerprint -> parse -> normalize -> hash.
+    # Stages run in the writer, after dedupe, next to the resolution cache.
+    name, path, member, data = job
+    pipeline = IngestionPipeline()
+    out = {'fingerprint': None, 'df': None, 'spans': {}, 'covered': 0, 'profile': None, 'error': None, 'warnings': []}
+    try:
+        out['fingerprint'] = _fingerprint(path, member, data)
+        if out['fingerprint'][0] in _KNOWN_FILES:
+            return out
+        if data is not None:
+            df, profile, is_new, mismatch = _parse(member or name, io.BytesIO(data))
+        elif member is not None:
+            with zipfile.ZipFile(path) as zf, zf.open(member) as fh:
+                df, profile, is_new, mismatch = _parse(member, fh)
+        else:
+            df, profile, is_new, mismatch = _parse(path, path)
+        if is_new:
+            out['profile'] = profile.model_dump()
+        if mismatch is not None:
+            out['warnings'].append(f"{mismatch}; the layout was inferred from this file instead.")
+        if df is None or df.empty:
+            return out
+        with copy_on_write():
+            df = pipeline.normalize(df, profile)
+            if df.attrs.get('dropped'):
+                out['warnings'].append(dropped_warning(df.attrs['dropped']))
+            if df.empty:
+                return out
+            update_spans(out['spans'], df)
+            fresh = drop_covered(df, _WINDOWS)
+            out['covered'] = len(df) - len(fresh)
+            if fresh.empty:
+                return out
+            out['df'] = compute_hashes(fresh)
+    except Exception as e:
+        out['error'] = str(e)
+    return out
+
+
+def ingest_jobs(jobs: List[Job], repo, max_workers: Optional[int] = None) -> dict:
+    """Prepare statements in parallel and insert new rows from a single writer.
+
+    Returns a dict with files, inserted, skipped, files_skipped (exact repeats
+    found in the ingest manifest), transfers (pairs linked), errors [(name, message)]
+    and warnings [(name, message)] for problems that did not stop a file.
+    """
+    result = {'files': len(jobs), 'inserted': 0, 'skipped': 0, 'files_skipped': 0, 'transfers': 0, 'errors': [], 'warnings': []}
+    if not jobs:
+        return result
+    known = repo.get_known_file_hashes()
+    windows = repo.get_covered_windows()
+    profiles = {p['signature']: p for p in repo.list_profiles()}
+    pipeline = IngestionPipeline(repo)
+    touched = {}  # spans of files that inserted rows, for transfer matching
+    initargs = (set(known), windows, profiles)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=initargs) as pool:
+        # map keeps submission order so the writer is deterministic
+        for job, out in zip(jobs, pool.map(_prepare_statement, jobs)):
+            if out['error'] is not None:
+                result['errors'].append((job[0], out['error']))
+                continue
+            result['warnings'].extend((job[0], w) for w in out['warnings'])
+            learned = out['profile']
+            if learned is not None and learned['signature'] not in profiles:
+                repo.save_profile(learned)
+                profiles[learned['signature']] = learned
+            content_hash, size = out['fingerprint']
+            if content_hash in known:
+                result['files_skipped'] += 1
+                result['skipped'] += repo.get_ingested_file_rows(content_hash) or 0
+                continue
+            result['skipped'] += out['covered']
+            df = out['df']
+            if df is not None:
+                # Windows may have grown from earlier files in this batch
+                fresh = drop_covered(df, windows)
+                new = pipeline.dedupe(fresh) if not fresh.empty else fresh
+                added = repo.insert_transactions(pipeline.apply_stages(new)) if not new.empty else 0
+                result['inserted'] += added
+                if added:
+                    touched[content_hash] = spans_range(out['spans'])
+                result['skipped'] += len(df) - added
+            repo.record_ingested_file(content_hash, size, job[0], out['spans'])
+            known.add(content_hash)
+            for account, (_, date_min, date_max) in out['spans'].items():
+                if account is not None:
+                    windows.setdefault(account, []).append((date_min, date_max))
+    repo.flush_key_filter()
+    if touched:
+        # One pass over the batch's date range pairs transfers across its files
+        result['transfers'] = repo.link_transfers(
+            min(r[0] for r in touched.values()), max(r[1] for r in touched.values())
+        )
+    return result
+
+
+def ingest_path(path: str, repo, max_workers: Optional[int] = None) -> dict:
+    return ingest_jobs(discover_statements(path), repo, max_workers=max_workers)
+
+
+def main():
+    from finance_ai.storage.db import init_db
+    from finance_ai.storage.repository import TransactionRepository
+
+    ap = argparse.ArgumentParser(description="Ingest a directory or .zip of CSV/OFX/QFX statements.")
+    ap.add_argument("path", help="Directory, .zip archive, or single statement file")
+    ap.add_argument("--db", default=os.path.join("data", "finance.db"), help="SQLite database path")
+    ap.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = ap.parse_args()
+
+    engine, SessionLocal = init_db(os.path.abspath(args.db))
+    repo = TransactionRepository(engine=engine, SessionLocal=SessionLocal)
+    result = ingest_path(args.path, repo, max_workers=args.workers)
+    print(
+        f"Files: {result['files']} ({result['files_skipped']} already ingested)  "
+        f"Inserted: {result['inserted']}  Skipped: {result['skipped']}"
+    )
+    for name, error in result['errors']:
+        print(f"  error in {name}: {error}")
+    for name, warning in result['warnings']:
+        print(f"  warning for {name}: {warning}")
+
+
+if __name__ == "__main__":
+    main()
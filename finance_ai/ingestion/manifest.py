@@ -0,0 +1,80 @@
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# File-level fingerprints and date-span bookkeeping for the ingest manifest.
+
+HASH_READ_BYTES = 1024 * 1024
+
+# account -> [row_count, date_min, date_max]
+Spans = Dict[Optional[str], list]
+# account -> [(date_min, date_max), ...]
+Windows = Dict[Optional[str], List[Tuple[pd.Timestamp, pd.Timestamp]]]
+
+
+def file_fingerprint(fh) -> Tuple[str, int]:
+    """Return (sha256 hex, size in bytes) of a file-like object, leaving its position unchanged."""
+    start = fh.tell()
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        block = fh.read(HASH_READ_BYTES)
+        if not block:
+            break
+        digest.update(block)
+        size += len(block)
+    fh.seek(start)
+    return digest.hexdigest(), size
+
+
+def bytes_fingerprint(data: bytes) -> Tuple[str, int]:
+    return hashlib.sha256(data).hexdigest(), len(data)
+
+
+def _account_key(value) -> Optional[str]:
+    return None if pd.isna(value) else str(value)
+
+
+def update_spans(spans: Spans, df: pd.DataFrame) -> Spans:
+    """Fold the per-account row count and date span of a normalized frame into ``spans``."""
+    grouped = df.groupby(df['account'].astype(object), dropna=False)['date'].agg(['count', 'min', 'max'])
+    for account, row in grouped.iterrows():
+        key = _account_key(account)
+        if key in spans:
+            cur = spans[key]
+            spans[key] = [cur[0] + int(row['count']), min(cur[1], row['min']), max(cur[2], row['max'])]
+        else:
+            spans[key] = [int(row['count']), row['min'], row['max']]
+    return spans
+
+
+def spans_range(spans: Spans) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
+    """Earliest and latest date over all accounts, or None for no rows."""
+    if not spans:
+        return None
+    return min(s[1] for s in spans.values()), max(s[2] for s in spans.values())
+
+
+def drop_covered(df: pd.DataFrame, windows: Windows) -> pd.DataFrame:
+    """Drop rows whose date falls strictly inside a window already ingested for the same account.
+
+    Boundary days are kept so a statement exported mid-day is still topped up;
+    row-level dedupe catches any repeats there. Rows without an account are
+    never dropped here: files that name no account may be different cards,
+    so only the row-level key dedupe applies to them.
+    """
+    if df.empty or not windows:
+        return df
+    covered = pd.Series(False, index=df.index)
+    day = df['date'].dt.normalize()
+    accounts = df['account'].astype(object)
+    for account, spans in windows.items():
+        if account is None:
+            continue
+        in_account = accounts.notna() & (accounts.astype(str) == account)
+        if not in_account.any():
+            continue
+        for date_min, date_max in spans:
+            covered |= in_account & (day > date_min.normalize()) & (day < date_max.normalize())
+    return df[~covered]
@@ -0,0 +1,126 @@
+import os
+from typing import Dict, Iterator, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.json as pa_json
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for Arrow-native formats
+    pa = None
+
+from finance_ai.ingestion.parser_csv import CANONICAL_COLUMNS, COLUMN_ALIASES, DEFAULT_CHUNK_ROWS, _find_col
+
+# Parquet, Arrow IPC and JSON Lines parsers returning canonical columns.
+# Columns are projected and renamed on the Arrow side and handed to pandas
+# as Arrow-backed dtypes, so values never round-trip through Python objects.
+
+ARROW_FORMATS = {
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'ipc',
+    '.feather': 'ipc',
+    '.ipc': 'ipc',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required to import Parquet, Arrow or JSON Lines files (pip install pyarrow).")
+
+
+def _open(source):
+    # Paths are memory-mapped; in-memory uploads are wrapped without copying
+    if isinstance(source, (str, os.PathLike)):
+        return pa.memory_map(os.fspath(source), 'r')
+    if hasattr(source, 'getbuffer'):
+        return pa.BufferReader(pa.py_buffer(source.getbuffer()))
+    return pa.BufferReader(source.read())
+
+
+def _canonical_mapping(names) -> Dict[str, str]:
+    mapping = {}
+    for key, aliases in COLUMN_ALIASES.items():
+        col = _find_col(names, aliases)
+        if col is not None:
+            mapping[col] = key
+    present = set(mapping.values())
+    for req in ["date", "description", "amount"]:
+        if req not in present:
+            raise ValueError(f"File missing required column: {req}")
+    return mapping
+
+
+def _to_frame(table, mapping: Dict[str, str]) -> pd.DataFrame:
+    order = sorted(mapping, key=lambda src: CANONICAL_COLUMNS.index(mapping[src]))
+    table = table.select(order).rename_columns([mapping[src] for src in order])
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def _iter_batches(source, fmt: str, chunksize: int):
+    # Yields (record batch or table, column mapping)
+    if fmt == 'parquet':
+        pf = pq.ParquetFile(_open(source))
+        mapping = _canonical_mapping(pf.schema_arrow.names)
+        for batch in pf.iter_batches(batch_size=chunksize, columns=list(mapping)):
+            yield batch, mapping
+    elif fmt == 'ipc':
+        buf = _open(source)
+        try:
+            reader = pa.ipc.open_file(buf)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        except pa.ArrowInvalid:
+            buf.seek(0)
+            reader = pa.ipc.open_stream(buf)
+            batches = iter(reader)
+        mapping = _canonical_mapping(reader.schema.names)
+        for batch in batches:
+            for part in pa.Table.from_batches([batch]).to_batches(max_chunksize=chunksize):
+                yield part, mapping
+    elif fmt == 'jsonl':
+        table = pa_json.read_json(_open(source))
+        mapping = _canonical_mapping(table.column_names)
+        table = table.select(list(mapping))
+        for batch in table.to_batches(max_chunksize=chunksize):
+            yield batch, mapping
+    else:
+        raise ValueError(f"Unsupported Arrow format: {fmt}")
+
+
+def arrow_format(name: str) -> Optional[str]:
+    return ARROW_FORMATS.get(os.path.splitext(name)[1].lower())
+
+
+def iter_arrow_chunks(source, fmt: str, chunksize: int = DEFAULT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Yield canonical-column frames of at most ``chunksize`` rows from a Parquet, IPC or JSONL source.
+
+    ``source`` is a path (memory-mapped) or a BytesIO-like upload.
+    """
+    _require_pyarrow()
+    for batch, mapping in _iter_batches(source, fmt, chunksize):
+        if batch.num_rows:
+            yield _to_frame(pa.Table.from_batches([batch]), mapping)
+
+
+def parse_arrow(source, fmt: str) -> pd.DataFrame:
+    _require_pyarrow()
+    batches = list(_iter_batches(source, fmt, chunksize=DEFAULT_CHUNK_ROWS))
+    if not batches:
+        return pd.DataFrame()
+    mapping = batches[0][1]
+    return _to_frame(pa.Table.from_batches([b for b, _ in batches]), mapping)
+
+
+def parse_parquet(source) -> pd.DataFrame:
+    return parse_arrow(source, 'parquet')
+
+
+def parse_arrow_ipc(source) -> pd.DataFrame:
+    return parse_arrow(source, 'ipc')
+
+
+def parse_jsonl(source) -> pd.DataFrame:
+    return parse_arrow(source, 'jsonl')
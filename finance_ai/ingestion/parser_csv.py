@@ -1,6 +1,16 @@
+import codecs
+import csv
 import io
+from typing import Iterator, List, Optional, Tuple
+
 import pandas as pd
 
+try:
+    import pyarrow  # noqa: F401  (multithreaded columnar CSV engine)
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
 # Expected columns (flexible): date, description, amount, type, account, currency
 # We'll try to infer common variants.
 
@@ -13,6 +23,22 @@ COLUMN_ALIASES = {
     'currency': ['currency', 'cur', 'ccy']
 }
 
+CANONICAL_COLUMNS = ["date", "description", "amount", "type", "account", "currency"]
+
+# Rows per chunk for streaming ingestion; keeps peak memory flat for large exports.
+DEFAULT_CHUNK_ROWS = 50_000
+
+# Bytes inspected to pick the encoding and delimiter before parsing.
+SNIFF_BYTES = 64 * 1024
+SNIFF_DELIMITERS = ",;\t|"
+# Bytes decoded per read when streaming a file through _Utf8Reader
+READ_BLOCK_BYTES = 1024 * 1024
+
+# Canonical columns the C engine reads as text. Amount is left to its numeric parser
+# so malformed values are still coerced (and dropped) during normalization.
+TEXT_COLUMNS = ['date', 'description', 'type', 'account', 'currency']
+
+
 def _find_col(cols, aliases):
     cols_lower = {c.lower(): c for c in cols}
     for a in aliases:
@@ -20,28 +46,16 @@ def _find_col(cols, aliases):
             return cols_lower[a]
     return None
 
-def parse_csv(uploaded_file) -> pd.DataFrame:
-    # uploaded_file is a BytesIO-like object from Streamlit
-    content = uploaded_file.read()
-    # Try utf-8 then fallback to latin-1
-    for enc in ("utf-8", "latin-1"):
-        try:
-            df = pd.read_csv(io.BytesIO(content), encoding=enc)
-            break
-        except Exception:
-            df = None
-    if df is None:
-        raise ValueError("Could not parse CSV with utf-8 or latin-1.")
-    if df.empty:
-        return df
 
-    # Map to canonical columns
-    mapping = {}
-    for key, aliases in COLUMN_ALIASES.items():
-        col = _find_col(df.columns, aliases)
-        if col is not None:
-            mapping[col] = key
-    df = df.rename(columns=mapping)
+def _canonicalize(df: pd.DataFrame, mapping: Optional[dict] = None) -> pd.DataFrame:
+    # Map to canonical columns (a bank profile supplies the mapping directly)
+    if mapping is None:
+        mapping = {}
+        for key, aliases in COLUMN_ALIASES.items():
+            col = _find_col(df.columns, aliases)
+            if col is not None:
+                mapping[col] = key
+    df = df.rename(columns={src: key for src, key in mapping.items() if src in df.columns})
 
     # Ensure required columns exist
     for req in ["date", "description", "amount"]:
@@ -49,5 +63,186 @@ def parse_csv(uploaded_file) -> pd.DataFrame:
             raise ValueError(f"CSV missing required column: {req}")
 
     # Keep canonical subset
-    keep = [c for c in ["date", "description", "amount", "type", "account", "currency"] if c in df.columns]
+    keep = [c for c in CANONICAL_COLUMNS if c in df.columns]
     return df[keep].copy()
+
+
+def _detect_encoding(sample: bytes) -> str:
+    try:
+        sample.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sample is still utf-8
+        if e.reason == "unexpected end of data" and e.start >= len(sample) - 3:
+            return "utf-8"
+        return "latin-1"
+
+
+def _latin1_fallback(exc: UnicodeDecodeError):
+    # Bytes that are not valid utf-8 are read as latin-1, so a stray byte past
+    # the sniffed prefix cannot abort an ingest halfway through
+    return exc.object[exc.start:exc.end].decode("latin-1"), exc.end
+
+
+DECODE_ERRORS = "latin1_fallback"
+codecs.register_error(DECODE_ERRORS, _latin1_fallback)
+
+
+class _Utf8Reader(io.RawIOBase):
+    """Binary stream of ``raw`` decoded from ``encoding`` and re-encoded as utf-8.
+
+    Decoding is incremental, so characters split across reads are kept, and
+    invalid bytes fall back to latin-1 instead of raising. A leading BOM is dropped.
+    """
+
+    def __init__(self, raw, encoding: str):
+        self._raw = raw
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig" if encoding == "utf-8" else encoding)(DECODE_ERRORS)
+        self._pending = memoryview(b"")
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending and not self._eof:
+            block = self._raw.read(READ_BLOCK_BYTES)
+            self._eof = not block
+            self._pending = memoryview(self._decoder.decode(block, final=self._eof).encode("utf-8"))
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+def utf8_stream(raw, encoding: str) -> io.BufferedReader:
+    """Buffered utf-8 view of a binary file in ``encoding`` (see ``_Utf8Reader``)."""
+    return io.BufferedReader(_Utf8Reader(raw, encoding), READ_BLOCK_BYTES)
+
+
+def _sniff(sample: bytes) -> Tuple[str, str, List[str]]:
+    """Return (encoding, delimiter, header) inferred from the first bytes of a file."""
+    encoding = _detect_encoding(sample)
+    lines = sample.decode(encoding, errors="ignore").lstrip("\ufeff").splitlines()
+    if len(sample) >= SNIFF_BYTES and len(lines) > 1:
+        lines = lines[:-1]  # last line may be cut off
+    if not lines:
+        return encoding, ",", []
+    try:
+        delimiter = csv.Sniffer().sniff("\n".join(lines[:50]), delimiters=SNIFF_DELIMITERS).delimiter
+    except csv.Error:
+        delimiter = ","
+    header = next(csv.reader([lines[0]], delimiter=delimiter), [])
+    return encoding, delimiter, header
+
+
+def _dtype_hints(header: List[str]) -> dict:
+    hints = {}
+    for key in TEXT_COLUMNS:
+        col = _find_col(header, COLUMN_ALIASES[key])
+        if col is not None:
+            hints[col] = str
+    return hints
+
+
+def _read_options(header: List[str], profile=None) -> dict:
+    if profile is None:
+        return {'dtype': _dtype_hints(header)}
+    source_of = {key: src for src, key in profile.mapping.items()}
+    options = {
+        'dtype': {source_of[key]: str for key in TEXT_COLUMNS if key in source_of},
+        'decimal': profile.decimal,
+    }
+    if profile.thousands:
+        options['thousands'] = profile.thousands
+    return options
+
+
+def _csv_engine(options: dict) -> str:
+    # pyarrow has no thousands-separator support, and reads every column as text
+    # (see _arrow_frames), so profiles with locale number formats use the C parser
+    if 'thousands' in options or options.get('decimal', '.') != '.':
+        return "c"
+    return CSV_ENGINE
+
+
+def _arrow_frames(source, delimiter: str, header: List[str], chunksize: Optional[int]) -> Iterator[pd.DataFrame]:
+    # Every column is read as text: a streaming reader fixes column types from
+    # its first block and would fail on a malformed amount further down, while
+    # text amounts are coerced (and bad ones dropped) during normalization
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    parse = pa_csv.ParseOptions(delimiter=delimiter)
+    convert = pa_csv.ConvertOptions(column_types={c: pa.string() for c in header}, strings_can_be_null=True)
+    if chunksize is None:
+        yield pa_csv.read_csv(source, parse_options=parse, convert_options=convert).to_pandas()
+        return
+    batches, rows = [], 0
+    for batch in pa_csv.open_csv(source, parse_options=parse, convert_options=convert):
+        batches.append(batch)
+        rows += batch.num_rows
+        while rows >= chunksize:
+            table = pa.Table.from_batches(batches)
+            yield table.slice(0, chunksize).to_pandas()
+            rest = table.slice(chunksize)
+            batches, rows = rest.to_batches(), rest.num_rows
+    if rows:
+        yield pa.Table.from_batches(batches).to_pandas()
+
+
+def _read_frames(fh, chunksize: Optional[int] = None, profile=None) -> Iterator[pd.DataFrame]:
+    """Raw frames of a CSV (one frame when ``chunksize`` is None), shared by both readers.
+
+    Encoding and delimiter are sniffed from a prefix and the bytes are decoded
+    through ``utf8_stream``. The pyarrow engine is used when installed and the
+    number format allows; if it rejects the file before anything was yielded,
+    the C engine reads it again from the start.
+    """
+    start = fh.tell()
+    encoding, delimiter, header = _sniff(fh.read(SNIFF_BYTES))
+    options = _read_options(header, profile)
+    engines = [_csv_engine(options)]
+    if engines[0] != "c":
+        engines.append("c")
+    for engine in engines:
+        fh.seek(start)
+        source = utf8_stream(fh, encoding)
+        yielded = False
+        try:
+            if engine == "pyarrow":
+                for frame in _arrow_frames(source, delimiter, header, chunksize):
+                    yielded = True
+                    yield frame
+                return
+            reader = pd.read_csv(source, encoding="utf-8", sep=delimiter, chunksize=chunksize, **options)
+            if chunksize is None:
+                yield reader
+                return
+            with reader:
+                for frame in reader:
+                    yielded = True
+                    yield frame
+            return
+        except pd.errors.EmptyDataError:
+            raise ValueError("Could not parse CSV: file is empty.")
+        except Exception as exc:
+            if yielded or engine == engines[-1]:
+                raise ValueError(f"Could not parse CSV: {exc}") from exc
+
+
+def parse_csv(uploaded_file, profile=None) -> pd.DataFrame:
+    # uploaded_file is a BytesIO-like object from Streamlit; profile is an
+    # optional BankProfile that replaces column and number-format inference.
+    df = next(_read_frames(uploaded_file, profile=profile))
+    if df.empty:
+        return df
+    return _canonicalize(df, profile.mapping if profile else None)
+
+
+def iter_csv_chunks(uploaded_file, chunksize: int = DEFAULT_CHUNK_ROWS, profile=None) -> Iterator[pd.DataFrame]:
+    """Yield canonical-column frames of at most ``chunksize`` rows without reading the whole file."""
+    for chunk in _read_frames(uploaded_file, chunksize, profile):
+        if chunk.empty:
+            continue
+        yield _canonicalize(chunk, profile.mapping if profile else None)
@@ -1,20 +1,123 @@
+import codecs
+import html
+import re
+from typing import Iterator, Optional
+
 import pandas as pd
-from ofxparse import OfxParser
 
-# Minimal OFX/QFX parser returning canonical columns
+# Streaming OFX/QFX parser returning canonical columns.
+# Works on both SGML (OFX 1.x, unclosed leaf tags) and XML (OFX 2.x) files by
+# scanning tags as a stream. Only <STMTTRN> blocks and the enclosing account id
+# and currency are kept, so no document tree is built.
+
+READ_BYTES = 1024 * 1024
+DEFAULT_CHUNK_ROWS = 50_000
+
+_TAG_RE = re.compile(r"<(/?)([A-Za-z0-9_.]+)>([^<]*)")
+_TXN_FIELDS = ("TRNTYPE", "DTPOSTED", "TRNAMT", "NAME", "MEMO")
+
+
+def _detect_encoding(head: bytes) -> str:
+    m = re.search(rb'encoding="([A-Za-z0-9_-]+)"', head) or re.search(rb"ENCODING:\s*([A-Za-z0-9_-]+)", head)
+    if m and m.group(1).upper().replace(b"-", b"") == b"UTF8":
+        return "utf-8"
+    m = re.search(rb"CHARSET:\s*([A-Za-z0-9_-]+)", head)
+    if m:
+        charset = m.group(1).decode("ascii").upper()
+        if charset.isdigit():
+            return f"cp{charset}"
+        if charset not in ("NONE", "USASCII"):
+            try:
+                return codecs.lookup(charset).name
+            except LookupError:
+                pass
+    try:
+        head.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+
+def _parse_ofx_dates(raw: pd.Series) -> pd.Series:
+    # 20101106160000.123[-5:EST] -> UTC-naive datetime (matches ofxparse)
+    parts = raw.str.extract(r"^\s*(\d{8})(\d{6})?(?:\.(\d{1,5}))?[^\[]*(?:\[([-+]?\d+\.?\d*)(?::\w*)?\])?")
+    stamp = parts[0] + parts[1].fillna("000000")
+    dates = pd.to_datetime(stamp, format="%Y%m%d%H%M%S", errors="coerce")
+    dates = dates.mask(parts[0] == "00000000")
+    offset = pd.to_timedelta(pd.to_numeric(parts[3], errors="coerce").fillna(0.0), unit="h")
+    frac = pd.to_timedelta(pd.to_numeric("0." + parts[2].fillna("0"), errors="coerce").fillna(0.0), unit="s")
+    return dates - offset + frac
+
+
+def _build_frame(cols: dict) -> pd.DataFrame:
+    memo = pd.Series(cols["MEMO"], dtype=object)
+    name = pd.Series(cols["NAME"], dtype=object)
+    description = memo.where(memo.notna() & (memo != ""), name).fillna("")
+    return pd.DataFrame({
+        'date': _parse_ofx_dates(pd.Series(cols["DTPOSTED"], dtype=object).astype(str)),
+        'description': description,
+        'amount': pd.to_numeric(pd.Series(cols["TRNAMT"], dtype=object).str.replace(",", ".", regex=False), errors="coerce"),
+        'type': pd.Series(cols["TRNTYPE"], dtype=object).str.lower(),
+        'account': pd.Series(cols["account"], dtype=object),
+        'currency': pd.Series(cols["currency"], dtype=object),
+    })
+
+
+def _empty_columns() -> dict:
+    return {key: [] for key in _TXN_FIELDS + ("account", "currency")}
+
+
+def iter_ofx_chunks(uploaded_file, chunksize: Optional[int] = DEFAULT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Yield canonical-column frames of at most ``chunksize`` transactions (all at once if None)."""
+    head = uploaded_file.read(READ_BYTES)
+    decoder = codecs.getincrementaldecoder(_detect_encoding(head))(errors="replace")
+    cols = _empty_columns()
+    account = None
+    currency = None
+    txn = None
+    tail = ""
+    data = head
+    while True:
+        final = not data
+        text = tail + decoder.decode(data, final=final)
+        cut = len(text) if final else text.rfind("<")
+        if cut <= 0:
+            tail = text
+        else:
+            tail = text[cut:]
+            for m in _TAG_RE.finditer(text, 0, cut):
+                closing, tag, value = m.group(1), m.group(2).upper(), m.group(3).strip()
+                if txn is None:
+                    if closing:
+                        continue
+                    if tag == "STMTTRN":
+                        txn = {}
+                    elif tag == "ACCTID":
+                        account = html.unescape(value) or None
+                    elif tag == "CURDEF":
+                        currency = value.lower() or None
+                    continue
+                if closing and tag == "STMTTRN":
+                    for key in _TXN_FIELDS:
+                        cols[key].append(txn.get(key))
+                    cols["account"].append(account)
+                    cols["currency"].append(currency)
+                    txn = None
+                    if chunksize and len(cols["TRNAMT"]) >= chunksize:
+                        yield _build_frame(cols)
+                        cols = _empty_columns()
+                elif not closing and tag in _TXN_FIELDS and tag not in txn:
+                    # First occurrence wins, including <NAME> nested in <PAYEE>
+                    txn[tag] = html.unescape(value)
+        if final:
+            break
+        data = uploaded_file.read(READ_BYTES)
+    if cols["TRNAMT"]:
+        yield _build_frame(cols)
+
 
 def parse_ofx(uploaded_file) -> pd.DataFrame:
-    ofx = OfxParser.parse(uploaded_file)
-    rows = []
-    for account in ofx.accounts:
-        for txn in account.statement.transactions:
-            rows.append({
-                'date': txn.date,
-                'description': txn.memo or txn.payee or '',
-                'amount': float(txn.amount),
-                'type': txn.type,
-                'account': getattr(account, 'account_id', None) or getattr(account, 'number', None),
-                'currency': getattr(account.statement, 'currency', None)
-            })
-    df = pd.DataFrame(rows)
-    return df
+    frames = list(iter_ofx_chunks(uploaded_file, chunksize=None))
+    if not frames:
+        return pd.DataFrame()
+    return frames[0]
@@ -0,0 +1,248 @@
+import argparse
+import contextlib
+import os
+from functools import partial
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from finance_ai.ingestion.parser_csv import DEFAULT_CHUNK_ROWS, iter_csv_chunks
+from finance_ai.ingestion.parser_ofx import iter_ofx_chunks
+from finance_ai.ingestion.parser_arrow import arrow_format, iter_arrow_chunks
+from finance_ai.ingestion.manifest import drop_covered, file_fingerprint, spans_range, update_spans
+from finance_ai.ingestion.profiles import BankProfile, resolve_profile
+from finance_ai.processing.normalize import normalize_transactions
+from finance_ai.processing.dedupe import compute_hashes, filter_new_transactions
+from finance_ai.config import CONFIG
+from finance_ai.intelligence.categorizer import resolve_transactions
+from finance_ai.processing.merchants import canonicalize_merchants
+
+Stage = Callable[[pd.DataFrame], pd.DataFrame]
+
+# Stages run on rows that survived dedupe, in order. resolve_transactions does
+# the work of enrich_transactions + categorize_transactions in one scan;
+# canonicalize_merchants then names the merchants no rule recognized.
+DEFAULT_STAGES: Tuple[Stage, ...] = (resolve_transactions, canonicalize_merchants)
+
+
+def copy_on_write():
+    """Context enabling pandas copy-on-write (always on from pandas 3)."""
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return contextlib.nullcontext()
+    return pd.option_context('mode.copy_on_write', True)
+
+
+class IngestionPipeline:
+    """Parse -> normalize -> hash -> dedupe -> stages -> insert, one chunk at a time.
+
+    Rows are filtered as early as possible: invalid dates/amounts during
+    normalization, covered date windows and known keys before any enrichment
+    columns are added. Known keys are checked against the database per chunk,
+    never loaded wholesale. Everything runs under copy-on-write, so stages share
+    column buffers instead of copying whole frames. The same object drives the
+    Streamlit upload, the CLI (``python -m finance_ai.ingestion.pipeline``) and tests.
+    """
+
+    def __init__(self, repo=None, stages: Optional[Sequence[Stage]] = None, chunksize: int = DEFAULT_CHUNK_ROWS):
+        self.repo = repo
+        if stages is None:
+            # Default stages, resolving through the repository's persistent cache and the saved fallback model
+            if repo is not None:
+                stages = (
+                    partial(resolve_transactions, store=repo, model_path=CONFIG.category_model_path),
+                    partial(canonicalize_merchants, store=repo),
+                )
+            else:
+                stages = DEFAULT_STAGES
+        self.stages = tuple(stages)
+        self.chunksize = chunksize
+        # Without a repository, keys seen by earlier calls stand in for stored ones
+        self.seen: Optional[set] = set() if repo is None else None
+        # Problems noticed during the latest ingest that did not stop it (profile set aside, rows dropped)
+        self.warnings: List[str] = []
+
+    # Frame-level steps (no repository needed)
+
+    def normalize(self, df: pd.DataFrame, profile: Optional[BankProfile] = None) -> pd.DataFrame:
+        if profile is None:
+            return normalize_transactions(df)
+        return normalize_transactions(df, date_format=profile.date_format, sign_convention=profile.sign_convention)
+
+    def dedupe(self, df: pd.DataFrame, seen: Optional[set] = None) -> pd.DataFrame:
+        """Drop rows repeated within ``df`` or already known.
+
+        Known means stored in the repository, checked database-side, or, when
+        ``seen`` is given, present in that set (which then gains the survivors).
+        A pipeline without a repository defaults to its own in-memory set.
+        """
+        new = df[~df['tx_key'].duplicated()]
+        if seen is None:
+            seen = self.seen
+        if seen is None:
+            return self.repo.exclude_existing(new)
+        new = filter_new_transactions(new, seen)
+        seen.update(new['tx_key'].tolist())
+        return new
+
+    def apply_stages(self, df: pd.DataFrame) -> pd.DataFrame:
+        for stage in self.stages:
+            df = stage(df)
+        return df
+
+    def prepare(self, df: pd.DataFrame, seen: Optional[set] = None, profile: Optional[BankProfile] = None) -> pd.DataFrame:
+        """Run a parsed frame through every step except insert."""
+        with copy_on_write():
+            df = self.normalize(df, profile)
+            if df.empty:
+                return df
+            df = self.dedupe(compute_hashes(df), seen)
+            return self.apply_stages(df) if not df.empty else df
+
+    # Repository-backed ingestion
+
+    def run(
+        self,
+        chunks: Iterable[pd.DataFrame],
+        fingerprint: Tuple[str, int],
+        file_name: Optional[str] = None,
+        profile: Optional[BankProfile] = None,
+    ) -> Tuple[int, int]:
+        """Ingest parsed chunks of one file. Returns (inserted, skipped).
+
+        Rows normalization drops for lack of a usable date or amount are counted
+        in neither; they are reported in ``warnings``.
+        """
+        repo = self.repo
+        content_hash, size = fingerprint
+        # Exact repeat of a file we already ingested: nothing to parse
+        prior_rows = repo.get_ingested_file_rows(content_hash)
+        if prior_rows is not None:
+            return 0, prior_rows
+
+        windows = repo.get_covered_windows()
+        occurrences = {}  # identical rows are counted across the file's chunks
+        spans = {}
+        inserted = 0
+        skipped = 0
+        dropped = 0
+        with copy_on_write():
+            for chunk in chunks:
+                chunk = self.normalize(chunk, profile)
+                dropped += chunk.attrs.get('dropped', 0)
+                if chunk.empty:
+                    continue
+                update_spans(spans, chunk)
+                # Overlapping statements: only the date window not covered before is processed
+                fresh = drop_covered(chunk, windows)
+                if not fresh.empty:
+                    fresh = self.dedupe(compute_hashes(fresh, occurrences))
+                if fresh.empty:
+                    skipped += len(chunk)
+                    continue
+                # Keys are unique per row, so whatever the insert ignores was already stored
+                added = repo.insert_transactions(self.apply_stages(fresh))
+                inserted += added
+                skipped += len(chunk) - added
+        repo.record_ingested_file(content_hash, size, file_name, spans)
+        repo.flush_key_filter()
+        if dropped:
+            self.warnings.append(dropped_warning(dropped))
+        if inserted:
+            # New rows may complete transfers with statements of other accounts
+            repo.link_transfers(*spans_range(spans))
+        return inserted, skipped
+
+    def ingest_csv(self, uploaded_file, file_name: Optional[str] = None) -> Tuple[int, int]:
+        """Stream a CSV. The column layout comes from the bank profile registry, learned on first sight."""
+        self.warnings = []
+        fingerprint = file_fingerprint(uploaded_file)
+        if self.repo.get_ingested_file_rows(fingerprint[0]) is None:
+            profile, mismatch = resolve_profile(uploaded_file, self.repo)
+            if mismatch is not None:
+                self.warnings.append(f"{mismatch}; the layout was inferred from this file instead.")
+        else:
+            profile = None  # exact repeat; run() returns before parsing
+        chunks = iter_csv_chunks(uploaded_file, chunksize=self.chunksize, profile=profile)
+        return self.run(chunks, fingerprint, _name(uploaded_file, file_name), profile)
+
+    def ingest_ofx(self, uploaded_file, file_name: Optional[str] = None) -> Tuple[int, int]:
+        self.warnings = []
+        fingerprint = file_fingerprint(uploaded_file)
+        chunks = iter_ofx_chunks(uploaded_file, chunksize=self.chunksize)
+        return self.run(chunks, fingerprint, _name(uploaded_file, file_name))
+
+    def ingest_arrow(self, uploaded_file, fmt: str, file_name: Optional[str] = None) -> Tuple[int, int]:
+        self.warnings = []
+        fingerprint = file_fingerprint(uploaded_file)
+        chunks = iter_arrow_chunks(uploaded_file, fmt, chunksize=self.chunksize)
+        return self.run(chunks, fingerprint, _name(uploaded_file, file_name))
+
+    def ingest(self, uploaded_file, file_name: Optional[str] = None) -> Tuple[int, int]:
+        """Ingest one file, picking the parser from its extension."""
+        name = _name(uploaded_file, file_name) or ''
+        ext = os.path.splitext(name)[1].lower()
+        if ext == ".csv":
+            return self.ingest_csv(uploaded_file, name)
+        if ext in (".ofx", ".qfx"):
+            return self.ingest_ofx(uploaded_file, name)
+        fmt = arrow_format(name)
+        if fmt is not None:
+            return self.ingest_arrow(uploaded_file, fmt, name)
+        raise ValueError(f"Unsupported file type: {ext or name}")
+
+
+def dropped_warning(dropped: int) -> str:
+    return f"{dropped} rows without a parseable date or amount were dropped."
+
+
+def _name(uploaded_file, file_name: Optional[str]) -> Optional[str]:
+    return file_name or getattr(uploaded_file, 'name', None)
+
+
+def ingest_csv_stream(uploaded_file, repo, chunksize: int = DEFAULT_CHUNK_ROWS, file_name: Optional[str] = None) -> Tuple[int, int]:
+    """Stream a CSV through normalize -> hash -> dedupe -> enrich -> categorize -> insert.
+
+    Only one chunk is held in memory at a time. Returns (inserted, skipped), where
+    skipped counts rows already present in the store or earlier in the same file.
+    Files recorded in the ingest manifest are skipped without parsing.
+    """
+    return IngestionPipeline(repo, chunksize=chunksize).ingest_csv(uploaded_file, file_name)
+
+
+def ingest_ofx_stream(uploaded_file, repo, chunksize: int = DEFAULT_CHUNK_ROWS, file_name: Optional[str] = None) -> Tuple[int, int]:
+    """OFX/QFX counterpart of ``ingest_csv_stream``."""
+    return IngestionPipeline(repo, chunksize=chunksize).ingest_ofx(uploaded_file, file_name)
+
+
+def ingest_arrow_stream(uploaded_file, repo, fmt: str, chunksize: int = DEFAULT_CHUNK_ROWS, file_name: Optional[str] = None) -> Tuple[int, int]:
+    """Parquet / Arrow IPC / JSON Lines counterpart of ``ingest_csv_stream``."""
+    return IngestionPipeline(repo, chunksize=chunksize).ingest_arrow(uploaded_file, fmt, file_name)
+
+
+def ingest_upload(uploaded_file, repo, file_name: Optional[str] = None) -> Tuple[int, int]:
+    """Ingest one file, picking the parser from its extension."""
+    return IngestionPipeline(repo).ingest(uploaded_file, file_name)
+
+
+def main():
+    from finance_ai.storage.db import init_db
+    from finance_ai.storage.repository import TransactionRepository
+
+    ap = argparse.ArgumentParser(description="Ingest statement files one at a time.")
+    ap.add_argument("files", nargs="+", help="CSV, OFX/QFX, Parquet, Arrow or JSON Lines files")
+    ap.add_argument("--db", default=os.path.join("data", "finance.db"), help="SQLite database path")
+    ap.add_argument("--chunksize", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per chunk")
+    args = ap.parse_args()
+
+    engine, SessionLocal = init_db(os.path.abspath(args.db))
+    pipeline = IngestionPipeline(TransactionRepository(engine=engine, SessionLocal=SessionLocal), chunksize=args.chunksize)
+    for path in args.files:
+        with open(path, "rb") as fh:
+            inserted, skipped = pipeline.ingest(fh, path)
+        print(f"{path}: inserted {inserted}, skipped {skipped}")
+        for warning in pipeline.warnings:
+            print(f"{path}: {warning}")
+
+
+if __name__ == "__main__":
+    main()
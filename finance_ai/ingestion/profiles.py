@@ -0,0 +1,177 @@
+import io
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+from pydantic import BaseModel
+
+from finance_ai.ingestion.parser_csv import COLUMN_ALIASES, SNIFF_BYTES, _find_col, _sniff
+from finance_ai.processing.normalize import DEBIT_TYPES, infer_date_format
+
+# Bank schema profiles: the column mapping and value conventions of a CSV
+# layout, keyed by its header signature and delimiter, so later files skip
+# inference. A stored profile is only used after it is checked against a
+# sample of the new file; two banks can export the same column names.
+
+PROFILE_SAMPLE_ROWS = 1000
+
+SIGN_CONVENTIONS = ["signed", "debit_negative"]
+
+
+class BankProfile(BaseModel):
+    signature: str
+    columns: List[str]
+    mapping: Dict[str, str]  # source column -> canonical column
+    date_format: Optional[str] = None
+    decimal: str = "."
+    thousands: Optional[str] = None
+    sign_convention: str = "signed"  # "debit_negative": unsigned amounts, debits marked by type
+    source: str = "inferred"  # or "user"
+
+
+DELIMITER_NAMES = {",": "comma", ";": "semicolon", "\t": "tab", "|": "pipe"}
+
+
+def header_signature(columns, delimiter: Optional[str] = None) -> str:
+    """'date|description|amount (comma)'; without a delimiter, the form profiles were first stored under."""
+    signature = "|".join(str(c).strip().lower() for c in columns)
+    if delimiter is None:
+        return signature
+    return f"{signature} ({DELIMITER_NAMES.get(delimiter, repr(delimiter))})"
+
+
+def infer_number_format(values: pd.Series) -> Tuple[str, Optional[str]]:
+    """Return (decimal, thousands) separators seen in raw amount strings."""
+    values = values.dropna().astype(str).str.replace(r"[^\d.,\-]", "", regex=True)
+    comma_decimal = values.str.contains(r",\d{1,2}$").any()
+    dot_decimal = values.str.contains(r"\.\d{1,2}$").any()
+    if comma_decimal and not dot_decimal:
+        return ",", ("." if values.str.contains(".", regex=False).any() else None)
+    return ".", ("," if values.str.contains(",", regex=False).any() else None)
+
+
+def number_pattern(decimal: str, thousands: Optional[str]) -> str:
+    """Regex a cleaned amount string must fully match to parse under these separators."""
+    digits = r"\d+"
+    if thousands:
+        digits = rf"(?:\d{{1,3}}(?:{re.escape(thousands)}\d{{3}})+|\d+)"
+    dec = re.escape(decimal)
+    return rf"-?(?:{digits}(?:{dec}\d*)?|{dec}\d+)"
+
+
+def infer_sign_convention(amounts: pd.Series, types: Optional[pd.Series]) -> str:
+    if types is None:
+        return "signed"
+    numeric = pd.to_numeric(amounts.astype(str).str.replace(r"[^\d.\-]", "", regex=True), errors="coerce")
+    has_debits = types.astype(str).str.strip().str.lower().isin(DEBIT_TYPES).any()
+    if has_debits and (numeric.dropna() >= 0).all():
+        return "debit_negative"
+    return "signed"
+
+
+def infer_profile(header: List[str], sample: pd.DataFrame, signature: Optional[str] = None) -> BankProfile:
+    """Infer a profile from a sample read with every column as text."""
+    mapping = {}
+    for key, aliases in COLUMN_ALIASES.items():
+        col = _find_col(header, aliases)
+        if col is not None:
+            mapping[col] = key
+    source_of = {v: k for k, v in mapping.items()}
+    for req in ["date", "description", "amount"]:
+        if req not in source_of:
+            raise ValueError(f"CSV missing required column: {req}")
+    decimal, thousands = infer_number_format(sample[source_of["amount"]])
+    amounts = sample[source_of["amount"]].astype(str)
+    if thousands:
+        amounts = amounts.str.replace(thousands, "", regex=False)
+    amounts = amounts.str.replace(decimal, ".", regex=False)
+    types = sample[source_of["type"]] if "type" in source_of else None
+    return BankProfile(
+        signature=signature or header_signature(header),
+        columns=list(header),
+        mapping=mapping,
+        date_format=infer_date_format(sample[source_of["date"]]),
+        decimal=decimal,
+        thousands=thousands,
+        sign_convention=infer_sign_convention(amounts, types),
+    )
+
+
+def profile_mismatch(profile: BankProfile, sample: pd.DataFrame) -> Optional[str]:
+    """Why ``profile`` does not fit a sample read with every column as text, or None if it does.
+
+    The mapped columns must exist, the date format must parse as many sample
+    dates as the best inferred format, every amount must parse under the
+    decimal and thousands separators, and unsigned profiles must not see signs.
+    """
+    source_of = {v: k for k, v in profile.mapping.items()}
+    missing = [req for req in ["date", "description", "amount"] if source_of.get(req) not in sample.columns]
+    if missing:
+        return f"columns {', '.join(missing)} are not in the file"
+    dates = sample[source_of["date"]].dropna().astype(str).str.strip()
+    dates = dates[dates != ""]
+    best = infer_date_format(dates)
+    if best is not None and best != profile.date_format:
+        hits = pd.to_datetime(dates, format=profile.date_format, errors="coerce").notna().sum() if profile.date_format else 0
+        if hits < pd.to_datetime(dates, format=best, errors="coerce").notna().sum():
+            return f"dates look like {best}, not {profile.date_format}"
+    amounts = sample[source_of["amount"]].dropna().astype(str).str.replace(r"[^\d.,\-]", "", regex=True)
+    amounts = amounts[amounts != ""]
+    bad = amounts[~amounts.str.fullmatch(number_pattern(profile.decimal, profile.thousands))]
+    if not bad.empty:
+        return f"amount {bad.iloc[0]!r} does not parse with decimal {profile.decimal!r} and thousands {profile.thousands!r}"
+    if profile.sign_convention == "debit_negative" and amounts.str.startswith("-").any():
+        return "amounts are signed, but the profile expects unsigned amounts"
+    return None
+
+
+def profile_for(uploaded_file, lookup: Callable[[str], Optional[dict]]) -> Tuple[BankProfile, bool, Optional[str]]:
+    """Look up the profile for a CSV by header signature and delimiter, inferring one if unknown.
+
+    A stored profile that does not fit the file's first rows (see
+    ``profile_mismatch``) is set aside and a profile is inferred instead.
+    Returns (profile, is_new, why the stored profile was set aside or None).
+    Profiles stored under the header alone are found too and re-keyed. The
+    file position is left unchanged.
+    """
+    start = uploaded_file.tell()
+    prefix = uploaded_file.read(SNIFF_BYTES)
+    uploaded_file.seek(start)
+    encoding, delimiter, header = _sniff(prefix)
+    signature = header_signature(header, delimiter)
+    sample = pd.read_csv(
+        io.BytesIO(prefix),
+        encoding=encoding,
+        sep=delimiter,
+        dtype=str,
+        nrows=PROFILE_SAMPLE_ROWS,
+        on_bad_lines="skip",
+    )
+    if len(prefix) >= SNIFF_BYTES and len(sample) > 1:
+        sample = sample.iloc[:-1]  # last row may be cut off
+    mismatch = None
+    for key in (signature, header_signature(header)):
+        stored = lookup(key)
+        if not stored:
+            continue
+        profile = BankProfile(**stored)
+        mismatch = profile_mismatch(profile, sample)
+        if mismatch is None:
+            if key == signature:
+                return profile, False, None
+            return profile.model_copy(update={"signature": signature}), True, None
+        mismatch = f"stored profile {key!r} does not fit: {mismatch}"
+        break
+    return infer_profile(list(sample.columns), sample, signature=signature), True, mismatch
+
+
+def resolve_profile(uploaded_file, repo) -> Tuple[BankProfile, Optional[str]]:
+    """Profile for a CSV from the repository's registry, learning and saving new layouts.
+
+    Returns (profile, why a stored profile was set aside or None). A re-inferred
+    profile replaces an inferred one under the same key, never a user override.
+    """
+    profile, is_new, mismatch = profile_for(uploaded_file, repo.get_profile)
+    if is_new:
+        repo.save_profile(profile.model_dump())
+    return profile, mismatch
@@ -1,52 +1,128 @@
+import argparse
+import json
+import os
+from typing import Optional
+
 import pandas as pd
 
-# Simple keyword rules for MVP. Extend with embeddings/ML and LLM fallback.
-CATEGORY_RULES = [
-    ("grocery", "Groceries"),
-    ("supermarket", "Groceries"),
-    ("whole foods", "Groceries"),
-    ("trader joe", "Groceries"),
-    ("starbucks", "Coffee"),
-    ("coffee", "Coffee"),
-    ("uber", "Transport"),
-    ("lyft", "Transport"),
-    ("gas", "Auto & Gas"),
-    ("shell", "Auto & Gas"),
-    ("rent", "Rent"),
-    ("mortgage", "Mortgage"),
-    ("netflix", "Entertainment"),
-    ("spotify", "Entertainment"),
-    ("amazon", "Shopping"),
-    ("apple", "Shopping"),
-]
-
-SUBCATEGORY_RULES = {
-    "Coffee": "Cafe",
-    "Transport": "Rideshare",
-}
-
-
-def _rule_category(desc: str) -> str | None:
-    d = desc.lower()
-    for key, cat in CATEGORY_RULES:
-        if key in d:
-            return cat
-    return None
-
-
-def categorize_transactions(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    cats = []
-    subs = []
-    for _, row in df.iterrows():
-        desc = row['description'] or ''
-        cat = _rule_category(desc)
-        if cat is None:
-            # Placeholder for model/LLM fallback
-            cat = 'Uncategorized'
-        sub = SUBCATEGORY_RULES.get(cat)
-        cats.append(cat)
-        subs.append(sub)
-    df['category'] = cats
-    df['subcategory'] = subs
+from finance_ai.config import CONFIG
+from finance_ai.intelligence.keywords import KeywordEngine
+from finance_ai.intelligence.llm_categorizer import llm_client
+from finance_ai.intelligence.ml_categorizer import load_model
+from finance_ai.intelligence.rules import (
+    RESOLVED_COLUMNS, RULE_KINDS, changed_keywords, description_key, resolve_descriptions, rule_set_version,
+    set_active_rules, sync_rules,
+)
+# Rule tables live in rules.py; CATEGORY_RULES/SUBCATEGORY_RULES stay importable from here
+from finance_ai.intelligence.rules import CATEGORY_RULES, SUBCATEGORY_RULES  # noqa: F401
+from finance_ai.processing.merchants import canonicalize_merchants
+
+UNCATEGORIZED = 'Uncategorized'
+
+
+def _resolve(df: pd.DataFrame, store=None, model_path: Optional[str] = None) -> pd.DataFrame:
+    # Rules first, then the local model (if trained), then the LLM (if configured) for what they leave
+    return resolve_descriptions(
+        df['description'],
+        fallback_category=UNCATEGORIZED,
+        store=store,
+        model=load_model(model_path) if model_path else None,
+        min_confidence=CONFIG.category_min_confidence,
+        llm=llm_client(),
+    )
+
+
+def categorize_transactions(df: pd.DataFrame, store=None, model_path: Optional[str] = None) -> pd.DataFrame:
+    df = df.copy(deep=False)
+    resolved = _resolve(df, store, model_path)
+    df['category'] = resolved['category'].values
+    df['subcategory'] = resolved['subcategory'].values
     return df
+
+
+def resolve_transactions(df: pd.DataFrame, store=None, model_path: Optional[str] = None) -> pd.DataFrame:
+    """Enrichment and categorization in one stage: each distinct description is scanned once.
+
+    With a ``store`` (the repository), persisted resolutions are used first;
+    with a ``model_path``, the saved fallback model categorizes what rules miss.
+    """
+    df = df.copy(deep=False)
+    resolved = _resolve(df, store, model_path)
+    for col in resolved.columns:
+        df[col] = resolved[col].values
+    return df
+
+
+def update_rules(repo, tables: dict, model_path: Optional[str] = None) -> dict:
+    """Save edited rule tables and re-categorize only the stored rows they can affect.
+
+    Affected descriptions are the distinct normalized keys containing a keyword
+    that was added, removed, changed or re-ranked; they are re-resolved once
+    and written back with batched UPDATEs through the desc_key index. Cached
+    resolutions for other keys carry over to the new version. Subcategory
+    mapping changes are applied per category.
+    """
+    tables = {kind: [tuple(rule) for rule in tables.get(kind, [])] for kind in RULE_KINDS}
+    old = sync_rules(repo)
+    old_version = rule_set_version()
+    keywords = changed_keywords(old.tables, tables)
+    version = repo.save_rules(tables)
+    new = set_active_rules(tables, version)
+    result = {'version': version, 'keywords': len(keywords), 'descriptions': 0, 'rows': 0}
+
+    affected = []
+    if keywords:
+        matcher = KeywordEngine({'hit': [(k, True) for k in keywords]})
+        affected = [k for k in repo.distinct_description_keys() if matcher.scan(k)[0]]
+    repo.retire_resolutions(affected, old_version, rule_set_version())
+    if affected:
+        frame = pd.DataFrame({'description': affected})
+        resolved = canonicalize_merchants(resolve_transactions(frame, repo, model_path), store=repo)[RESOLVED_COLUMNS]
+        resolved = resolved.astype(object).where(resolved.notna(), None)
+        result['descriptions'] = len(affected)
+        result['rows'] = repo.update_resolved(dict(zip(affected, resolved.itertuples(index=False, name=None))))
+
+    before, after = old.subcategories, new.subcategories
+    changed = {c: after.get(c) for c in before.keys() | after.keys() if before.get(c) != after.get(c)}
+    result['rows'] += repo.update_subcategories(changed)
+    return result
+
+
+def correct_categories(repo, corrections: dict) -> int:
+    """Record user corrections {description: category} for every stored row with that description.
+
+    The subcategory follows the category's subcategory rule. Corrections are
+    cached as user resolutions, so they survive rule edits and train the
+    fallback model. Returns the number of rows updated.
+    """
+    rules = sync_rules(repo)
+    by_key = {description_key(d): (c, rules.subcategories.get(c)) for d, c in corrections.items() if c}
+    return repo.correct_categories(by_key, rule_set_version())
+
+
+def main():
+    from finance_ai.storage.db import init_db
+    from finance_ai.storage.repository import TransactionRepository
+
+    ap = argparse.ArgumentParser(description="Export or import categorization rules.")
+    ap.add_argument("--db", default=os.path.join("data", "finance.db"), help="SQLite database path")
+    group = ap.add_mutually_exclusive_group(required=True)
+    group.add_argument("--export", metavar="PATH", help="Write the current rules as JSON")
+    group.add_argument("--import", dest="import_path", metavar="PATH", help="Replace the rules from JSON and re-categorize")
+    args = ap.parse_args()
+
+    engine, SessionLocal = init_db(os.path.abspath(args.db))
+    repo = TransactionRepository(engine=engine, SessionLocal=SessionLocal)
+    if args.export:
+        with open(args.export, "w", encoding="utf-8") as fh:
+            json.dump(repo.load_rules(), fh, indent=2)
+        print(f"Rules version {repo.get_rule_version()} written to {args.export}")
+        return
+    with open(args.import_path, encoding="utf-8") as fh:
+        result = update_rules(repo, json.load(fh), CONFIG.category_model_path)
+    print(f"Rules version {result['version']}: {result['keywords']} keywords changed, "
+          f"{result['descriptions']} descriptions and {result['rows']} rows re-categorized")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,15 @@
+import argparse
+import math
+import os
+from typing import Optional
+
 import pandas as pd
 
+from finance_ai.processing.schema import apply_schema
+
 
-def compute_insights(df: pd.DataFrame) -> dict:
-    metrics = {
+def _empty_metrics() -> dict:
+    return {
         'total_spend': 0.0,
         'total_income': 0.0,
         'net': 0.0,
@@ -11,12 +18,32 @@ def compute_insights(df: pd.DataFrame) -> dict:
         'top_merchants': pd.DataFrame(),
         'anomalies': pd.DataFrame(),
     }
+
+
+def compute_insights(df: Optional[pd.DataFrame] = None, repo=None, start_date=None, end_date=None) -> dict:
+    """Totals, monthly/category/merchant sums and debit anomalies.
+
+    With ``df`` the metrics are computed from those rows. Without it they come
+    from ``repo``'s monthly rollups for [start_date, end_date], which costs
+    O(months x categories) instead of reading every transaction; only the
+    handful of anomalous rows is fetched.
+    """
+    if df is None and repo is not None:
+        return insights_from_rollups(
+            repo.rollup_summary(start_date, end_date),
+            lambda threshold: repo.debit_outliers(start_date, end_date, threshold),
+        )
+    metrics = _empty_metrics()
     if df is None or df.empty:
         return metrics
 
-    df = df.copy()
-    df['date'] = pd.to_datetime(df['date'])
-    df['month'] = df['date'].dt.to_period('M').dt.to_timestamp()
+    df = apply_schema(df)
+    if 'transfer_id' in df.columns:
+        # Both legs of an internal transfer would otherwise count as spend and income
+        df = df[df['transfer_id'].isna()]
+        if df.empty:
+            return metrics
+    df = df.assign(month=df['date'].dt.to_period('M').dt.to_timestamp())
 
     spend = df.loc[df['amount'] < 0, 'amount'].sum()
     income = df.loc[df['amount'] > 0, 'amount'].sum()
@@ -27,9 +54,9 @@ def compute_insights(df: pd.DataFrame) -> dict:
     metrics['by_month'] = df.groupby('month')['amount'].sum().reset_index()
 
     if 'category' in df.columns:
-        metrics['by_category'] = df.groupby('category')['amount'].sum().reset_index().sort_values('amount')
+        metrics['by_category'] = df.groupby('category', observed=True)['amount'].sum().reset_index().sort_values('amount')
     if 'merchant' in df.columns:
-        merchants = df.groupby('merchant')['amount'].sum().reset_index()
+        merchants = df.groupby('merchant', observed=True)['amount'].sum().reset_index()
         metrics['top_merchants'] = merchants.sort_values('amount').head(10)
 
     # Simple anomaly detection: flag debits more extreme than mean-2*std (more negative)
@@ -42,3 +69,60 @@ def compute_insights(df: pd.DataFrame) -> dict:
         metrics['anomalies'] = anomalies.sort_values('amount').head(20)
 
     return metrics
+
+
+def insights_from_rollups(rollups: pd.DataFrame, outliers) -> dict:
+    """The ``compute_insights`` metrics from ``TransactionRepository.rollup_summary`` rows.
+
+    Debit mean and std come from the rollups' counts, sums and sums of
+    squares; ``outliers(threshold)`` returns the debits below the threshold.
+    """
+    metrics = _empty_metrics()
+    if rollups is None or rollups.empty:
+        return metrics
+
+    spend = rollups.loc[rollups['sign'] < 0, 'amount_sum'].sum()
+    income = rollups.loc[rollups['sign'] > 0, 'amount_sum'].sum()
+    metrics['total_spend'] = float(spend)
+    metrics['total_income'] = float(income)
+    metrics['net'] = float(income + spend)
+
+    sums = rollups.rename(columns={'amount_sum': 'amount'})
+    metrics['by_month'] = sums.groupby('month')['amount'].sum().reset_index()
+    metrics['by_category'] = sums.groupby('category')['amount'].sum().reset_index().sort_values('amount')
+    metrics['top_merchants'] = sums.groupby('merchant')['amount'].sum().reset_index().sort_values('amount').head(10)
+
+    debits = rollups[rollups['sign'] < 0]
+    n = int(debits['row_count'].sum())
+    if n:
+        mu = debits['amount_sum'].sum() / n
+        sigma = math.sqrt(max(debits['amount_sq_sum'].sum() / n - mu * mu, 0.0)) or 1.0
+        metrics['anomalies'] = outliers(mu - 2 * sigma)
+
+    return metrics
+
+
+def main():
+    from finance_ai.storage.db import init_db
+    from finance_ai.storage.repository import TransactionRepository
+
+    ap = argparse.ArgumentParser(description="Spending insights from the monthly rollups.")
+    ap.add_argument("--db", default=os.path.join("data", "finance.db"), help="SQLite database path")
+    ap.add_argument("--rebuild", action="store_true", help="Recompute the rollups from all transactions first")
+    ap.add_argument("--start", default=None, help="First day (YYYY-MM-DD)")
+    ap.add_argument("--end", default=None, help="Last day (YYYY-MM-DD)")
+    args = ap.parse_args()
+
+    engine, SessionLocal = init_db(os.path.abspath(args.db))
+    repo = TransactionRepository(engine=engine, SessionLocal=SessionLocal)
+    if args.rebuild:
+        print(f"rebuilt {repo.rebuild_rollups()} rollup rows")
+    metrics = compute_insights(repo=repo, start_date=args.start, end_date=args.end)
+    print(
+        f"spend {metrics['total_spend']:,.2f} | income {metrics['total_income']:,.2f} | net {metrics['net']:,.2f} | "
+        f"{len(metrics['by_month'])} months, {len(metrics['by_category'])} categories, {len(metrics['anomalies'])} anomalies"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+from collections import deque
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Multi-pattern keyword matching (Aho-Corasick). All rule tables are compiled
+# into one automaton, so each text is scanned once regardless of how many
+# rules there are; work grows with text length and the number of hits.
+
+
+class KeywordEngine:
+    """Compiled matcher over several ``(keyword, value)`` tables.
+
+    For each table, ``match`` returns the value of the first rule, in table
+    order, whose keyword occurs anywhere in the lower-cased text, which is the
+    same first-match-wins result as looping over the rules with ``in``.
+    """
+
+    def __init__(self, tables: Dict[str, Sequence[Tuple[str, object]]]):
+        self.fields = list(tables)
+        self.values = [[value for _, value in rules] for rules in tables.values()]
+        goto: List[dict] = [{}]
+        out: List[list] = [[]]
+        for f, rules in enumerate(tables.values()):
+            for r, (keyword, _) in enumerate(rules):
+                state = 0
+                for ch in keyword.lower():
+                    nxt = goto[state].get(ch)
+                    if nxt is None:
+                        goto.append({})
+                        out.append([])
+                        nxt = goto[state][ch] = len(goto) - 1
+                    state = nxt
+                if state:
+                    out[state].append((f, r))
+
+        # Breadth-first: failure links, inherited outputs and a transition
+        # table that already follows failure links (a DFA), so scanning is one
+        # dict lookup per character. Transitions back to the root are implicit.
+        delta = [dict(g) for g in goto]
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, target in delta[fail[state]].items():
+                delta[state].setdefault(ch, target)
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[fail[state]].get(ch, 0)
+                out[nxt].extend(out[fail[nxt]])
+                queue.append(nxt)
+        self._delta = delta
+        # Per state: the highest-priority (lowest) rule hit for each table
+        self._hits = []
+        for hits in out:
+            best = {}
+            for f, r in hits:
+                if r < best.get(f, r + 1):
+                    best[f] = r
+            self._hits.append(tuple(best.items()))
+
+    def scan(self, text: str) -> Tuple:
+        """Values per table for one text (None where no rule matched)."""
+        delta, hits = self._delta, self._hits
+        best = [None] * len(self.fields)
+        state = 0
+        for ch in text.lower():
+            state = delta[state].get(ch, 0)
+            for f, r in hits[state]:
+                if best[f] is None or r < best[f]:
+                    best[f] = r
+        return tuple(None if r is None else self.values[f][r] for f, r in enumerate(best))
+
+    def match(self, texts: Iterable[str]) -> Dict[str, list]:
+        """Scan each text once; returns {table: [value per text]}."""
+        rows = [self.scan(t or '') for t in texts]
+        return {field: [row[f] for row in rows] for f, field in enumerate(self.fields)}
@@ -0,0 +1,322 @@
+import argparse
+import asyncio
+import http.client
+import json
+import random
+import re
+import socket
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from finance_ai.config import CONFIG
+from finance_ai.intelligence.rules import active_rules
+
+# LLM fallback for descriptions neither rules nor the local model could place.
+# Descriptions are packed into numbered prompts (one request per batch), sent
+# concurrently over asyncio with a cap on requests in flight, retried with
+# exponential backoff, and the same description is never asked about twice at
+# once. The endpoint speaks the OpenAI chat-completions shape, so any server
+# with that API works; llm_server.py is a rule-based stand-in for offline
+# runs and benchmarks. HTTP goes through http.client on worker threads.
+
+SYSTEM_PROMPT = (
+    "You categorize bank transaction descriptions. Allowed categories: {categories}. "
+    "Reply with only a JSON object mapping each line number to one allowed category, "
+    "or null when none fits."
+)
+
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """A request that failed in a way worth retrying."""
+
+
+def build_prompt(descriptions: Sequence[str]) -> str:
+    return '\n'.join(f"{i}. {text}" for i, text in enumerate(descriptions, 1))
+
+
+def parse_prompt(prompt: str) -> List[Tuple[int, str]]:
+    """(line number, description) pairs of a prompt made by ``build_prompt``."""
+    return [(int(m.group(1)), m.group(2)) for m in re.finditer(r'^(\d+)\. (.*)$', prompt, re.MULTILINE)]
+
+
+def parse_reply(content: str, size: int) -> List[Optional[str]]:
+    """Category per prompt line from a model reply; tolerates code fences and surrounding prose."""
+    match = re.search(r'\{.*\}', content, re.DOTALL)
+    if not match:
+        raise LLMError(f"no JSON object in reply: {content[:200]!r}")
+    try:
+        answers = json.loads(match.group(0))
+    except json.JSONDecodeError as exc:
+        raise LLMError(f"malformed reply: {exc}") from exc
+    return [answers.get(str(i)) for i in range(1, size + 1)]
+
+
+_local = threading.local()
+
+
+def _connection(parts, timeout: float) -> http.client.HTTPConnection:
+    # One keep-alive connection per worker thread and host
+    conns = _local.__dict__.setdefault('conns', {})
+    key = (parts.scheme, parts.hostname, parts.port)
+    if key not in conns:
+        cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        conns[key] = cls(parts.hostname, parts.port, timeout=timeout)
+    return conns[key]
+
+
+def _drop_connection(parts) -> None:
+    conn = _local.__dict__.get('conns', {}).pop((parts.scheme, parts.hostname, parts.port), None)
+    if conn is not None:
+        conn.close()
+
+
+def post_json_blocking(url: str, payload: dict, timeout: float, headers: Optional[dict] = None) -> Tuple[int, dict]:
+    """POST JSON with http.client on a reused connection; returns (status, decoded JSON body).
+
+    http.client handles Content-Length, chunked bodies and keep-alive. A reused
+    connection the server has since closed is reopened once before failing.
+    """
+    parts = urlsplit(url)
+    path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+    body = json.dumps(payload).encode('utf-8')
+    headers = {'Content-Type': 'application/json', **(headers or {})}
+    for attempt in range(2):
+        conn = _connection(parts, timeout)
+        reused = conn.sock is not None
+        try:
+            conn.request('POST', path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            _drop_connection(parts)
+            if reused and attempt == 0:
+                continue
+            raise
+        except (OSError, http.client.HTTPException) as exc:
+            _drop_connection(parts)
+            if isinstance(exc, OSError):
+                raise
+            raise LLMError(f"malformed HTTP response: {exc}") from exc
+        if response.will_close:
+            _drop_connection(parts)
+        try:
+            return response.status, json.loads(data or b'{}')
+        except ValueError:
+            return response.status, {}
+    raise LLMError("connection closed")  # not reached
+
+
+async def post_json(url: str, payload: dict, timeout: float, headers: Optional[dict] = None) -> Tuple[int, dict]:
+    """``post_json_blocking`` on a worker thread, so requests overlap on the event loop."""
+    return await asyncio.to_thread(post_json_blocking, url, payload, timeout, headers)
+
+
+class LLMCategorizer:
+    """Batched, concurrent category lookups against a chat-completions endpoint.
+
+    ``predict`` has the same shape as ``CategoryModel.predict`` so it slots
+    into ``resolve_descriptions``; ``categorize`` is the coroutine behind it
+    and runs on the client's own event loop thread, so descriptions already
+    in flight for any caller are awaited rather than resent. Answers outside
+    the allowed categories count as no answer. Batches that still fail after
+    ``max_retries`` come back as None rather than raising, and an endpoint
+    found unreachable is skipped for ``down_seconds``, so it only leaves rows
+    Uncategorized. ``stats`` accumulates rows, requests, retries and time for
+    throughput reporting.
+    """
+
+    def __init__(
+        self,
+        endpoint: Optional[str] = None,
+        model: Optional[str] = None,
+        categories: Optional[Sequence[str]] = None,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff: float = 0.5,
+        timeout: Optional[float] = None,
+        api_key: Optional[str] = None,
+        down_seconds: Optional[float] = None,
+    ):
+        self.endpoint = endpoint or CONFIG.llm_endpoint
+        self.model = model or CONFIG.llm_model
+        self.categories = list(categories) if categories is not None else None
+        self.batch_size = batch_size or CONFIG.llm_batch_size
+        self.concurrency = concurrency or CONFIG.llm_concurrency
+        self.max_retries = CONFIG.llm_max_retries if max_retries is None else max_retries
+        self.backoff = backoff
+        self.timeout = timeout or CONFIG.llm_timeout
+        self.api_key = api_key or CONFIG.llm_api_key
+        self.down_seconds = CONFIG.llm_down_seconds if down_seconds is None else down_seconds
+        self.stats = {'rows': 0, 'requests': 0, 'retries': 0, 'failed': 0, 'skipped': 0, 'seconds': 0.0}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._down_until = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        # Caps requests in flight across all calls; created on the client's loop
+        self._limit: Optional[asyncio.Semaphore] = None
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.stats['rows'] / self.stats['seconds'] if self.stats['seconds'] else 0.0
+
+    @property
+    def is_down(self) -> bool:
+        return time.monotonic() < self._down_until
+
+    def _mark_down(self) -> None:
+        self._down_until = time.monotonic() + self.down_seconds
+
+    def _allowed(self) -> List[str]:
+        if self.categories is not None:
+            return self.categories
+        return list(dict.fromkeys(value for _, value in active_rules().tables['category']))
+
+    def _headers(self) -> dict:
+        return {'Authorization': f"Bearer {self.api_key}"} if self.api_key else {}
+
+    async def _request(self, texts: Sequence[str], allowed: Sequence[str]) -> List[Optional[str]]:
+        payload = {
+            'model': self.model,
+            'temperature': 0,
+            'messages': [
+                {'role': 'system', 'content': SYSTEM_PROMPT.format(categories=', '.join(allowed))},
+                {'role': 'user', 'content': build_prompt(texts)},
+            ],
+        }
+        for attempt in range(self.max_retries + 1):
+            if self.is_down:
+                break
+            self.stats['requests'] += 1
+            try:
+                status, data = await post_json(self.endpoint, payload, self.timeout, self._headers())
+                if status in RETRY_STATUS:
+                    raise LLMError(f"HTTP {status}")
+                if status != 200:
+                    break  # not retryable (bad request, auth, ...)
+                return parse_reply(data['choices'][0]['message']['content'], len(texts))
+            except (ConnectionRefusedError, socket.gaierror):
+                self._mark_down()  # nothing listening there; retrying cannot help
+                break
+            except (LLMError, OSError, KeyError, IndexError, TypeError) as exc:
+                if attempt == self.max_retries:
+                    if isinstance(exc, OSError):
+                        self._mark_down()  # still unreachable after every retry
+                    break
+                self.stats['retries'] += 1
+                await asyncio.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+        self.stats['failed'] += len(texts)
+        return [None] * len(texts)
+
+    async def _run_batch(self, texts: List[str], allowed: Sequence[str]) -> None:
+        try:
+            async with self._limit:
+                answers = await self._request(texts, allowed)
+        except BaseException as exc:
+            for text in texts:
+                self._inflight.pop(text).set_exception(exc)
+            raise
+        valid = set(allowed)
+        for text, answer in zip(texts, answers):
+            self._inflight.pop(text).set_result(answer if answer in valid else None)
+
+    async def categorize(self, descriptions: Sequence[str]) -> Dict[str, Optional[str]]:
+        """{description: category or None}; descriptions already being asked about are awaited, not resent.
+
+        Must run on one event loop per client (``predict`` uses the client's own).
+        """
+        if self.is_down:
+            self.stats['skipped'] += len(descriptions)
+            return dict.fromkeys(descriptions)
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        unique = list(dict.fromkeys(descriptions))
+        new = [d for d in unique if d not in self._inflight]
+        for d in new:
+            self._inflight[d] = loop.create_future()
+        waiting = {d: self._inflight[d] for d in unique}
+        allowed = self._allowed()
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(
+            self._run_batch(new[i:i + self.batch_size], allowed) for i in range(0, len(new), self.batch_size)
+        ))
+        results = {d: await future for d, future in waiting.items()}
+        self.stats['rows'] += len(new)
+        self.stats['seconds'] += time.perf_counter() - start
+        return results
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="llm-categorizer", daemon=True).start()
+            return self._loop
+
+    def predict(self, descriptions: Sequence[str]) -> Tuple[List[Optional[str]], List[float]]:
+        """Blocking wrapper: (category or None, confidence) per description. Safe to call from any thread."""
+        if not len(descriptions):
+            return [], []
+        if self.is_down:
+            self.stats['skipped'] += len(descriptions)
+            return [None] * len(descriptions), [0.0] * len(descriptions)
+        results = asyncio.run_coroutine_threadsafe(self.categorize(descriptions), self._event_loop()).result()
+        labels = [results[d] for d in descriptions]
+        return labels, [1.0 if label is not None else 0.0 for label in labels]
+
+
+_client: Optional[LLMCategorizer] = None
+_client_settings: Optional[tuple] = None
+_client_lock = threading.Lock()
+
+
+def llm_client() -> Optional[LLMCategorizer]:
+    """The process-wide LLM fallback, or None when no endpoint is set; rebuilt if the settings change."""
+    global _client, _client_settings
+    if not CONFIG.llm_endpoint:
+        return None
+    settings = (CONFIG.llm_endpoint, CONFIG.llm_model, CONFIG.llm_api_key)
+    with _client_lock:
+        if _client is None or _client_settings != settings:
+            _client, _client_settings = LLMCategorizer(), settings
+        return _client
+
+
+def main():
+    from finance_ai.intelligence.llm_server import start_server
+
+    ap = argparse.ArgumentParser(description="Measure LLM categorization throughput (rows/second).")
+    ap.add_argument("--endpoint", default=None, help="Chat-completions URL (default: start the local stand-in server)")
+    ap.add_argument("--rows", type=int, default=20_000, help="Distinct descriptions to categorize")
+    ap.add_argument("--batch-size", type=int, default=CONFIG.llm_batch_size)
+    ap.add_argument("--concurrency", type=int, default=CONFIG.llm_concurrency)
+    ap.add_argument("--latency", type=float, default=0.05, help="Stand-in server delay per request (seconds)")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="Stand-in server share of 503 replies")
+    args = ap.parse_args()
+
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        server, endpoint = start_server(latency=args.latency, fail_rate=args.fail_rate)
+    words = ['coffee', 'grocery', 'uber', 'shell', 'netflix', 'amazon', 'rent', 'bookshop', 'hardware', 'florist']
+    descriptions = [f"{words[i % len(words)]} purchase {i}" for i in range(args.rows)]
+    client = LLMCategorizer(endpoint, batch_size=args.batch_size, concurrency=args.concurrency, backoff=0.05)
+    try:
+        labels, _ = client.predict(descriptions)
+    finally:
+        if server is not None:
+            server.shutdown()
+    s = client.stats
+    print(
+        f"{s['rows']} rows in {s['seconds']:.2f}s: {client.rows_per_second:,.0f} rows/s "
+        f"({s['requests']} requests, {s['retries']} retries, {s['failed']} failed, "
+        f"{sum(label is not None for label in labels)} categorized)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+from finance_ai.intelligence.llm_categorizer import parse_prompt
+from finance_ai.intelligence.rules import description_key, resolve_description
+
+# Offline stand-in for a chat-completions endpoint. It answers the prompts
+# built by llm_categorizer with the rule engine, so the async client, batching,
+# retries and caching can be exercised and benchmarked without a model.
+# Optional latency and failure injection mimic a real server under load.
+
+
+def _handler(latency: float, fail_rate: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            if latency:
+                time.sleep(latency)
+            if fail_rate and random.random() < fail_rate:
+                return self._reply(503, {'error': 'overloaded'})
+            try:
+                messages = json.loads(body)['messages']
+                system = next(m['content'] for m in messages if m['role'] == 'system')
+                prompt = next(m['content'] for m in reversed(messages) if m['role'] == 'user')
+            except (ValueError, KeyError, StopIteration):
+                return self._reply(400, {'error': 'expected a chat-completions request'})
+            allowed_match = re.search(r'Allowed categories: (.*?)\. Reply', system)
+            allowed = set(allowed_match.group(1).split(', ')) if allowed_match else None
+            answers = {}
+            for number, text in parse_prompt(prompt):
+                category = resolve_description(description_key(text))[2]
+                answers[str(number)] = category if allowed is None or category in allowed else None
+            self._reply(200, {'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': json.dumps(answers)}}]})
+
+        def _reply(self, status: int, payload: dict):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def make_server(host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, fail_rate: float = 0.0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), _handler(latency, fail_rate))
+    server.daemon_threads = True
+    return server
+
+
+def start_server(host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, fail_rate: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+    """Serve in a background thread; returns the server (call ``shutdown()``) and its endpoint URL."""
+    server = make_server(host, port, latency, fail_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1/chat/completions"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Rule-based stand-in for an LLM chat-completions endpoint.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="Delay per request (seconds)")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    args = ap.parse_args()
+    server = make_server(args.host, args.port, args.latency, args.fail_rate)
+    print(f"Serving on http://{args.host}:{server.server_address[1]}/v1/chat/completions")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
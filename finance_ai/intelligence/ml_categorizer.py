@@ -0,0 +1,258 @@
+import argparse
+import os
+import threading
+import zlib
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from finance_ai.config import CONFIG
+from finance_ai.intelligence.rules import rule_set_version, sync_rules
+
+# Local fallback categorizer for descriptions no rule matches: hashed character
+# n-grams fed to a multinomial logistic regression, trained with minibatch SGD
+# in NumPy. Labels come from the resolution cache (rule results and user
+# corrections), never from the model's own predictions.
+
+N_FEATURES = 2 ** 17
+NGRAM_RANGE = (2, 4)
+FULL_EPOCHS = 10
+INCREMENTAL_EPOCHS = 3
+# Older labels replayed per new label during incremental updates
+REPLAY_RATIO = 4
+USER_LABEL_WEIGHT = 3.0
+BATCH_SIZE = 32
+LEARNING_RATE = 1.0
+L2 = 1e-6
+
+Features = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def hash_features(texts: Iterable[str], n_features: int = N_FEATURES) -> Features:
+    """CSR arrays (indptr, indices, values) of L2-normalized hashed n-gram counts.
+
+    Uses crc32, so feature ids are stable across processes and saved weights.
+    """
+    lo, hi = NGRAM_RANGE
+    indptr = [0]
+    indices: List[np.ndarray] = []
+    values: List[np.ndarray] = []
+    for text in texts:
+        padded = f" {text} "
+        ids = np.fromiter(
+            (zlib.crc32(padded[i:i + n].encode("utf-8")) for n in range(lo, hi + 1) for i in range(len(padded) - n + 1)),
+            dtype=np.int64,
+        ) % n_features
+        uniq, counts = np.unique(ids, return_counts=True)
+        weights = counts / np.sqrt((counts ** 2).sum())
+        indices.append(uniq)
+        values.append(weights.astype(np.float32))
+        indptr.append(indptr[-1] + len(uniq))
+    if not indices:
+        return np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    return np.asarray(indptr, dtype=np.int64), np.concatenate(indices), np.concatenate(values)
+
+
+def _rows(X: Features, rows: np.ndarray) -> Features:
+    indptr, indices, values = X
+    starts, ends = indptr[rows], indptr[rows + 1]
+    lengths = ends - starts
+    take = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)]) if len(rows) else np.empty(0, dtype=np.int64)
+    return np.concatenate([[0], np.cumsum(lengths)]), indices[take], values[take]
+
+
+class CategoryModel:
+    """Softmax regression over hashed n-gram features with incremental updates."""
+
+    def __init__(self, classes: Sequence[str] = (), n_features: int = N_FEATURES):
+        self.n_features = n_features
+        self.classes: List[str] = list(classes)
+        self.W = np.zeros((n_features, len(self.classes)), dtype=np.float32)
+        self.b = np.zeros(len(self.classes), dtype=np.float32)
+        self.trained_until: Optional[pd.Timestamp] = None
+        self.rule_version: Optional[str] = None
+
+    def _add_classes(self, labels: Iterable[str]) -> None:
+        new = [c for c in dict.fromkeys(labels) if c not in self.classes]
+        if new:
+            self.classes.extend(new)
+            self.W = np.hstack([self.W, np.zeros((self.n_features, len(new)), dtype=np.float32)])
+            self.b = np.concatenate([self.b, np.zeros(len(new), dtype=np.float32)])
+
+    def _scores(self, X: Features) -> np.ndarray:
+        indptr, indices, values = X
+        n = len(indptr) - 1
+        scores = np.tile(self.b, (n, 1))
+        if len(indices):
+            row = np.repeat(np.arange(n), np.diff(indptr))
+            np.add.at(scores, row, self.W[indices] * values[:, None])
+        return scores
+
+    def _proba(self, X: Features) -> np.ndarray:
+        scores = self._scores(X)
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        scores /= scores.sum(axis=1, keepdims=True)
+        return scores
+
+    def partial_fit(self, texts: Sequence[str], labels: Sequence[str], sample_weight=None,
+                    epochs: int = INCREMENTAL_EPOCHS, seed: int = 0) -> "CategoryModel":
+        """Run ``epochs`` SGD passes over the given examples, adding unseen classes."""
+        if not len(texts):
+            return self
+        self._add_classes(labels)
+        X = hash_features(texts, self.n_features)
+        index = {c: i for i, c in enumerate(self.classes)}
+        y = np.fromiter((index[label] for label in labels), dtype=np.int64, count=len(labels))
+        w = np.ones(len(y), dtype=np.float32) if sample_weight is None else np.asarray(sample_weight, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            order = rng.permutation(len(y))
+            for start in range(0, len(order), BATCH_SIZE):
+                batch = order[start:start + BATCH_SIZE]
+                Xb = _rows(X, batch)
+                grad = self._proba(Xb)
+                grad[np.arange(len(batch)), y[batch]] -= 1.0
+                grad *= (w[batch] / len(batch))[:, None]
+                indptr, indices, values = Xb
+                row = np.repeat(np.arange(len(batch)), np.diff(indptr))
+                if L2:
+                    self.W[np.unique(indices)] *= 1.0 - LEARNING_RATE * L2
+                np.add.at(self.W, indices, -LEARNING_RATE * values[:, None] * grad[row])
+                self.b -= LEARNING_RATE * grad.sum(axis=0)
+        return self
+
+    def predict(self, texts: Sequence[str]) -> Tuple[List[Optional[str]], np.ndarray]:
+        """Best class and its probability for each text, in one vectorized pass."""
+        if not self.classes or not len(texts):
+            return [None] * len(texts), np.zeros(len(texts))
+        proba = self._proba(hash_features(texts, self.n_features))
+        best = proba.argmax(axis=1)
+        return [self.classes[i] for i in best], proba[np.arange(len(best)), best]
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp, W=self.W, b=self.b, classes=np.asarray(self.classes, dtype=object).astype(str),
+            n_features=self.n_features,
+            trained_until=str(self.trained_until) if self.trained_until is not None else "",
+            rule_version=self.rule_version or "",
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CategoryModel":
+        with np.load(path) as data:
+            model = cls(classes=[str(c) for c in data['classes']], n_features=int(data['n_features']))
+            model.W = data['W']
+            model.b = data['b']
+            model.trained_until = pd.Timestamp(str(data['trained_until'])) if str(data['trained_until']) else None
+            model.rule_version = str(data['rule_version']) or None
+        return model
+
+
+@lru_cache(maxsize=4)
+def _load_cached(path: str, mtime: float) -> CategoryModel:
+    return CategoryModel.load(path)
+
+
+def load_model(path: Optional[str] = None) -> Optional[CategoryModel]:
+    """The saved model, reloaded only when the file changes; None if not trained yet."""
+    path = path or CONFIG.category_model_path
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    return _load_cached(path, mtime)
+
+
+def train_model(repo, path: Optional[str] = None, full: bool = False) -> dict:
+    """Train (or incrementally update) the fallback model from labels in the store.
+
+    Without a saved model, or with ``full``, trains from scratch on every label.
+    Otherwise runs a few passes over labels newer than the last training,
+    replaying a sample of older ones so earlier classes are not forgotten.
+    Cached model predictions are dropped afterwards so they get re-predicted.
+    """
+    path = path or CONFIG.category_model_path
+    sync_rules(repo)
+    version = rule_set_version()
+    # A private copy: the cached instance may be serving predictions
+    model = CategoryModel.load(path) if not full and os.path.exists(path) else None
+    if model is not None and model.rule_version != version:
+        model = None  # rule labels changed meaning; start over
+    labels = repo.training_labels(version)
+    result = {'labels': len(labels), 'trained_on': 0, 'mode': 'full' if model is None else 'incremental'}
+    if labels.empty:
+        return result
+    weight = np.where(labels['source'] == 'user', USER_LABEL_WEIGHT, 1.0)
+    if model is None:
+        model = CategoryModel()
+        model.partial_fit(labels['desc_key'].tolist(), labels['category'].tolist(), weight, epochs=FULL_EPOCHS)
+        result['trained_on'] = len(labels)
+    else:
+        new = labels['updated_at'] > model.trained_until
+        if not new.any():
+            return result
+        old = np.flatnonzero(~new.to_numpy())
+        replay = np.random.default_rng(len(labels)).choice(old, size=min(len(old), REPLAY_RATIO * int(new.sum())), replace=False)
+        batch = np.concatenate([np.flatnonzero(new.to_numpy()), replay])
+        model.partial_fit(
+            labels['desc_key'].to_numpy()[batch].tolist(), labels['category'].to_numpy()[batch].tolist(),
+            weight[batch], epochs=INCREMENTAL_EPOCHS,
+        )
+        result['trained_on'] = len(batch)
+    model.trained_until = pd.Timestamp(labels['updated_at'].max())
+    model.rule_version = version
+    model.save(path)
+    repo.clear_resolutions('model')
+    return result
+
+
+_training = threading.Lock()
+_training_pending = threading.Event()
+
+
+def train_in_background(repo, path: Optional[str] = None) -> None:
+    """Run incremental ``train_model`` on a worker thread so the caller (the UI) never waits.
+
+    Requests made while a run is in progress are folded into one more run
+    after it; ``train_model`` itself returns early when no labels changed.
+    """
+    _training_pending.set()
+    if not _training.acquire(blocking=False):
+        return
+
+    def work():
+        try:
+            while _training_pending.is_set():
+                _training_pending.clear()
+                train_model(repo, path)
+        finally:
+            _training.release()
+        if _training_pending.is_set():
+            train_in_background(repo, path)  # requested between the last run and the release
+
+    threading.Thread(target=work, name="category-model-training", daemon=True).start()
+
+
+def main():
+    from finance_ai.storage.db import init_db
+    from finance_ai.storage.repository import TransactionRepository
+
+    ap = argparse.ArgumentParser(description="Train the local fallback category model.")
+    ap.add_argument("--db", default=os.path.join("data", "finance.db"), help="SQLite database path")
+    ap.add_argument("--model", default=CONFIG.category_model_path, help="Weights file (.npz)")
+    ap.add_argument("--full", action="store_true", help="Retrain from scratch instead of updating")
+    args = ap.parse_args()
+
+    engine, SessionLocal = init_db(os.path.abspath(args.db))
+    result = train_model(TransactionRepository(engine=engine, SessionLocal=SessionLocal), args.model, full=args.full)
+    print(f"{result['mode']}: trained on {result['trained_on']} of {result['labels']} labels")
+
+
+if __name__ == "__main__":
+    main()
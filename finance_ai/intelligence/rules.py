@@ -0,0 +1,200 @@
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from finance_ai.intelligence.keywords import KeywordEngine
+
+# Keyword rule tables for merchant, MCC and category resolution. Within each
+# table the first rule whose keyword occurs in the description wins. These are
+# the built-in defaults; a store (the repository) holds the user-editable copy.
+
+MERCHANT_NORMALIZATION = [
+    ("starbucks", "Starbucks"),
+    ("amazon", "Amazon"),
+    ("ubereats", "Uber Eats"),
+    ("uber", "Uber"),
+    ("lyft", "Lyft"),
+]
+
+MCC_RULES = [
+    ("coffee", "5814"),
+    ("starbucks", "5814"),
+    ("grocery", "5411"),
+    ("amazon", "5310"),
+    ("uber", "4121"),
+]
+
+# Simple keyword rules for MVP. Extend with embeddings/ML and LLM fallback.
+CATEGORY_RULES = [
+    ("grocery", "Groceries"),
+    ("supermarket", "Groceries"),
+    ("whole foods", "Groceries"),
+    ("trader joe", "Groceries"),
+    ("starbucks", "Coffee"),
+    ("coffee", "Coffee"),
+    ("uber", "Transport"),
+    ("lyft", "Transport"),
+    ("gas", "Auto & Gas"),
+    ("shell", "Auto & Gas"),
+    ("rent", "Rent"),
+    ("mortgage", "Mortgage"),
+    ("netflix", "Entertainment"),
+    ("spotify", "Entertainment"),
+    ("amazon", "Shopping"),
+    ("apple", "Shopping"),
+]
+
+SUBCATEGORY_RULES = {
+    "Coffee": "Cafe",
+    "Transport": "Rideshare",
+}
+
+RESOLVED_COLUMNS = ['merchant', 'mcc', 'category', 'subcategory']
+
+# Distinct descriptions remembered per process; histories repeat the same few
+# thousand strings, so repeat uploads mostly hit this cache.
+RESOLVE_CACHE_SIZE = 100_000
+
+
+RESOLUTION_SOURCES = ('rule', 'model', 'llm', 'user')
+
+# Editable rule tables, by kind. 'subcategory' rules map a category (keyword)
+# to its subcategory (value) instead of matching descriptions.
+RULE_KINDS = ('merchant', 'mcc', 'category', 'subcategory')
+
+DEFAULT_RULES = {
+    'merchant': MERCHANT_NORMALIZATION,
+    'mcc': MCC_RULES,
+    'category': CATEGORY_RULES,
+    'subcategory': list(SUBCATEGORY_RULES.items()),
+}
+
+
+class RuleSet:
+    """Rule tables at one version, with their compiled keyword engine."""
+
+    def __init__(self, tables: dict, version: int = 0):
+        self.tables = {kind: [tuple(rule) for rule in tables.get(kind, [])] for kind in RULE_KINDS}
+        self.version = version
+        self.subcategories = dict(self.tables['subcategory'])
+        self.engine = KeywordEngine({kind: self.tables[kind] for kind in ('merchant', 'mcc', 'category')})
+
+
+# Version 0 is the built-in defaults; stores number their versions from 1
+_active = RuleSet(DEFAULT_RULES)
+
+
+def active_rules() -> RuleSet:
+    return _active
+
+
+def set_active_rules(tables: dict, version: int) -> RuleSet:
+    """Swap in new rule tables; memoized resolutions from the old ones are dropped."""
+    global _active
+    _active = RuleSet(tables, version)
+    resolve_description.cache_clear()
+    return _active
+
+
+def sync_rules(store) -> RuleSet:
+    """Hot reload: pick up the store's rules if their version counter moved."""
+    version = store.get_rule_version()
+    if version != _active.version:
+        return set_active_rules(store.load_rules(), version)
+    return _active
+
+
+def rule_set_version() -> str:
+    """Version of the active rules; cached resolutions from another version are stale."""
+    return str(_active.version)
+
+
+def changed_keywords(old: dict, new: dict) -> list:
+    """Keywords whose matches may resolve differently between two sets of tables.
+
+    Per kind: rules added or removed, rules whose value changed, and rules whose
+    rank among the rules kept changed (a reorder can change which rule wins).
+    """
+    keywords = set()
+    for kind in ('merchant', 'mcc', 'category'):
+        before, after = dict(old.get(kind, [])), dict(new.get(kind, []))
+        keywords |= before.keys() ^ after.keys()
+        keywords |= {k for k in before.keys() & after.keys() if before[k] != after[k]}
+        kept_before = [k for k, _ in old.get(kind, []) if k in after]
+        kept_after = [k for k, _ in new.get(kind, []) if k in before]
+        keywords |= {a for a, b in zip(kept_before, kept_after) if a != b}
+        keywords |= {b for a, b in zip(kept_before, kept_after) if a != b}
+    return sorted(keywords)
+
+
+def description_key(text: str) -> str:
+    """Normalized cache key: lower-cased with whitespace collapsed."""
+    return ' '.join(str(text).lower().split())
+
+
+def rule_engine() -> KeywordEngine:
+    """One automaton over every keyword table of the active rules."""
+    return _active.engine
+
+
+@lru_cache(maxsize=RESOLVE_CACHE_SIZE)
+def resolve_description(key: str) -> tuple:
+    """(merchant, mcc, category, subcategory) for one ``description_key``."""
+    merchant, mcc, category = _active.engine.scan(key)
+    return merchant, mcc, category, _active.subcategories.get(category)
+
+
+def resolve_descriptions(
+    descriptions: Iterable[str],
+    fallback_category: Optional[str] = None,
+    store=None,
+    model=None,
+    min_confidence: float = 0.0,
+    llm=None,
+) -> pd.DataFrame:
+    """Merchant, MCC, category and subcategory per description, as categoricals.
+
+    Work happens once per distinct description key: ``store`` (a repository
+    with ``lookup_resolutions``/``store_resolutions``) is asked in bulk first,
+    the rule engine (through the LRU cache) resolves the rest, and new results
+    are written back. Keys still without a category go to ``model`` (anything
+    with ``predict(keys) -> (labels, confidences)``) in one batch; predictions
+    below ``min_confidence`` are dropped. Whatever is left goes to ``llm`` (same
+    interface, e.g. ``LLMCategorizer``). Everything is broadcast back through
+    the factorized codes, so the per-row cost is integer indexing. Categories
+    still missing get ``fallback_category``.
+    """
+    if store is not None:
+        sync_rules(store)
+    codes, uniques = pd.factorize(pd.Series(descriptions, dtype=object).fillna(''))
+    keys = [description_key(u) for u in uniques]
+    known = {}
+    if store is not None and keys:
+        known = store.lookup_resolutions(set(keys), rule_set_version())
+    fresh = {k: resolve_description(k) for k in keys if k not in known}
+    if store is not None and fresh:
+        store.store_resolutions(fresh, rule_set_version(), source='rule')
+    known.update(fresh)
+    for predictor, source, threshold in ((model, 'model', min_confidence), (llm, 'llm', 0.0)):
+        if predictor is None:
+            continue
+        pending = [k for k in dict.fromkeys(keys) if known[k][2] is None]
+        if pending:
+            labels, confidence = predictor.predict(pending)
+            predicted = {
+                k: known[k][:2] + (label, _active.subcategories.get(label))
+                for k, label, conf in zip(pending, labels, confidence)
+                if label is not None and conf >= threshold
+            }
+            if store is not None and predicted:
+                store.store_resolutions(predicted, rule_set_version(), source=source)
+            known.update(predicted)
+    table = pd.DataFrame([known[k] for k in keys], columns=RESOLVED_COLUMNS)
+    if fallback_category is not None:
+        table['category'] = table['category'].fillna(fallback_category)
+    resolved = {}
+    for col in RESOLVED_COLUMNS:
+        value_codes, values = pd.factorize(table[col])
+        resolved[col] = pd.Categorical.from_codes(value_codes[codes], categories=values)
+    return pd.DataFrame(resolved)
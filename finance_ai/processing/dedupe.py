@@ -1,21 +1,196 @@
-import hashlib
+from typing import Optional
+
+import numpy as np
 import pandas as pd
 
+# Row fingerprints: a 64-bit key built column-wise from the date (day), the
+# amount (cents) and the stripped, lower-cased description, mixed with an
+# occurrence counter so genuine repeats (two identical coffees on the same day)
+# get distinct keys while re-imports of the same statement collide.
+
+_M1 = np.uint64(0xBF58476D1CE4E5B9)
+_M2 = np.uint64(0x94D049BB133111EB)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def mix64(x: np.ndarray) -> np.ndarray:
+    # splitmix64 finalizer; uint64 arithmetic wraps. The Bloom filter probes with
+    # it too (storage.bloom), so stored filters stay valid only while it is unchanged
+    x = (x ^ (x >> np.uint64(30))) * _M1
+    x = (x ^ (x >> np.uint64(27))) * _M2
+    return x ^ (x >> np.uint64(31))
+
+
+def _days_cents(df: pd.DataFrame):
+    dates = pd.to_datetime(df['date'])
+    days = dates.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+    amounts = pd.to_numeric(df['amount'], errors='coerce').fillna(0.0).to_numpy(dtype=np.float64)
+    return days, np.round(amounts * 100).astype(np.int64)
+
 
-def _row_hash(row) -> str:
-    # Stable hash on date (YYYY-MM-DD), amount (rounded 0.01), and description
-    date_str = pd.to_datetime(row['date']).strftime('%Y-%m-%d') if pd.notna(row['date']) else ''
-    amt = round(float(row['amount']), 2) if pd.notna(row['amount']) else 0.0
-    desc = (row.get('description') or '').strip().lower()
-    payload = f"{date_str}|{amt:.2f}|{desc}"
-    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+def row_keys(df: pd.DataFrame) -> np.ndarray:
+    """Content key per row (uint64), without the occurrence counter."""
+    days, cents = _days_cents(df)
+    # Normalize and hash each distinct description once
+    codes, uniques = pd.factorize(df['description'].fillna('').astype(str), use_na_sentinel=False)
+    norm = pd.Index(uniques).str.strip().str.lower()
+    desc_hash = pd.util.hash_array(np.asarray(norm, dtype=object))[codes]
+    with np.errstate(over='ignore'):
+        key = mix64(days.view(np.uint64) ^ _GOLDEN)
+        key = mix64(key ^ cents.view(np.uint64))
+        return mix64(key ^ desc_hash)
 
 
-def compute_hashes(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    df['tx_hash'] = df.apply(_row_hash, axis=1)
+def compute_hashes(df: pd.DataFrame, occurrences: Optional[dict] = None) -> pd.DataFrame:
+    """Add ``tx_key``: a signed 64-bit fingerprint of (date, amount, description, occurrence).
+
+    The occurrence is the row's rank among identical rows in the same file.
+    Pass the same ``occurrences`` dict for every chunk of a file so counting
+    continues across chunk boundaries.
+    """
+    df = df.copy(deep=False)
+    if df.empty:
+        df['tx_key'] = pd.Series(dtype=np.int64)
+        return df
+    keys = row_keys(df)
+    key_series = pd.Series(keys)
+    occ = key_series.groupby(keys, sort=False).cumcount().to_numpy(dtype=np.int64)
+    if occurrences is not None:
+        if occurrences:
+            occ = occ + key_series.map(occurrences).fillna(0).to_numpy(dtype=np.int64)
+        for key, count in key_series.value_counts(sort=False).items():
+            occurrences[key] = occurrences.get(key, 0) + count
+    with np.errstate(over='ignore'):
+        fingerprint = mix64(keys ^ mix64(occ.view(np.uint64) + _GOLDEN))
+    df['tx_key'] = fingerprint.view(np.int64)
     return df
 
 
-def filter_new_transactions(df: pd.DataFrame, existing_hashes: set) -> pd.DataFrame:
-    return df[~df['tx_hash'].isin(existing_hashes)].copy()
+def filter_new_transactions(df: pd.DataFrame, existing_keys) -> pd.DataFrame:
+    return df[~df['tx_key'].isin(existing_keys)]
+
+
+# Near duplicates: the same charge exported twice with a posting-date offset or
+# a reworded description. Rows are blocked on (account, amount) and swept in
+# date order, so only neighbours inside the day window are ever compared.
+
+NEAR_DUP_WINDOW_DAYS = 3
+NEAR_DUP_THRESHOLD = 0.8
+
+NEAR_DUP_COLUMNS = [
+    'keep_id', 'duplicate_id', 'account', 'amount', 'keep_date', 'duplicate_date',
+    'keep_description', 'duplicate_description', 'days_apart', 'similarity',
+]
+
+
+def normalize_descriptions(values: pd.Series) -> pd.Series:
+    """Lower-case letters only, single-spaced: 'AMAZON Mktp US*AB12' -> 'amazon mktp us ab'."""
+    return (
+        values.fillna('').astype(str).str.lower()
+        .str.replace(r'[^a-z]+', ' ', regex=True).str.strip()
+    )
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def description_similarity(a: str, b: str) -> float:
+    """Dice coefficient of character trigrams of two normalized descriptions."""
+    if a == b:
+        return 1.0
+    ta, tb = _trigrams(a), _trigrams(b)
+    return 2 * len(ta & tb) / (len(ta) + len(tb))
+
+
+def _sweep_pairs(block: np.ndarray, days: np.ndarray, window_days: int):
+    # block/days are sorted; compare each row with the next k rows until no
+    # row is within the window of its k-th successor
+    left, right = [], []
+    for k in range(1, len(days)):
+        near = (block[k:] == block[:-k]) & (days[k:] - days[:-k] <= window_days)
+        if not near.any():
+            break
+        i = np.flatnonzero(near)
+        left.append(i)
+        right.append(i + k)
+    if not left:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    return np.concatenate(left), np.concatenate(right)
+
+
+def find_near_duplicates(
+    df: pd.DataFrame,
+    window_days: int = NEAR_DUP_WINDOW_DAYS,
+    threshold: float = NEAR_DUP_THRESHOLD,
+) -> pd.DataFrame:
+    """Pairs of rows that look like the same transaction imported twice.
+
+    Candidates share account and amount, are at most ``window_days`` apart and
+    have normalized descriptions with similarity >= ``threshold``. Rows identical
+    in date, amount and description are genuine repeats (see ``compute_hashes``)
+    and never paired. The row with the lower id is kept; each duplicate appears
+    once, pointing at the row that survives. Ids come from an ``id`` column if
+    present, else the index.
+    """
+    if len(df) < 2:
+        return pd.DataFrame(columns=NEAR_DUP_COLUMNS)
+    ids = (df['id'] if 'id' in df.columns else df.index.to_series()).to_numpy()
+    days, cents = _days_cents(df)
+    accounts = pd.factorize(df['account'], use_na_sentinel=False)[0] if 'account' in df.columns else np.zeros(len(df), dtype=np.intp)
+    # One block per (account, amount); cents fit comfortably below 2**40
+    block = accounts.astype(np.int64) << 40 | (cents & ((1 << 40) - 1))
+    order = np.lexsort((days, block))
+    left, right = _sweep_pairs(block[order], days[order], window_days)
+    a, b = order[left], order[right]
+
+    content = row_keys(df)
+    distinct = content[a] != content[b]
+    a, b = a[distinct], b[distinct]
+    if not len(a):
+        return pd.DataFrame(columns=NEAR_DUP_COLUMNS)
+
+    # Score each distinct pair of normalized descriptions once
+    codes, uniques = pd.factorize(normalize_descriptions(df['description'].astype(object)))
+    uniques = list(uniques)
+    pair_codes = pd.DataFrame({'a': codes[a], 'b': codes[b]})
+    scored = pair_codes.drop_duplicates()
+    scored['similarity'] = [
+        description_similarity(uniques[x], uniques[y]) for x, y in zip(scored['a'], scored['b'])
+    ]
+    similarity = pair_codes.merge(scored, on=['a', 'b'], how='left')['similarity'].to_numpy()
+    match = similarity >= threshold
+    a, b, similarity = a[match], b[match], similarity[match]
+
+    swap = ids[a] > ids[b]
+    keep = np.where(swap, b, a)
+    dup = np.where(swap, a, b)
+    pairs = pd.DataFrame({'keep': keep, 'dup': dup, 'similarity': similarity})
+    # Best match per duplicate, then point chains (a <- b <- c) at their root
+    pairs = pairs.sort_values('similarity', ascending=False, kind='stable').drop_duplicates('dup')
+    root = pd.Series(pairs['keep'].to_numpy(), index=pairs['dup'].to_numpy())
+    keep = pairs['keep']
+    for _ in range(len(pairs)):
+        parent = keep.map(root)
+        if parent.isna().all():
+            break
+        keep = parent.fillna(keep).astype(np.intp)
+    pairs['keep'] = keep
+    pairs = pairs[pairs['keep'] != pairs['dup']]
+
+    k, d = pairs['keep'].to_numpy(), pairs['dup'].to_numpy()
+    desc = df['description'].astype(object).to_numpy()
+    out = pd.DataFrame({
+        'keep_id': ids[k],
+        'duplicate_id': ids[d],
+        'account': df['account'].astype(object).to_numpy()[k] if 'account' in df.columns else None,
+        'amount': cents[k] / 100,
+        'keep_date': pd.to_datetime(df['date']).to_numpy()[k],
+        'duplicate_date': pd.to_datetime(df['date']).to_numpy()[d],
+        'keep_description': desc[k],
+        'duplicate_description': desc[d],
+        'days_apart': np.abs(days[d] - days[k]),
+        'similarity': pairs['similarity'].round(3).to_numpy(),
+    })
+    return out.sort_values(['keep_date', 'keep_id'], kind='stable').reset_index(drop=True)
@@ -0,0 +1,262 @@
+import string
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from finance_ai.intelligence.rules import active_rules
+from finance_ai.processing.dedupe import mix64
+
+# Merchant canonicalization: strip the noise banks add to descriptions (store
+# numbers, references, trip/location suffixes), then map the cleaned name to
+# a known merchant through a nearest-neighbour search over sparse character
+# trigram vectors. Everything is local NumPy; no network, no model files.
+
+MATCH_THRESHOLD = 0.72
+QUERY_BLOCK = 4096
+MAX_NAME_BYTES = 48
+# MinHash LSH: BANDS x BAND_ROWS signature values per name. Names that agree on
+# every value of any band become candidates; cosine >= 0.72 is roughly Jaccard
+# >= 0.56, which collides in some band with probability ~0.97, while names
+# sharing a fifth of their trigrams collide only ~5% of the time.
+BANDS = 32
+BAND_ROWS = 4
+# A bucket shared by more names than this only yields its first members
+MAX_BUCKET = 64
+# Unmatched names stop joining the index past this size (about 50 MB)
+MAX_INDEX_NAMES = 100_000
+# The memo of cleaned name -> merchant is dropped when it grows past this
+MAX_CACHED_NAMES = 500_000
+
+# Payment-processor prefixes ("SQ *BLUE BOTTLE") hide the real merchant behind them
+_PROCESSOR_PREFIX = r'^(?:sq|tst|pp|paypal|sp|ic|dd|pos)\s*\*\s*'
+NOISE_TOKENS = (
+    'pos', 'purchase', 'debit', 'credit', 'card', 'visa', 'mastercard', 'payment', 'pymt',
+    'checkcard', 'trip', 'ride', 'store', 'inc', 'llc', 'ltd', 'corp', 'co', 'www', 'com', 'us', 'usa',
+)
+_NOISE_RE = r'\b(?:' + '|'.join(NOISE_TOKENS) + r')\b'
+# Card terminals append the state; only a trailing code after a longer name is dropped
+STATE_CODES = (
+    'al ak az ar ca co ct de fl ga hi id il in ia ks ky la me md ma mi mn ms mo mt ne nv nh nj nm ny nc nd '
+    'oh ok or pa ri sc sd tn tx ut vt va wa wv wi wy dc'
+).split()
+_STATE_RE = r'(?<=\S)\s+(?:' + '|'.join(STATE_CODES) + r')$'
+
+# Multiply-shift hash functions (odd multiplier, offset) for the MinHash signature
+_HASH_A = np.random.default_rng(0x5EED).integers(1, 2**63, BANDS * BAND_ROWS, dtype=np.uint64) | np.uint64(1)
+_HASH_B = np.random.default_rng(0xB0B).integers(0, 2**63, BANDS * BAND_ROWS, dtype=np.uint64)
+
+
+def clean_merchant_names(values: pd.Series) -> pd.Series:
+    """'UBER TRIP - SF' -> 'uber', 'STARBUCKS #1234 WA' -> 'starbucks', 'SQ *BLUE BOTTLE 22' -> 'blue bottle'.
+
+    Names that would clean to nothing keep their lower-cased, single-spaced form.
+    """
+    raw = pd.Series(values, dtype=object).fillna('').astype(str).str.lower()
+    s = raw.str.replace(_PROCESSOR_PREFIX, '', regex=True)
+    s = s.str.replace(r'\*.*$', '', regex=True)          # reference after '*'
+    s = s.str.replace(r'\s+-\s+.*$', '', regex=True)      # ' - SF' style suffixes
+    s = s.str.replace(r'\S*\d\S*', ' ', regex=True)       # store numbers, refs, dates
+    s = s.str.replace(r"[^a-z&' ]+", ' ', regex=True)
+    s = s.str.replace(_NOISE_RE, ' ', regex=True)
+    s = s.str.split().str.join(' ').str.replace(_STATE_RE, '', regex=True)
+    fallback = raw.str.split().str.join(' ')
+    return s.where(s != '', fallback)
+
+
+def name_vectors(names: Sequence[str]):
+    """Sparse L2-normalized trigram counts as CSR arrays ``(indptr, trigrams, weights)``.
+
+    A trigram's id is its three bytes read as a 24-bit integer, so there is no
+    hashing and no collisions. Names are laid out as a fixed-width byte matrix
+    so every trigram of every name is formed in one vectorized pass; one
+    ``np.unique`` over (row, trigram) keys then counts them per row, sorted by
+    trigram within each row.
+    """
+    n = len(names)
+    if not n:
+        return np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    padded = pd.Series([f"  {name} " for name in names], dtype=object).str.encode('utf-8').str[:MAX_NAME_BYTES]
+    raw = np.array(padded.tolist(), dtype=f'S{MAX_NAME_BYTES}')
+    lengths = np.char.str_len(raw)
+    b = np.frombuffer(raw.tobytes(), dtype=np.uint8).reshape(n, MAX_NAME_BYTES).astype(np.int64)
+    grams = (b[:, :-2] << 16) | (b[:, 1:-1] << 8) | b[:, 2:]
+    valid = np.arange(MAX_NAME_BYTES - 2)[None, :] < (lengths - 2)[:, None]
+    rows = np.broadcast_to(np.arange(n, dtype=np.int64)[:, None], grams.shape)[valid]
+    keys, counts = np.unique((rows << 24) | grams[valid], return_counts=True)
+    rows = keys >> 24
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    weights = counts.astype(np.float32)
+    norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=n)).astype(np.float32)
+    return indptr, keys & 0xFFFFFF, weights / norms[rows]
+
+
+def minhash_bands(indptr: np.ndarray, trigrams: np.ndarray) -> np.ndarray:
+    """LSH bucket key per name and band, shape (names, BANDS).
+
+    Each block of names hashes its distinct trigrams once with every hash
+    function, then takes the per-name minimum of all of them in one ``reduceat``.
+    """
+    n = len(indptr) - 1
+    out = np.empty((n, BANDS), dtype=np.uint64)
+    for start in range(0, n, QUERY_BLOCK):
+        stop = min(start + QUERY_BLOCK, n)
+        lo, hi = indptr[start], indptr[stop]
+        grams, inverse = np.unique(trigrams[lo:hi], return_inverse=True)
+        # uint64 arithmetic wraps; the high 32 bits are the hash
+        hashed = ((_HASH_A[:, None] * grams.astype(np.uint64) + _HASH_B[:, None]) >> np.uint64(32)).astype(np.uint32)
+        signature = np.minimum.reduceat(hashed.take(inverse, axis=1), indptr[start:stop] - lo, axis=1).T.astype(np.uint64)
+        signature = signature.reshape(stop - start, BANDS, BAND_ROWS)
+        key = np.broadcast_to(np.arange(BANDS, dtype=np.uint64), (stop - start, BANDS))
+        for row in range(BAND_ROWS):
+            key = mix64(key ^ signature[:, :, row])
+        out[start:stop] = key
+    return out
+
+
+class MerchantIndex:
+    """Canonical merchant names with a cosine nearest-neighbour lookup.
+
+    ``canonicalize`` maps cleaned names to the closest known merchant when the
+    similarity reaches ``threshold``; anything else becomes a merchant of its
+    own (capitalized) and joins the index, until it holds ``max_names``, so
+    later variants map onto it. Candidates come from MinHash LSH buckets and
+    only those are scored with an exact sparse cosine, so a lookup costs about
+    the same however large the index is. Results are memoized per cleaned name.
+    """
+
+    def __init__(self, merchants: Iterable[str] = (), threshold: float = MATCH_THRESHOLD,
+                 max_names: int = MAX_INDEX_NAMES):
+        self.threshold = threshold
+        self.max_names = max_names
+        self.names: List[str] = []
+        self._known = set()
+        # name_vectors of every indexed name, as one CSR matrix
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._trigrams = np.zeros(0, dtype=np.int32)
+        self._weights = np.zeros(0, dtype=np.float32)
+        # Per band (one row each): every name's bucket key in sorted order, and the name's index
+        self._bucket_keys = np.zeros((BANDS, 0), dtype=np.uint64)
+        self._bucket_rows = np.zeros((BANDS, 0), dtype=np.int32)
+        self._cache: Dict[str, str] = {}
+        self.add(merchants)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, merchants: Iterable[str]) -> None:
+        new = [m for m in dict.fromkeys(merchants) if m and m not in self._known][:max(self.max_names - len(self.names), 0)]
+        if not new:
+            return
+        indptr, trigrams, weights = name_vectors(clean_merchant_names(pd.Series(new)).tolist())
+        rows = np.arange(len(self.names), len(self.names) + len(new), dtype=np.int32)
+        self._indptr = np.concatenate([self._indptr, indptr[1:] + self._indptr[-1]])
+        self._trigrams = np.concatenate([self._trigrams, trigrams.astype(np.int32)])
+        self._weights = np.concatenate([self._weights, weights])
+        keys = np.concatenate([self._bucket_keys, minhash_bands(indptr, trigrams).T], axis=1)
+        rows = np.concatenate([self._bucket_rows, np.broadcast_to(rows, (BANDS, len(new)))], axis=1)
+        # Already sorted runs, so the stable sort is close to a merge
+        order = np.argsort(keys, axis=1, kind='stable')
+        self._bucket_keys = np.take_along_axis(keys, order, axis=1)
+        self._bucket_rows = np.take_along_axis(rows, order, axis=1)
+        self.names.extend(new)
+        self._known.update(new)
+
+    def _candidates(self, bands: np.ndarray):
+        # (query row, index row) pairs sharing at least one band bucket, deduplicated
+        queries, rows = [], []
+        for band, (sorted_keys, order) in enumerate(zip(self._bucket_keys, self._bucket_rows)):
+            lo = np.searchsorted(sorted_keys, bands[:, band], side='left')
+            hi = np.searchsorted(sorted_keys, bands[:, band], side='right')
+            size = np.minimum(hi - lo, MAX_BUCKET)
+            hit = np.flatnonzero(size)
+            if not len(hit):
+                continue
+            size = size[hit]
+            offsets = np.arange(size.sum()) - np.repeat(np.cumsum(size) - size, size)
+            queries.append(np.repeat(hit, size))
+            rows.append(order[np.repeat(lo[hit], size) + offsets])
+        if not queries:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        pairs = np.unique((np.concatenate(queries).astype(np.int64) << 32) | np.concatenate(rows).astype(np.int64))
+        return pairs >> 32, pairs & 0xFFFFFFFF
+
+    def nearest(self, cleaned: Sequence[str]):
+        """(index of best known merchant, cosine similarity) per cleaned name; -1 when no candidate shares a bucket."""
+        best = np.full(len(cleaned), -1, dtype=np.int64)
+        score = np.zeros(len(cleaned), dtype=np.float32)
+        if not self.names:
+            return best, score
+        for start in range(0, len(cleaned), QUERY_BLOCK):
+            indptr, trigrams, weights = name_vectors(cleaned[start:start + QUERY_BLOCK])
+            queries, rows = self._candidates(minhash_bands(indptr, trigrams))
+            if not len(queries):
+                continue
+            # Sparse dot product: look up each of the candidate's trigrams among the
+            # block's (row << 24 | trigram) keys, which are sorted and small
+            block = (np.repeat(np.arange(len(indptr) - 1, dtype=np.int64), np.diff(indptr)) << 24) | trigrams
+            lengths = np.diff(self._indptr)[rows]
+            pair = np.repeat(np.arange(len(rows)), lengths)
+            entry = np.repeat(self._indptr[rows], lengths) + np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            wanted = (queries[pair] << 24) | self._trigrams[entry]
+            pos = np.minimum(np.searchsorted(block, wanted), len(block) - 1)
+            shared = block[pos] == wanted
+            sims = np.bincount(pair[shared], weights=weights[pos[shared]] * self._weights[entry[shared]], minlength=len(queries))
+            # Best candidate per query: highest similarity, then lowest index row
+            top = np.lexsort((rows, -sims, queries))
+            first = top[np.r_[True, queries[top][1:] != queries[top][:-1]]]
+            best[start + queries[first]] = rows[first]
+            score[start + queries[first]] = sims[first]
+        return best, score
+
+    def canonicalize(self, cleaned: Sequence[str]) -> List[str]:
+        pending = [c for c in dict.fromkeys(cleaned) if c not in self._cache]
+        if len(self._cache) + len(pending) > MAX_CACHED_NAMES:
+            self._cache.clear()
+            pending = list(dict.fromkeys(cleaned))
+        if pending:
+            best, score = self.nearest(pending)
+            unmatched = []
+            for name, i, s in zip(pending, best, score):
+                if i >= 0 and s >= self.threshold:
+                    self._cache[name] = self.names[i]
+                else:
+                    self._cache[name] = string.capwords(name)
+                    unmatched.append(self._cache[name])
+            self.add(unmatched)
+        return [self._cache[c] for c in cleaned]
+
+
+_index: Optional[MerchantIndex] = None
+_index_version: Optional[int] = None
+
+
+def merchant_index(store=None) -> MerchantIndex:
+    """Process-wide index of rule merchants plus merchants already stored; rebuilt when rules change."""
+    global _index, _index_version
+    rules = active_rules()
+    if _index is None or _index_version != rules.version:
+        merchants = [value for _, value in rules.tables['merchant']]
+        if store is not None:
+            merchants += store.distinct_merchants()
+        _index, _index_version = MerchantIndex(merchants), rules.version
+    return _index
+
+
+def canonicalize_merchants(df: pd.DataFrame, store=None) -> pd.DataFrame:
+    """Fill missing merchants with the canonical merchant for each description.
+
+    Runs once per distinct description; rule-assigned merchants are kept.
+    """
+    df = df.copy(deep=False)
+    merchant = df['merchant'].astype(object) if 'merchant' in df.columns else pd.Series(None, index=df.index, dtype=object)
+    missing = merchant.isna().to_numpy()
+    if missing.any():
+        codes, uniques = pd.factorize(df['description'].astype(object).fillna('')[missing])
+        canonical = merchant_index(store).canonicalize(clean_merchant_names(pd.Series(uniques)).tolist())
+        values = merchant.to_numpy(copy=True)
+        values[missing] = np.asarray(canonical, dtype=object)[codes]
+        merchant = pd.Series(values, index=df.index)
+    df['merchant'] = pd.Categorical(merchant)
+    return df
@@ -1,6 +1,40 @@
+from typing import Optional, Tuple
+
+import numpy as np
 import pandas as pd
 from dateutil import parser as dateparser
 
+from finance_ai.processing.schema import TRANSACTION_COLUMNS, apply_schema
+
+# Transaction types treated as outflows when a bank exports unsigned amounts
+DEBIT_TYPES = {'debit', 'dr', 'd', 'withdrawal'}
+
+# Candidate formats for date inference, tried in order; month-first precedes
+# day-first to match dateutil's default for ambiguous values
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%Y/%m/%d",
+    "%m/%d/%Y",
+    "%d/%m/%Y",
+    "%m/%d/%y",
+    "%d/%m/%y",
+    "%d.%m.%Y",
+    "%d.%m.%y",
+    "%m-%d-%Y",
+    "%d-%m-%Y",
+    "%Y%m%d",
+    "%d %b %Y",
+    "%b %d, %Y",
+    "%d-%b-%Y",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%m/%d/%Y %H:%M",
+]
+
+DATE_SAMPLE_ROWS = 1000
+# Share of the sample the dominant format must parse to be used for the whole column
+MIN_FORMAT_SHARE = 0.5
+
 
 def _parse_date(val):
     if pd.isna(val):
@@ -14,26 +48,93 @@ def _parse_date(val):
             return pd.NaT
 
 
-def normalize_transactions(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
+def infer_date_format(values: pd.Series, min_share: float = MIN_FORMAT_SHARE) -> Optional[str]:
+    """Dominant format among DATE_FORMATS for an evenly spaced sample of ``values``."""
+    values = values.dropna().astype(str).str.strip()
+    values = values[values != ""]
+    if values.empty:
+        return None
+    values = values.iloc[::max(1, len(values) // DATE_SAMPLE_ROWS)]
+    best, best_hits = None, 0
+    for fmt in DATE_FORMATS:
+        hits = int(pd.to_datetime(values, format=fmt, errors='coerce').notna().sum())
+        if hits > best_hits:
+            best, best_hits = fmt, hits
+            if hits == len(values):
+                break
+    return best if best_hits >= min_share * len(values) else None
 
-    # Dates
-    df['date'] = df['date'].apply(_parse_date)
-    df = df[df['date'].notna()]
 
-    # Description cleanup
-    df['description'] = df['description'].astype(str).str.strip()
+def parse_dates(values: pd.Series, date_format: Optional[str] = None) -> Tuple[pd.Series, dict]:
+    """Parse a date column, returning (dates, stats).
+
+    The whole column is parsed in one call with ``date_format`` (or the format
+    inferred from a sample); only values that don't match go through the
+    per-row fallback. stats counts rows per path: native (already datetime),
+    vectorized, fallback and unparsed.
+    """
+    stats = {'format': None, 'native': 0, 'vectorized': 0, 'fallback': 0, 'unparsed': 0}
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        parsed = values
+        if isinstance(values.dtype, pd.ArrowDtype) and values.dt.tz is None:
+            parsed = values.astype('datetime64[ns]')
+        stats['native'] = int(parsed.notna().sum())
+        stats['unparsed'] = int(parsed.isna().sum() - values.isna().sum())
+        return parsed, stats
+
+    fmt = date_format or infer_date_format(values)
+    stats['format'] = fmt
+    present = values.notna()
+    if fmt:
+        text = values.where(present).astype(str).str.strip()
+        parsed = pd.to_datetime(text.where(present), format=fmt, errors='coerce')
+        stats['vectorized'] = int(parsed.notna().sum())
+    else:
+        parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    miss = parsed.isna() & present
+    if miss.any():
+        residual = pd.to_datetime(values[miss].apply(_parse_date))
+        if stats['vectorized'] == 0:
+            parsed = residual.reindex(values.index)
+        else:
+            parsed[miss] = residual
+        stats['fallback'] = int(residual.notna().sum())
+        stats['unparsed'] = int(residual.isna().sum())
+    return parsed, stats
+
+
+def normalize_transactions(df: pd.DataFrame, date_format: str | None = None, sign_convention: str = "signed") -> pd.DataFrame:
+    # Shallow copy: columns below are replaced, never written into in place
+    df = df.copy(deep=False)
+
+    # Dates: one vectorized parse with the profile's (or the inferred dominant)
+    # format; only non-matching values fall back to per-row parsing
+    dates, date_stats = parse_dates(df['date'], date_format)
 
     # Amount to float
-    df['amount'] = pd.to_numeric(df['amount'], errors='coerce')
-    df = df[df['amount'].notna()]
+    amounts = pd.to_numeric(df['amount'], errors='coerce')
+
+    # Drop rows without a usable date or amount in one filter, before other work
+    keep = dates.notna() & amounts.notna()
+    dropped = int(len(keep) - keep.sum())
+    if dropped:
+        df, dates, amounts = df[keep], dates[keep], amounts[keep]
+    df['date'] = dates
+    df['amount'] = amounts
+
+    # Description cleanup
+    df['description'] = df['description'].astype(str).str.strip()
 
     # Transaction direction
     # If type hints exist, keep as-is; else infer: negative = debit, positive = credit
     if 'type' not in df.columns:
-        df['type'] = df['amount'].apply(lambda x: 'debit' if x < 0 else 'credit')
+        df['type'] = np.where(df['amount'] < 0, 'debit', 'credit')
     else:
         df['type'] = df['type'].astype(str).str.lower()
+        if sign_convention == "debit_negative":
+            # Unsigned exports: the type column says which rows are outflows
+            debit = df['type'].str.strip().isin(DEBIT_TYPES)
+            df['amount'] = df['amount'].mask(debit, -df['amount'].abs())
 
     # Account and currency optional
     for col in ['account', 'currency']:
@@ -45,4 +146,7 @@ def normalize_transactions(df: pd.DataFrame) -> pd.DataFrame:
         if col not in df.columns:
             df[col] = None
 
-    return df[['date','description','amount','type','account','currency','category','subcategory','merchant','mcc']]
+    df = apply_schema(df[TRANSACTION_COLUMNS])
+    df.attrs['date_parse'] = date_stats
+    df.attrs['dropped'] = dropped
+    return df
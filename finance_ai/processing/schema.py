@@ -0,0 +1,26 @@
+import pandas as pd
+
+# Declared in-memory schema for transaction frames. Low-cardinality text
+# columns are categoricals, so group-bys run on integer codes and multi-million
+# row histories stay compact; description and tx_hash stay plain text.
+
+TRANSACTION_COLUMNS = [
+    'date', 'description', 'amount', 'type', 'account', 'currency',
+    'category', 'subcategory', 'merchant', 'mcc',
+]
+
+CATEGORICAL_COLUMNS = ['type', 'account', 'currency', 'category', 'subcategory', 'merchant', 'mcc']
+
+TRANSACTION_DTYPES = {
+    'date': 'datetime64[ns]',
+    'amount': 'float64',
+    **{col: 'category' for col in CATEGORICAL_COLUMNS},
+}
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast the transaction columns present in ``df`` to TRANSACTION_DTYPES."""
+    if 'date' in df.columns and pd.api.types.is_datetime64_any_dtype(df['date'].dtype) and df['date'].dt.tz is not None:
+        df = df.assign(date=df['date'].dt.tz_convert(None))
+    dtypes = {col: dtype for col, dtype in TRANSACTION_DTYPES.items() if col in df.columns}
+    return df.astype(dtypes)
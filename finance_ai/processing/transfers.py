@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+# Internal transfers: money leaving one account and arriving in another (checking
+# -> savings, card payments) shows up as an outflow and an inflow of the same
+# magnitude a few days apart. Matching them keeps spend and income from being
+# counted twice.
+
+TRANSFER_WINDOW_DAYS = 3
+TRANSFER_MAX_ROUNDS = 8
+# Equal opposite amounts alone are common by chance; a pair is only linked when
+# a leg's description says it is a transfer or names the other leg's account
+TRANSFER_KEYWORDS = (
+    'transfer', 'xfer', 'trnsfr', 'tfr', 'payment thank you', 'autopay', 'auto pay', 'epay',
+    'card payment', 'credit card payment', 'online payment', 'online pmt', 'internal',
+    'to savings', 'from savings', 'to checking', 'from checking', 'sweep',
+)
+_TRANSFER_RE = r'\b(?:' + '|'.join(k.replace(' ', r'\s+') for k in TRANSFER_KEYWORDS) + r')\b'
+# Account names shorter than this are too ambiguous to count as a reference
+MIN_ACCOUNT_REF_CHARS = 3
+
+TRANSFER_COLUMNS = ['out_id', 'in_id', 'amount', 'out_account', 'in_account', 'days_apart']
+
+
+def _references(descriptions: np.ndarray, accounts: np.ndarray) -> np.ndarray:
+    # Whether each description mentions the paired account's name
+    return np.fromiter(
+        (len(a) >= MIN_ACCOUNT_REF_CHARS and a in d for d, a in zip(descriptions, accounts)),
+        dtype=bool, count=len(descriptions),
+    )
+
+
+def match_transfers(df: pd.DataFrame, window_days: int = TRANSFER_WINDOW_DAYS, require_evidence: bool = True) -> pd.DataFrame:
+    """Pair outflows with inflows of equal magnitude in a different account.
+
+    Each outflow is as-of joined (``pd.merge_asof``, nearest date within
+    ``window_days``) against inflows of the same amount in other accounts.
+    With ``require_evidence`` a candidate only counts when either leg's
+    description has a transfer keyword (``TRANSFER_KEYWORDS``) or names the
+    other leg's account; frames without a description column then match
+    nothing. An inflow claimed by several outflows goes to the closest one;
+    the rest retry against the remaining inflows in the next round. Every row
+    ends up in at most one pair. Ids come from an ``id`` column if present,
+    else the index.
+    """
+    if df.empty or 'account' not in df.columns:
+        return pd.DataFrame(columns=TRANSFER_COLUMNS)
+    if require_evidence and 'description' not in df.columns:
+        return pd.DataFrame(columns=TRANSFER_COLUMNS)
+    ids = (df['id'] if 'id' in df.columns else df.index.to_series()).to_numpy()
+    dates = pd.to_datetime(df['date']).to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+    amounts = pd.to_numeric(df['amount'], errors='coerce').fillna(0.0).to_numpy(dtype=np.float64)
+    cents = np.round(amounts * 100).astype(np.int64)
+    account = pd.Series(df['account'].astype(object).to_numpy())
+    frame = pd.DataFrame({'day': dates, 'cents': np.abs(cents), 'id': ids, 'account': account.fillna('')})
+    if require_evidence:
+        desc = pd.Series(df['description'].astype(object).to_numpy()).fillna('').astype(str).str.lower()
+        frame['desc'] = desc.to_numpy(dtype=object)
+        frame['keyword'] = desc.str.contains(_TRANSFER_RE, regex=True).to_numpy()
+
+    outflows = frame[cents < 0].rename(columns={'id': 'out_id', 'account': 'out_account', 'desc': 'out_desc', 'keyword': 'out_kw'})
+    inflows = frame[cents > 0].rename(columns={'id': 'in_id', 'account': 'in_account', 'desc': 'in_desc', 'keyword': 'in_kw'})
+    inflows = inflows.assign(in_day=inflows['day']).sort_values('day', kind='stable')
+    outflows = outflows.sort_values('day', kind='stable')
+
+    found = []
+    for _ in range(TRANSFER_MAX_ROUNDS):
+        if outflows.empty or inflows.empty:
+            break
+        candidates = []
+        for acct, left in outflows.groupby('out_account', sort=False):
+            right = inflows[inflows['in_account'] != acct]
+            if right.empty:
+                continue
+            if not require_evidence:
+                joins = [(left, right, False)]
+            else:
+                # Keyword on the outflow, keyword on the inflow, or else an account reference
+                kw_left, plain_left = left[left['out_kw']], left[~left['out_kw']]
+                joins = [
+                    (kw_left, right, False),
+                    (plain_left, right[right['in_kw']], False),
+                    (plain_left, right[~right['in_kw']], True),
+                ]
+            for lhs, rhs, needs_reference in joins:
+                if lhs.empty or rhs.empty:
+                    continue
+                m = pd.merge_asof(lhs, rhs, on='day', by='cents', direction='nearest', tolerance=window_days)
+                m = m.dropna(subset=['in_id'])
+                if needs_reference and not m.empty:
+                    m = m[
+                        _references(m['out_desc'].to_numpy(), m['in_account'].str.lower().to_numpy())
+                        | _references(m['in_desc'].to_numpy(), np.full(len(m), acct.lower(), dtype=object))
+                    ]
+                candidates.append(m)
+        if not candidates:
+            break
+        pairs = pd.concat(candidates, ignore_index=True)
+        if pairs.empty:
+            break
+        pairs['days_apart'] = (pairs['in_day'] - pairs['day']).abs()
+        pairs = pairs.sort_values(['days_apart', 'day'], kind='stable').drop_duplicates('in_id').drop_duplicates('out_id')
+        found.append(pairs)
+        outflows = outflows[~outflows['out_id'].isin(pairs['out_id'])]
+        inflows = inflows[~inflows['in_id'].isin(pairs['in_id'])]
+
+    if not found:
+        return pd.DataFrame(columns=TRANSFER_COLUMNS)
+    pairs = pd.concat(found, ignore_index=True)
+    out = pd.DataFrame({
+        'out_id': pairs['out_id'].to_numpy(),
+        'in_id': pairs['in_id'].to_numpy().astype(ids.dtype),
+        'amount': pairs['cents'].to_numpy() / 100,
+        'out_account': pairs['out_account'].to_numpy(),
+        'in_account': pairs['in_account'].to_numpy(),
+        'days_apart': pairs['days_apart'].astype(np.int64).to_numpy(),
+    })
+    return out.sort_values('out_id', kind='stable').reset_index(drop=True)
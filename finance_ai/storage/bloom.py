@@ -0,0 +1,63 @@
+import math
+from typing import Optional
+
+import numpy as np
+
+from finance_ai.processing.dedupe import mix64
+
+# Bloom filter over 64-bit transaction keys. Keys are already well-mixed
+# fingerprints, so the k probe positions come from double hashing the key
+# with one extra splitmix round instead of k independent hash functions.
+
+DEFAULT_CAPACITY = 1_000_000
+DEFAULT_ERROR_RATE = 0.01
+
+class BloomFilter:
+    """Fixed-size bit array answering "definitely absent" or "maybe present".
+
+    ``count`` is the number of keys added; once it exceeds ``capacity`` the
+    false-positive rate climbs past ``error_rate`` and the owner should rebuild
+    a larger filter.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, error_rate: float = DEFAULT_ERROR_RATE,
+                 bits: Optional[np.ndarray] = None, num_hashes: Optional[int] = None, count: int = 0):
+        capacity = max(int(capacity), 1)
+        num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        num_bytes = (num_bits + 7) // 8
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_hashes = num_hashes or max(1, round(num_bytes * 8 / capacity * math.log(2)))
+        self.bits = np.zeros(num_bytes, dtype=np.uint8) if bits is None else bits
+        self.count = count
+
+    @property
+    def num_bits(self) -> int:
+        return len(self.bits) * 8
+
+    def _positions(self, keys) -> np.ndarray:
+        keys = np.asarray(keys, dtype=np.int64).view(np.uint64)
+        with np.errstate(over='ignore'):
+            step = mix64(keys) | np.uint64(1)
+            probes = np.arange(self.num_hashes, dtype=np.uint64)
+            pos = keys[:, None] + probes[None, :] * step[:, None]
+        return pos % np.uint64(self.num_bits)
+
+    def add(self, keys) -> None:
+        pos = self._positions(keys).ravel()
+        np.bitwise_or.at(self.bits, (pos >> np.uint64(3)).astype(np.intp), (1 << (pos & np.uint64(7))).astype(np.uint8))
+        self.count += len(keys)
+
+    def might_contain(self, keys) -> np.ndarray:
+        """Boolean mask: False means the key was certainly never added."""
+        pos = self._positions(keys)
+        hit = self.bits[(pos >> np.uint64(3)).astype(np.intp)] >> (pos & np.uint64(7)).astype(np.uint8) & 1
+        return hit.all(axis=1)
+
+    def to_bytes(self) -> bytes:
+        return self.bits.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, capacity: int, error_rate: float, num_hashes: int, count: int) -> "BloomFilter":
+        bits = np.frombuffer(data, dtype=np.uint8).copy()
+        return cls(capacity, error_rate, bits=bits, num_hashes=num_hashes, count=count)
@@ -1,9 +1,13 @@
 import os
-from sqlalchemy import create_engine
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Index, Integer, BigInteger, String, Float, DateTime, JSON, LargeBinary, UniqueConstraint
 
 from finance_ai.config import CONFIG
+from finance_ai.processing.dedupe import compute_hashes
+from finance_ai.intelligence.rules import DEFAULT_RULES, description_key
 
 class Base(DeclarativeBase):
     pass
@@ -14,7 +18,8 @@ class Transaction(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     date = Column(DateTime, index=True, nullable=False)
     description = Column(String, nullable=False)
-    amount = Column(Float, nullable=False)
+    # Indexed so the few most negative debits (insights anomalies) are found without a scan
+    amount = Column(Float, index=True, nullable=False)
     type = Column(String, nullable=False)
     account = Column(String)
     currency = Column(String)
@@ -22,12 +27,370 @@ class Transaction(Base):
     subcategory = Column(String)
     merchant = Column(String)
     mcc = Column(String)
-    tx_hash = Column(String, unique=True, index=True, nullable=False)
+    # Legacy SHA-256 hex for rows imported before tx_key; hex of tx_key for newer rows.
+    # Not indexed: tx_key is the dedupe key, and a second unique index doubled insert cost
+    tx_hash = Column(String, nullable=False)
+    # 64-bit fingerprint of (date, amount, description, occurrence) used for dedupe
+    tx_key = Column(BigInteger, unique=True, index=True)
+    # Set when the row was merged into another as a near duplicate; such rows are hidden
+    duplicate_of = Column(Integer)
+    # Id of the matching leg when the row is one side of an internal transfer
+    transfer_id = Column(Integer)
+    # Normalized description (see rules.description_key); rule edits find affected rows through it
+    desc_key = Column(String, index=True)
+
+    # The link columns are NULL on almost every row; partial indexes keep
+    # bulk inserts from paying for index entries nobody looks up
+    __table_args__ = tuple(
+        Index(f'ix_transactions_{name}', name, sqlite_where=text(f'{name} IS NOT NULL'))
+        for name in ('duplicate_of', 'transfer_id')
+    )
+
+
+class IngestedFile(Base):
+    # Manifest of ingested statements: one row per (file, account) span
+    __tablename__ = 'ingest_manifest'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    content_hash = Column(String, index=True, nullable=False)
+    file_name = Column(String)
+    size_bytes = Column(Integer, nullable=False)
+    account = Column(String, index=True)
+    row_count = Column(Integer, nullable=False)
+    date_min = Column(DateTime)
+    date_max = Column(DateTime)
+    ingested_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class SchemaProfile(Base):
+    # Learned (or user-overridden) CSV layout, keyed by header signature
+    __tablename__ = 'bank_profiles'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    signature = Column(String, unique=True, index=True, nullable=False)
+    columns = Column(JSON, nullable=False)
+    mapping = Column(JSON, nullable=False)
+    date_format = Column(String)
+    decimal = Column(String, nullable=False, default='.')
+    thousands = Column(String)
+    sign_convention = Column(String, nullable=False, default='signed')
+    source = Column(String, nullable=False, default='inferred')
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class Resolution(Base):
+    # Persistent description -> merchant/category cache, checked before any categorizer runs
+    __tablename__ = 'resolution_cache'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    desc_key = Column(String, unique=True, index=True, nullable=False)
+    merchant = Column(String)
+    mcc = Column(String)
+    category = Column(String)
+    subcategory = Column(String)
+    # 'rule', 'model' or 'user'; user entries survive rule-set changes
+    source = Column(String, nullable=False, default='rule')
+    rule_version = Column(String, nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class Rule(Base):
+    # User-editable rule tables; position orders rules within a kind (first match wins)
+    __tablename__ = 'rules'
+    __table_args__ = (UniqueConstraint('kind', 'keyword'),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)
+    keyword = Column(String, nullable=False)
+    value = Column(String, nullable=False)
+    position = Column(Integer, nullable=False)
+
+
+class RuleSetMeta(Base):
+    # Single row: version counter bumped on every rule edit
+    __tablename__ = 'rule_set_meta'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class KeyFilter(Base):
+    # Persisted Bloom filter over transactions.tx_key for the "all new" fast path
+    __tablename__ = 'key_filters'
+
+    name = Column(String, primary_key=True)
+    capacity = Column(Integer, nullable=False)
+    error_rate = Column(Float, nullable=False)
+    num_hashes = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False)
+    bits = Column(LargeBinary, nullable=False)
+
+
+class TransferExclusion(Base):
+    # Rows the user unlinked as transfers; automatic matching leaves them alone
+    __tablename__ = 'transfer_exclusions'
+
+    tx_id = Column(Integer, primary_key=True)
+
+
+class Rollup(Base):
+    # Monthly aggregates of visible, non-transfer transactions (see add_rollups).
+    # Key parts are '' rather than NULL so each group has exactly one row;
+    # sign (-1 debit, 0, 1 credit) keeps spend, income and debit stats apart
+    __tablename__ = 'rollups'
+
+    month = Column(String, primary_key=True)  # 'YYYY-MM'
+    account = Column(String, primary_key=True)
+    category = Column(String, primary_key=True)
+    merchant = Column(String, primary_key=True)
+    sign = Column(Integer, primary_key=True)
+    row_count = Column(Integer, nullable=False)
+    amount_sum = Column(Float, nullable=False)
+    amount_sq_sum = Column(Float, nullable=False)
+    amount_min = Column(Float, nullable=False)
+    amount_max = Column(Float, nullable=False)
+
+
+# Columns added to transactions after the first release: name -> SQLite type
+_ADDED_COLUMNS = {
+    'duplicate_of': 'INTEGER',
+    'transfer_id': 'INTEGER',
+    'desc_key': 'TEXT',
+}
+# Indexes declared on first-release columns after the first release
+_ADDED_INDEXES = ('amount',)
+# Indexes earlier releases created that are no longer declared
+_DROPPED_INDEXES = ('ix_transactions_tx_hash',)
+
+
+def _migrate_columns(engine):
+    with engine.begin() as conn:
+        cols = {r[1] for r in conn.exec_driver_sql("PRAGMA table_info(transactions)")}
+        for name, sql_type in _ADDED_COLUMNS.items():
+            if name not in cols:
+                conn.exec_driver_sql(f"ALTER TABLE transactions ADD COLUMN {name} {sql_type}")
+        # Indexes for added columns, created (or, for earlier full indexes, rebuilt) as declared
+        for index in Transaction.__table__.indexes:
+            name = index.columns[0].name
+            if name not in _ADDED_COLUMNS and name not in _ADDED_INDEXES:
+                continue
+            row = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (index.name,)).first()
+            partial = index.dialect_options['sqlite']['where'] is not None
+            if row is not None and partial == (' WHERE ' in row[0].upper()):
+                continue
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+            index.create(conn)
+        for name in _DROPPED_INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+
+def _migrate_tx_keys(engine):
+    # Databases from before tx_key: add the column, then backfill legacy rows.
+    # Legacy rows were unique on (date, amount, description), so each gets
+    # occurrence 0 and matches the key a re-import of the same row would get.
+    with engine.begin() as conn:
+        cols = {r[1] for r in conn.exec_driver_sql("PRAGMA table_info(transactions)")}
+        if 'tx_key' not in cols:
+            conn.exec_driver_sql("ALTER TABLE transactions ADD COLUMN tx_key BIGINT")
+            conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ix_transactions_tx_key ON transactions (tx_key)")
+        legacy = pd.read_sql(
+            text("SELECT id, date, amount, description FROM transactions WHERE tx_key IS NULL ORDER BY id"), conn
+        )
+        if legacy.empty:
+            return
+        legacy['date'] = pd.to_datetime(legacy['date'])
+        keyed = compute_hashes(legacy)
+        conn.execute(
+            text("UPDATE transactions SET tx_key = :k WHERE id = :i"),
+            [{'k': int(k), 'i': int(i)} for k, i in zip(keyed['tx_key'], keyed['id'])],
+        )
+        # Keys written outside insert_transactions: the repository rebuilds the filter
+        conn.exec_driver_sql("DELETE FROM key_filters")
+
+
+def _backfill_desc_keys(engine):
+    # One UPDATE per distinct description; uses the description's own rows only
+    with engine.begin() as conn:
+        rows = conn.exec_driver_sql("SELECT DISTINCT description FROM transactions WHERE desc_key IS NULL").all()
+        if rows:
+            conn.exec_driver_sql(
+                "UPDATE transactions SET desc_key = ? WHERE description = ? AND desc_key IS NULL",
+                [(description_key(d), d) for (d,) in rows],
+            )
+
+
+def _seed_rules(engine):
+    with engine.begin() as conn:
+        if conn.exec_driver_sql("SELECT 1 FROM rule_set_meta").first() is not None:
+            return
+        conn.execute(Rule.__table__.insert(), [
+            {'kind': kind, 'keyword': keyword, 'value': value, 'position': i}
+            for kind, rules in DEFAULT_RULES.items() for i, (keyword, value) in enumerate(rules)
+        ])
+        conn.execute(RuleSetMeta.__table__.insert(), {'id': 1, 'version': 1, 'updated_at': datetime.utcnow()})
+
+
+# Full-text index over the searchable text columns of transactions. External
+# content: FTS5 stores only the index and reads column values from
+# transactions by rowid; triggers keep it in step with every write. A bulk
+# writer may set search_index_state.deferred inside its own transaction and
+# index its rows with one INSERT ... SELECT instead (see index_new_rows).
+SEARCH_TABLE = 'transactions_fts'
+SEARCH_STATE_TABLE = 'search_index_state'
+SEARCH_COLUMNS = ('description', 'merchant', 'category')
+
+_SEARCH_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        {', '.join(SEARCH_COLUMNS)}, content='transactions', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"CREATE TABLE IF NOT EXISTS {SEARCH_STATE_TABLE} (id INTEGER PRIMARY KEY CHECK (id = 1), deferred INTEGER NOT NULL)",
+    f"INSERT OR IGNORE INTO {SEARCH_STATE_TABLE} (id, deferred) VALUES (1, 0)",
+    f"""CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions
+    WHEN (SELECT deferred FROM {SEARCH_STATE_TABLE}) = 0 BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES (new.id, {', '.join('new.' + c for c in SEARCH_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in SEARCH_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF {', '.join(SEARCH_COLUMNS)} ON transactions BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in SEARCH_COLUMNS)});
+        INSERT INTO {SEARCH_TABLE}(rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES (new.id, {', '.join('new.' + c for c in SEARCH_COLUMNS)});
+    END""",
+]
+
+
+def defer_search_index(conn, deferred: bool) -> None:
+    """Switch the per-row insert trigger off (or back on) for the current transaction's writes."""
+    conn.exec_driver_sql(f"UPDATE {SEARCH_STATE_TABLE} SET deferred = ?", (int(deferred),))
+
+
+def index_new_rows(conn, after_id: int) -> None:
+    """Add transactions with id > ``after_id`` to the search index in one statement."""
+    cols = ', '.join(SEARCH_COLUMNS)
+    conn.exec_driver_sql(
+        f"INSERT INTO {SEARCH_TABLE}(rowid, {cols}) SELECT id, {cols} FROM transactions WHERE id > ?", (after_id,)
+    )
+
+
+def suspend_secondary_indexes(conn) -> list:
+    """Drop the non-unique transactions indexes and the search insert trigger; returns their DDL.
+
+    For bulk loads: building an index once over the loaded rows is cheaper
+    than maintaining it row by row. Unique indexes stay, since inserts resolve
+    conflicts against them. Pass the result to ``restore_secondary_indexes``
+    in the same transaction.
+    """
+    rows = conn.exec_driver_sql(
+        "SELECT type, name, sql FROM sqlite_master WHERE tbl_name = 'transactions' AND sql IS NOT NULL "
+        "AND ((type = 'index' AND sql NOT LIKE 'CREATE UNIQUE%') OR (type = 'trigger' AND name = 'transactions_fts_insert'))"
+    ).all()
+    for kind, name, _ in rows:
+        conn.exec_driver_sql(f"DROP {kind.upper()} {name}")
+    return [sql for _, _, sql in rows]
+
+
+def restore_secondary_indexes(conn, ddl: list) -> None:
+    for sql in ddl:
+        conn.exec_driver_sql(sql)
+
+
+def _create_search_index(engine):
+    # Created on first start (also for existing databases, which get indexed once)
+    with engine.begin() as conn:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (SEARCH_TABLE,)
+        ).first() is not None
+        for ddl in _SEARCH_DDL:
+            conn.exec_driver_sql(ddl)
+        if not exists:
+            conn.exec_driver_sql(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+
+
+# Rollup rows are (re)computed from transactions in SQL, so they count exactly
+# the rows a transaction actually stored, never rows skipped as conflicts
+ROLLUP_KEYS = ('month', 'account', 'category', 'merchant', 'sign')
+ROLLUP_MEASURES = ('row_count', 'amount_sum', 'amount_sq_sum', 'amount_min', 'amount_max')
+
+_ROLLUP_SELECT = """SELECT substr(date, 1, 7), coalesce(account, ''), coalesce(category, ''),
+    coalesce(merchant, ''), (amount > 0) - (amount < 0),
+    count(*), sum(amount), sum(amount * amount), min(amount), max(amount)
+    FROM transactions WHERE duplicate_of IS NULL AND transfer_id IS NULL AND {where}
+    GROUP BY 1, 2, 3, 4, 5"""
+_ROLLUP_INSERT = f"INSERT INTO rollups ({', '.join(ROLLUP_KEYS + ROLLUP_MEASURES)}) "
+
+
+def rollup_rows(conn, where: str = '1', params=()) -> list:
+    """Rollup-shaped aggregates of visible, non-transfer transactions matching ``where``."""
+    return conn.exec_driver_sql(_ROLLUP_SELECT.format(where=where), params).all()
+
+
+def add_rollups(conn, after_id: int) -> None:
+    """Fold transactions with id > ``after_id`` into the rollups in one statement."""
+    conn.exec_driver_sql(
+        _ROLLUP_INSERT + _ROLLUP_SELECT.format(where='id > ?') + f"""
+        ON CONFLICT ({', '.join(ROLLUP_KEYS)}) DO UPDATE SET
+        row_count = row_count + excluded.row_count,
+        amount_sum = amount_sum + excluded.amount_sum,
+        amount_sq_sum = amount_sq_sum + excluded.amount_sq_sum,
+        amount_min = min(amount_min, excluded.amount_min),
+        amount_max = max(amount_max, excluded.amount_max)""",
+        (after_id,),
+    )
+
+
+def refresh_rollups(conn, months=None) -> None:
+    """Recompute the rollups of ``months`` ('YYYY-MM' strings), or of every month when None.
+
+    Used after writes that change which rows count or how they are grouped
+    (duplicates, transfers, re-categorization), and for backfills.
+    """
+    if months is None:
+        conn.exec_driver_sql("DELETE FROM rollups")
+        conn.exec_driver_sql(_ROLLUP_INSERT + _ROLLUP_SELECT.format(where='1'))
+        return
+    for month in sorted(set(months)):
+        following = (pd.Period(month, 'M') + 1).strftime('%Y-%m')
+        conn.exec_driver_sql("DELETE FROM rollups WHERE month = ?", (month,))
+        # Text bounds on the stored date text, so the date index is used
+        conn.exec_driver_sql(_ROLLUP_INSERT + _ROLLUP_SELECT.format(where='date >= ? AND date < ?'), (month, following))
+
+
+def _backfill_rollups(engine, created: bool):
+    # Existing databases get their rollups computed once, when the table is new
+    if created:
+        with engine.begin() as conn:
+            refresh_rollups(conn)
+
+
+def _set_sqlite_pragmas(dbapi_conn, _record):
+    # WAL lets the UI read while an import writes; NORMAL only syncs at
+    # checkpoints (safe in WAL); the bigger cache keeps index pages hot
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute(f"PRAGMA cache_size=-{CONFIG.sqlite_cache_mb * 1024}")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.close()
 
 
 def init_db(db_path: str):
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
     engine = create_engine(f"sqlite:///{db_path}", echo=CONFIG.db_echo, future=True)
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    with engine.connect() as conn:
+        new_rollups = conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollups'").first() is None
     Base.metadata.create_all(engine)
+    _migrate_tx_keys(engine)
+    _migrate_columns(engine)
+    _backfill_desc_keys(engine)
+    _seed_rules(engine)
+    _create_search_index(engine)
+    _backfill_rollups(engine, new_rollups)
     SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
     return engine, SessionLocal
@@ -1,59 +1,833 @@
-from typing import Optional, Iterable
+from datetime import datetime
+import threading
+from typing import Optional, Sequence
+import re
+import numpy as np
 import pandas as pd
-from sqlalchemy import select, func
-from sqlalchemy.orm import Session
+from sqlalchemy import String, bindparam, column, func, literal_column, select, table, text, type_coerce, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from finance_ai.config import CONFIG
+from .bloom import BloomFilter, DEFAULT_CAPACITY, DEFAULT_ERROR_RATE
+from .db import (
+    ROLLUP_KEYS, ROLLUP_MEASURES, SEARCH_TABLE, add_rollups, defer_search_index, index_new_rows, refresh_rollups, rollup_rows,
+    restore_secondary_indexes, suspend_secondary_indexes,
+    Transaction, IngestedFile, SchemaProfile, KeyFilter, Resolution, Rule, RuleSetMeta, TransferExclusion,
+)
+from finance_ai.processing.dedupe import NEAR_DUP_THRESHOLD, NEAR_DUP_WINDOW_DAYS, find_near_duplicates
+from finance_ai.processing.schema import CATEGORICAL_COLUMNS, apply_schema
+from finance_ai.processing.transfers import TRANSFER_WINDOW_DAYS, match_transfers
+from finance_ai.intelligence.rules import RULE_KINDS, description_key
+
+KEY_FILTER = 'tx_key'
+# Bound parameters per IN (...) lookup, below SQLite's variable limit
+LOOKUP_BATCH = 900
+# Cursor rows per fetchmany when streaming transactions into column buffers
+FETCH_BATCH = 50_000
+FETCH_COLUMNS = (
+    'date', 'description', 'amount', 'type', 'account', 'currency', 'category', 'subcategory',
+    'merchant', 'mcc', 'tx_hash', 'tx_key', 'transfer_id',
+)
+NULLABLE_INT_COLUMNS = ('id', 'duplicate_of', 'transfer_id')
+SEARCH_LIMIT = 100
+# Ranking scores every match; past this many the newest matches are returned instead
+SEARCH_RANK_MAX = 50_000
+# bm25 weights per indexed column (description, merchant, category): merchant hits count most
+SEARCH_WEIGHTS = (1.0, 2.0, 0.5)
+ANOMALY_LIMIT = 20
+
+_search_index = table(SEARCH_TABLE, column('rowid'))
+
+
+def fts_query(query: str) -> str:
+    """FTS5 MATCH expression for search-box text: "quoted phrases" match exactly,
+    words match whole tokens, and the last word also matches as a prefix (type-ahead).
+
+    Terms are ANDed; FTS5 operators and punctuation in the input are treated as
+    plain text, so any user input is a valid query. Empty input gives ''.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        tokens = re.findall(r'\w+', phrase or word)
+        if phrase and tokens:
+            terms.append('"' + ' '.join(tokens) + '"')
+        elif not phrase:
+            terms.extend(f'"{t}"' for t in tokens)
+    if terms and not query.rstrip().endswith('"'):
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _typed_column(name: str, values: np.ndarray):
+    """Array for one fetched column: dates parsed in bulk, numbers as NumPy, link ids nullable."""
+    if name == 'date':
+        return pd.to_datetime(pd.Series(values, dtype=object), format='ISO8601')
+    if name in ('amount', 'rank'):
+        return np.array(values, dtype=np.float64)
+    if name == 'tx_key':
+        try:
+            return np.array(values, dtype=np.int64)
+        except TypeError:
+            pass  # rows written outside the app get their key at the next init_db
+    if name in NULLABLE_INT_COLUMNS or name == 'tx_key':
+        return pd.array(values, dtype='Int64')
+    if name in CATEGORICAL_COLUMNS:
+        return pd.Categorical(values)
+    return pd.Series(values)
+
+
+def _column(values: pd.Series) -> list:
+    # Categorical/Arrow missing values come out as NaN/NA; store them as NULL
+    values = values.astype(object)
+    return values.where(values.notna(), None).tolist()
+
+
+def _insert_columns(df: pd.DataFrame, keys: np.ndarray) -> dict:
+    """DBAPI-ready parameter lists per transactions column, built without per-row dicts."""
+    # SQLAlchemy's SQLite DateTime text format, so stored dates compare and parse alike
+    stamps = np.datetime_as_string(pd.to_datetime(df['date']).to_numpy(dtype='datetime64[us]'), unit='us')
+    codes, uniques = pd.factorize(df['description'].astype(object).fillna(''))
+    columns = {
+        'date': np.char.replace(stamps, 'T', ' ').tolist(),
+        'description': _column(df['description']),
+        'amount': df['amount'].to_numpy(dtype=np.float64).tolist(),
+        'type': _column(df['type']),
+        'tx_hash': [f"{k:016x}" for k in keys.view(np.uint64).tolist()],
+        'tx_key': keys.tolist(),
+        'desc_key': np.asarray([description_key(u) for u in uniques], dtype=object)[codes].tolist(),
+    }
+    for col in ('account', 'currency', 'category', 'subcategory', 'merchant', 'mcc'):
+        columns[col] = _column(df[col]) if col in df.columns else [None] * len(df)
+    return columns
+
+def _day(ts: pd.Timestamp) -> str:
+    # Date-only text bound; compares correctly against the stored date text
+    return ts.strftime('%Y-%m-%d')
+
+
+def _day_after(end_date) -> pd.Timestamp:
+    # Exclusive upper bound that keeps every row dated on ``end_date`` itself
+    return pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
 
-from .db import Transaction
 
 class TransactionRepository:
     def __init__(self, engine, SessionLocal):
         self.engine = engine
         self.SessionLocal = SessionLocal
+        # The key filter is loaded once and kept; inserts add the keys they stored
+        # and flush_key_filter persists it at the end of an ingest
+        self._key_filter: Optional[BloomFilter] = None
+        self._key_filter_saved = 0  # filter count as of the last load or save
+        self._key_filter_dirty = False
+        self._key_filter_lock = threading.Lock()
+
+    def exclude_existing(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Rows of ``df`` whose ``tx_key`` is not stored yet.
+
+        The Bloom filter clears most new keys without touching the table; only
+        possible hits are staged into a temp table and anti-joined against the
+        unique tx_key index, so the cost follows the upload, not the database.
+        """
+        if df.empty:
+            return df
+        keys = df['tx_key'].to_numpy(dtype=np.int64)
+        with self.engine.begin() as conn:
+            maybe = self._key_filter_for(conn).might_contain(keys)
+            if not maybe.any():
+                return df
+            conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS staged_keys (tx_key INTEGER PRIMARY KEY)")
+            conn.exec_driver_sql("DELETE FROM staged_keys")
+            conn.exec_driver_sql(
+                "INSERT OR IGNORE INTO staged_keys (tx_key) VALUES (?)",
+                [(int(k),) for k in keys[maybe]],
+            )
+            existing = [r[0] for r in conn.exec_driver_sql(
+                "SELECT s.tx_key FROM staged_keys s JOIN transactions t ON t.tx_key = s.tx_key"
+            )]
+        if not existing:
+            return df
+        return df[~df['tx_key'].isin(existing)]
+
+    def _key_filter_for(self, conn) -> BloomFilter:
+        with self._key_filter_lock:
+            if self._key_filter is None:
+                self._key_filter = self._load_key_filter(conn)
+                self._key_filter_saved = self._key_filter.count
+            return self._key_filter
+
+    def flush_key_filter(self) -> None:
+        """Persist the key filter if inserts added keys since it was loaded or last saved.
+
+        Called once at the end of an ingest. Keys another writer saved in the
+        meantime are merged in; a filter past its capacity is rebuilt larger on
+        next use.
+        """
+        with self._key_filter_lock:
+            bloom = self._key_filter
+            if bloom is None or not self._key_filter_dirty:
+                return
+            with self.engine.begin() as conn:
+                row = conn.execute(
+                    select(KeyFilter.bits, KeyFilter.capacity, KeyFilter.num_hashes, KeyFilter.count)
+                    .where(KeyFilter.name == KEY_FILTER)
+                ).first()
+                if row is not None and row[3] != self._key_filter_saved:
+                    if (row[1], row[2]) != (bloom.capacity, bloom.num_hashes):
+                        # Rebuilt elsewhere with another size: drop both, the next load rebuilds from the index
+                        conn.execute(KeyFilter.__table__.delete().where(KeyFilter.name == KEY_FILTER))
+                        self._key_filter = None
+                        return
+                    bloom.bits |= np.frombuffer(row[0], dtype=np.uint8)
+                    bloom.count += row[3] - self._key_filter_saved
+                self._save_key_filter(conn, bloom)
+            self._key_filter_saved = bloom.count
+            self._key_filter_dirty = False
+            if bloom.count > bloom.capacity:
+                self._key_filter = None
 
-    def get_existing_hashes(self) -> Iterable[str]:
-        with self.SessionLocal() as session:
-            rows = session.execute(select(Transaction.tx_hash)).all()
-            return [r[0] for r in rows]
-
-    def insert_transactions(self, df: pd.DataFrame) -> int:
-        records = df.to_dict(orient='records')
-        objs = [Transaction(**{
-            'date': r['date'],
-            'description': r['description'],
-            'amount': float(r['amount']),
-            'type': r['type'],
-            'account': r.get('account'),
-            'currency': r.get('currency'),
-            'category': r.get('category'),
-            'subcategory': r.get('subcategory'),
-            'merchant': r.get('merchant'),
-            'mcc': r.get('mcc'),
-            'tx_hash': r['tx_hash'],
-        }) for r in records]
-        with self.SessionLocal() as session:
-            session: Session
+    def _load_key_filter(self, conn) -> BloomFilter:
+        row = conn.execute(
+            select(KeyFilter.bits, KeyFilter.capacity, KeyFilter.error_rate, KeyFilter.num_hashes, KeyFilter.count)
+            .where(KeyFilter.name == KEY_FILTER)
+        ).first()
+        if row is not None and row[4] <= row[1]:
+            return BloomFilter.from_bytes(*row)
+        # Missing (new or migrated database) or over capacity: rebuild from the index
+        keys = np.fromiter(
+            (r[0] for r in conn.execute(select(Transaction.tx_key).where(Transaction.tx_key.is_not(None)))),
+            dtype=np.int64,
+        )
+        bloom = BloomFilter(max(DEFAULT_CAPACITY, 2 * len(keys)), DEFAULT_ERROR_RATE)
+        if len(keys):
+            bloom.add(keys)
+        self._save_key_filter(conn, bloom)
+        return bloom
+
+    @staticmethod
+    def _save_key_filter(conn, bloom: BloomFilter) -> None:
+        stmt = sqlite_insert(KeyFilter).values(
+            name=KEY_FILTER, capacity=bloom.capacity, error_rate=bloom.error_rate,
+            num_hashes=bloom.num_hashes, count=bloom.count, bits=bloom.to_bytes(),
+        )
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=[KeyFilter.name],
+            set_={c: stmt.excluded[c] for c in ('capacity', 'error_rate', 'num_hashes', 'count', 'bits')},
+        ))
+
+    def get_ingested_file_rows(self, content_hash: str) -> Optional[int]:
+        """Row count recorded for an already ingested file, or None if the file is new."""
+        with self.SessionLocal() as session:
+            rows = session.execute(
+                select(IngestedFile.row_count).where(IngestedFile.content_hash == content_hash)
+            ).all()
+        if not rows:
+            return None
+        return sum(r[0] for r in rows)
+
+    def get_known_file_hashes(self) -> set:
+        with self.SessionLocal() as session:
+            rows = session.execute(select(IngestedFile.content_hash).distinct()).all()
+            return {r[0] for r in rows}
+
+    def get_covered_windows(self) -> dict:
+        """Date spans already ingested, keyed by account. Spans of rows without an account are left out."""
+        windows = {}
+        with self.SessionLocal() as session:
+            rows = session.execute(
+                select(IngestedFile.account, IngestedFile.date_min, IngestedFile.date_max)
+                .where(
+                    IngestedFile.account.is_not(None),
+                    IngestedFile.date_min.is_not(None),
+                    IngestedFile.date_max.is_not(None),
+                )
+            ).all()
+        for account, date_min, date_max in rows:
+            windows.setdefault(account, []).append((pd.Timestamp(date_min), pd.Timestamp(date_max)))
+        return windows
+
+    def record_ingested_file(self, content_hash: str, size_bytes: int, file_name: Optional[str], spans: dict) -> None:
+        # Rows without an account get no date span: it would cover other files' rows too
+        objs = [IngestedFile(
+            content_hash=content_hash,
+            file_name=file_name,
+            size_bytes=size_bytes,
+            account=account,
+            row_count=count,
+            date_min=pd.Timestamp(date_min).to_pydatetime() if account is not None else None,
+            date_max=pd.Timestamp(date_max).to_pydatetime() if account is not None else None,
+        ) for account, (count, date_min, date_max) in spans.items()]
+        if not objs:
+            # Nothing parsed, but remember the file so repeats still short-circuit
+            objs = [IngestedFile(content_hash=content_hash, file_name=file_name, size_bytes=size_bytes, row_count=0)]
+        with self.SessionLocal() as session:
             session.add_all(objs)
             session.commit()
-            return len(objs)
-
-    def fetch_transactions(self, start_date, end_date, category_contains: str = "") -> pd.DataFrame:
-        with self.SessionLocal() as session:
-            stmt = select(Transaction).where(Transaction.date >= start_date, Transaction.date <= end_date)
-            if category_contains:
-                like = f"%{category_contains.lower()}%"
-                stmt = stmt.where(func.lower(Transaction.category).like(like))
-            rows = session.execute(stmt).scalars().all()
-        data = [{
-            'date': r.date,
-            'description': r.description,
-            'amount': r.amount,
-            'type': r.type,
-            'account': r.account,
-            'currency': r.currency,
-            'category': r.category,
-            'subcategory': r.subcategory,
-            'merchant': r.merchant,
-            'mcc': r.mcc,
-            'tx_hash': r.tx_hash,
-        } for r in rows]
-        return pd.DataFrame(data)
+
+    def get_profile(self, signature: str) -> Optional[dict]:
+        with self.SessionLocal() as session:
+            row = session.execute(select(SchemaProfile).where(SchemaProfile.signature == signature)).scalar_one_or_none()
+            return self._profile_dict(row) if row is not None else None
+
+    def list_profiles(self) -> list:
+        with self.SessionLocal() as session:
+            rows = session.execute(select(SchemaProfile).order_by(SchemaProfile.signature)).scalars().all()
+            return [self._profile_dict(r) for r in rows]
+
+    def save_profile(self, profile: dict) -> None:
+        """Insert or replace a profile. Inferred profiles never overwrite user overrides."""
+        fields = ('columns', 'mapping', 'date_format', 'decimal', 'thousands', 'sign_convention', 'source')
+        with self.SessionLocal() as session:
+            row = session.execute(
+                select(SchemaProfile).where(SchemaProfile.signature == profile['signature'])
+            ).scalar_one_or_none()
+            if row is None:
+                session.add(SchemaProfile(signature=profile['signature'], **{f: profile[f] for f in fields}))
+            elif row.source == 'user' and profile['source'] != 'user':
+                return
+            else:
+                for f in fields:
+                    setattr(row, f, profile[f])
+            session.commit()
+
+    def delete_profile(self, signature: str) -> None:
+        with self.SessionLocal() as session:
+            row = session.execute(select(SchemaProfile).where(SchemaProfile.signature == signature)).scalar_one_or_none()
+            if row is not None:
+                session.delete(row)
+                session.commit()
+
+    @staticmethod
+    def _profile_dict(row) -> dict:
+        return {
+            'signature': row.signature,
+            'columns': row.columns,
+            'mapping': row.mapping,
+            'date_format': row.date_format,
+            'decimal': row.decimal,
+            'thousands': row.thousands,
+            'sign_convention': row.sign_convention,
+            'source': row.source,
+            'updated_at': row.updated_at,
+        }
+
+    def lookup_resolutions(self, keys, rule_version: str) -> dict:
+        """Cached resolutions for description keys: {key: (merchant, mcc, category, subcategory)}.
+
+        Entries from another rule-set version are stale and skipped, except user corrections.
+        """
+        keys = list(keys)
+        found = {}
+        r = Resolution.__table__.c
+        with self.engine.connect() as conn:
+            for i in range(0, len(keys), LOOKUP_BATCH):
+                rows = conn.execute(
+                    select(r.desc_key, r.merchant, r.mcc, r.category, r.subcategory).where(
+                        r.desc_key.in_(keys[i:i + LOOKUP_BATCH]),
+                        (r.rule_version == rule_version) | (r.source == 'user'),
+                    )
+                )
+                for key, *values in rows:
+                    found[key] = tuple(values)
+        return found
+
+    def store_resolutions(self, resolutions: dict, rule_version: str, source: str = 'rule') -> None:
+        """Upsert {key: (merchant, mcc, category, subcategory)}. Only user entries replace user entries."""
+        if not resolutions:
+            return
+        stmt = sqlite_insert(Resolution.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['desc_key'],
+            set_={c: stmt.excluded[c] for c in ('merchant', 'mcc', 'category', 'subcategory', 'source', 'rule_version', 'updated_at')},
+            where=(Resolution.__table__.c.source != 'user') | (stmt.excluded.source == 'user'),
+        )
+        now = datetime.utcnow()
+        params = [{
+            'desc_key': key, 'merchant': m, 'mcc': mcc, 'category': cat, 'subcategory': sub,
+            'source': source, 'rule_version': rule_version, 'updated_at': now,
+        } for key, (m, mcc, cat, sub) in resolutions.items()]
+        with self.engine.begin() as conn:
+            conn.execute(stmt, params)
+
+    def training_labels(self, rule_version: str) -> pd.DataFrame:
+        """Categorized description keys for the fallback model: current rule and LLM results and user corrections."""
+        r = Resolution.__table__.c
+        stmt = select(r.desc_key, r.category, r.source, r.updated_at).where(
+            r.category.is_not(None),
+            r.category != 'Uncategorized',
+            (r.source.in_(('rule', 'llm')) & (r.rule_version == rule_version)) | (r.source == 'user'),
+        ).order_by(r.updated_at, r.id)
+        with self.engine.connect() as conn:
+            return pd.read_sql(stmt, conn, parse_dates=['updated_at'])
+
+    def clear_resolutions(self, source: str) -> int:
+        """Drop cached resolutions from one source, e.g. 'model' after retraining."""
+        r = Resolution.__table__
+        with self.engine.begin() as conn:
+            return conn.execute(r.delete().where(r.c.source == source)).rowcount
+
+    def get_rule_version(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(select(RuleSetMeta.version).where(RuleSetMeta.id == 1)).scalar() or 0
+
+    def load_rules(self) -> dict:
+        """Rule tables by kind, each a list of (keyword, value) in priority order."""
+        tables = {kind: [] for kind in RULE_KINDS}
+        r = Rule.__table__.c
+        with self.engine.connect() as conn:
+            for kind, keyword, value in conn.execute(select(r.kind, r.keyword, r.value).order_by(r.kind, r.position, r.id)):
+                tables.setdefault(kind, []).append((keyword, value))
+        return tables
+
+    def save_rules(self, tables: dict) -> int:
+        """Replace every rule and bump the version counter. Returns the new version."""
+        rows = [
+            {'kind': kind, 'keyword': keyword, 'value': value, 'position': i}
+            for kind in RULE_KINDS for i, (keyword, value) in enumerate(tables.get(kind, []))
+        ]
+        with self.engine.begin() as conn:
+            conn.execute(Rule.__table__.delete())
+            if rows:
+                conn.execute(Rule.__table__.insert(), rows)
+            meta = RuleSetMeta.__table__
+            version = (conn.execute(select(meta.c.version).where(meta.c.id == 1)).scalar() or 0) + 1
+            conn.execute(sqlite_insert(meta).values(id=1, version=version, updated_at=datetime.utcnow())
+                         .on_conflict_do_update(index_elements=['id'], set_={'version': version, 'updated_at': datetime.utcnow()}))
+        return version
+
+    def distinct_description_keys(self) -> list:
+        """Every normalized description stored or cached (index-only scans)."""
+        t, r = Transaction.__table__.c, Resolution.__table__.c
+        with self.engine.connect() as conn:
+            keys = {k for (k,) in conn.execute(select(t.desc_key).where(t.desc_key.is_not(None)).distinct())}
+            keys.update(k for (k,) in conn.execute(select(r.desc_key)))
+        return sorted(keys)
+
+    def distinct_merchants(self) -> list:
+        """Every merchant name already stored, for the canonical merchant index."""
+        t = Transaction.__table__.c
+        with self.engine.connect() as conn:
+            return [m for (m,) in conn.execute(select(t.merchant).where(t.merchant.is_not(None)).distinct())]
+
+    def retire_resolutions(self, keys, old_version: str, new_version: str) -> None:
+        """After a rule edit: drop cached rule/model results for ``keys``, carry the rest to the new version."""
+        r = Resolution.__table__
+        keys = list(keys)
+        with self.engine.begin() as conn:
+            for i in range(0, len(keys), LOOKUP_BATCH):
+                conn.execute(r.delete().where(r.c.desc_key.in_(keys[i:i + LOOKUP_BATCH]), r.c.source != 'user'))
+            conn.execute(r.update().where(r.c.rule_version == old_version).values(rule_version=new_version))
+
+    def update_resolved(self, resolutions: dict, batch_size: int = 5000) -> int:
+        """Rewrite merchant/mcc/category/subcategory of stored rows by description key.
+
+        ``resolutions`` maps key -> (merchant, mcc, category, subcategory). Each key
+        is one indexed UPDATE; keys are sent in executemany batches.
+        """
+        t = Transaction.__table__
+        stmt = t.update().where(t.c.desc_key == bindparam('key')).values(
+            merchant=bindparam('m'), mcc=bindparam('c'), category=bindparam('cat'), subcategory=bindparam('sub'),
+        )
+        items = list(resolutions.items())
+        updated = 0
+        with self.engine.begin() as conn:
+            for i in range(0, len(items), batch_size):
+                params = [{'key': k, 'm': m, 'c': c, 'cat': cat, 'sub': sub} for k, (m, c, cat, sub) in items[i:i + batch_size]]
+                updated += conn.execute(stmt, params).rowcount
+            if updated:
+                refresh_rollups(conn, self._stored_months(conn, t.c.desc_key, [k for k, _ in items]))
+        return updated
+
+    def correct_categories(self, corrections: dict, rule_version: str) -> int:
+        """Apply user corrections {desc_key: (category, subcategory)} to stored rows and the cache.
+
+        Matching transactions are rewritten and each key gets a ``source='user'``
+        resolution (keeping any cached merchant/MCC), which later imports reuse
+        and the fallback model trains on. Returns the number of rows updated.
+        """
+        if not corrections:
+            return 0
+        t, r = Transaction.__table__, Resolution.__table__
+        params = [{'key': k, 'cat': cat, 'sub': sub} for k, (cat, sub) in corrections.items()]
+        first = select(t.c.merchant, t.c.mcc).where(t.c.desc_key == bindparam('key')).limit(1).subquery()
+        upsert = sqlite_insert(r).values(
+            desc_key=bindparam('key'),
+            merchant=select(first.c.merchant).scalar_subquery(),
+            mcc=select(first.c.mcc).scalar_subquery(),
+            category=bindparam('cat'),
+            subcategory=bindparam('sub'),
+            source='user',
+            rule_version=rule_version,
+            updated_at=datetime.utcnow(),
+        )
+        upsert = upsert.on_conflict_do_update(
+            index_elements=['desc_key'],
+            set_={c: upsert.excluded[c] for c in ('category', 'subcategory', 'source', 'rule_version', 'updated_at')},
+        )
+        rewrite = t.update().where(t.c.desc_key == bindparam('key')).values(category=bindparam('cat'), subcategory=bindparam('sub'))
+        with self.engine.begin() as conn:
+            conn.execute(upsert, params)
+            updated = conn.execute(rewrite, params).rowcount
+            if updated:
+                refresh_rollups(conn, self._stored_months(conn, t.c.desc_key, list(corrections)))
+        return updated
+
+    def update_subcategories(self, mapping: dict) -> int:
+        """Set subcategory for every row of each category in ``mapping`` (None clears it).
+
+        Cached resolutions of those categories are rewritten in the same
+        transaction, so later imports of cached descriptions get the new value.
+        Returns the number of transactions updated.
+        """
+        if not mapping:
+            return 0
+        params = [{'cat': c, 'sub': s} for c, s in mapping.items()]
+        t, r = Transaction.__table__, Resolution.__table__
+        with self.engine.begin() as conn:
+            conn.execute(r.update().where(r.c.category == bindparam('cat')).values(subcategory=bindparam('sub')), params)
+            return conn.execute(t.update().where(t.c.category == bindparam('cat')).values(subcategory=bindparam('sub')), params).rowcount
+
+    def insert_transactions(self, df: pd.DataFrame, batch_rows: Optional[int] = None) -> int:
+        """Insert rows, ignoring any whose key is already stored. Returns the number inserted.
+
+        Parameters are built column-wise and sent as one DBAPI executemany of a
+        Core ``INSERT ... ON CONFLICT DO NOTHING`` per ``batch_rows`` rows
+        (``CONFIG.insert_batch_rows``). Each batch commits together with its
+        search index entries, added in one statement instead of by the per-row
+        trigger, and with its monthly rollups. The keys a batch actually stored
+        then go into the in-memory key filter; ``flush_key_filter`` persists it.
+
+        A bulk load (at least ``CONFIG.bulk_load_rows`` rows and no fewer than
+        are stored) runs as one transaction instead, with the secondary indexes
+        and search trigger dropped while rows go in and rebuilt once at the end.
+        """
+        if df.empty:
+            return 0
+        batch_rows = batch_rows or CONFIG.insert_batch_rows
+        keys = df['tx_key'].to_numpy(dtype=np.int64)
+        columns = _insert_columns(df, keys)
+        compiled = sqlite_insert(Transaction.__table__).on_conflict_do_nothing().compile(
+            dialect=self.engine.dialect, column_keys=list(columns),
+        )
+        values = [columns[name] for name in compiled.positiontup]
+        if len(df) >= CONFIG.bulk_load_rows:
+            with self.engine.begin() as conn:
+                last_id = conn.execute(select(func.max(Transaction.id))).scalar() or 0
+                if len(df) >= last_id:
+                    return self._bulk_load(conn, str(compiled), values, keys, batch_rows, last_id)
+        inserted = 0
+        for start in range(0, len(df), batch_rows):
+            stop = start + batch_rows
+            rows = list(zip(*(col[start:stop] for col in values)))
+            with self.engine.begin() as conn:
+                bloom = self._key_filter_for(conn)
+                last_id = conn.execute(select(func.max(Transaction.id))).scalar() or 0
+                defer_search_index(conn, True)
+                added = conn.exec_driver_sql(str(compiled), rows).rowcount
+                index_new_rows(conn, last_id)
+                add_rollups(conn, last_id)
+                defer_search_index(conn, False)
+                if added == len(rows):
+                    stored = keys[start:stop]
+                else:
+                    # Conflicts were skipped; only the keys of rows this batch stored go into the filter
+                    stored = np.fromiter(
+                        (k for (k,) in conn.execute(select(Transaction.tx_key).where(Transaction.id > last_id))),
+                        dtype=np.int64,
+                    )
+            inserted += added
+            with self._key_filter_lock:
+                bloom.add(stored)
+                self._key_filter_dirty = True
+        return inserted
+
+    def _bulk_load(self, conn, sql: str, values: list, keys: np.ndarray, batch_rows: int, last_id: int) -> int:
+        # One transaction: rows go in without secondary indexes or the search
+        # trigger, then the search index, rollups and indexes are built once
+        bloom = self._key_filter_for(conn)
+        ddl = suspend_secondary_indexes(conn)
+        inserted = 0
+        for start in range(0, len(keys), batch_rows):
+            rows = list(zip(*(col[start:start + batch_rows] for col in values)))
+            inserted += conn.exec_driver_sql(sql, rows).rowcount
+        index_new_rows(conn, last_id)
+        add_rollups(conn, last_id)
+        restore_secondary_indexes(conn, ddl)
+        if inserted == len(keys):
+            stored = keys
+        else:
+            stored = np.fromiter(
+                (k for (k,) in conn.execute(select(Transaction.tx_key).where(Transaction.id > last_id))),
+                dtype=np.int64,
+            )
+        with self._key_filter_lock:
+            bloom.add(stored)
+            self._key_filter_dirty = True
+        return inserted
+
+    def fetch_transactions(
+        self,
+        start_date,
+        end_date,
+        category_contains: str = "",
+        columns: Optional[Sequence[str]] = None,
+        order_by: Optional[str] = None,
+        descending: bool = False,
+        limit: Optional[int] = None,
+        search: str = "",
+    ) -> pd.DataFrame:
+        """Visible (non-duplicate) transactions in a date range as a typed frame.
+
+        Only ``columns`` (default ``FETCH_COLUMNS``) are selected. Cursor rows
+        are read in batches straight into object buffers, bypassing per-row
+        Row/ORM objects, and each column becomes a typed array in one step.
+        Dates come back as raw text and are parsed vectorized, not per row. ``order_by`` names a column (optionally
+        ``descending``); ``limit`` caps the row count.
+        """
+        columns = list(columns or FETCH_COLUMNS)
+        t = Transaction.__table__.c
+        unknown = [c for c in columns + ([order_by] if order_by else []) if c not in t]
+        if unknown:
+            raise ValueError(f"Unknown transaction columns: {unknown}")
+        # Plain text for the date skips SQLAlchemy's per-row DateTime parsing
+        stmt = select(*(type_coerce(t[c], String).label(c) if c == 'date' else t[c] for c in columns)).where(
+            t.duplicate_of.is_(None)
+        )
+        if category_contains:
+            stmt = stmt.where(func.lower(t.category).like(f"%{category_contains.lower()}%"))
+        if search:
+            match = select(_search_index.c.rowid).where(text(f"{SEARCH_TABLE} MATCH :q").bindparams(q=fts_query(search) or '""'))
+            stmt = stmt.where(t.id.in_(match))
+        if order_by:
+            stmt = stmt.order_by(t[order_by].desc() if descending else t[order_by])
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        chunks = []
+        with self.engine.connect() as conn:
+            # A bound outside the stored dates filters nothing; leaving it out lets
+            # SQLite scan the table instead of walking the date index row by row
+            lo, hi = conn.execute(select(func.min(t.date), func.max(t.date))).one()
+            if lo is None or pd.Timestamp(start_date) > pd.Timestamp(lo):
+                stmt = stmt.where(t.date >= start_date)
+            stop = _day_after(end_date)
+            if hi is None or stop <= pd.Timestamp(hi):
+                stmt = stmt.where(t.date < stop.to_pydatetime())
+            result = conn.execute(stmt)
+            cursor = result.cursor
+            while batch := cursor.fetchmany(FETCH_BATCH):
+                chunks.append(np.array(batch, dtype=object).reshape(len(batch), len(columns)))
+            result.close()
+        rows = np.concatenate(chunks) if chunks else np.empty((0, len(columns)), dtype=object)
+        return apply_schema(pd.DataFrame({c: _typed_column(c, rows[:, i]) for i, c in enumerate(columns)}))
+
+    def search_transactions(self, query: str, start_date=None, end_date=None, limit: int = SEARCH_LIMIT) -> pd.DataFrame:
+        """Best matches for free text over description, merchant and category, best first.
+
+        Runs on the FTS5 index (``fts_query`` syntax: "exact phrase", other words
+        by prefix) and ranks by weighted bm25; the ``rank`` column is lower for
+        better matches. A query matching more than ``SEARCH_RANK_MAX`` rows
+        returns the newest matches instead, since scoring them all would take
+        seconds. Merged near duplicates are left out.
+        """
+        match = fts_query(query)
+        columns = list(FETCH_COLUMNS)
+        if not match:
+            return apply_schema(pd.DataFrame({c: _typed_column(c, np.empty(0, dtype=object)) for c in columns + ['rank']}))
+        t = Transaction.__table__.c
+        weights = ', '.join(str(w) for w in SEARCH_WEIGHTS)
+        rank = literal_column(f"bm25({SEARCH_TABLE}, {weights})")
+        matches = text(f"{SEARCH_TABLE} MATCH :q").bindparams(q=match)
+        stmt = (
+            select(*(type_coerce(t[c], String).label(c) if c == 'date' else t[c] for c in columns), rank.label('rank'))
+            .select_from(Transaction.__table__.join(_search_index, _search_index.c.rowid == t.id))
+            .where(matches, t.duplicate_of.is_(None))
+            .limit(limit)
+        )
+        if start_date is not None:
+            stmt = stmt.where(t.date >= start_date)
+        if end_date is not None:
+            stmt = stmt.where(t.date < _day_after(end_date).to_pydatetime())
+        with self.engine.connect() as conn:
+            capped = select(_search_index.c.rowid).where(matches).limit(SEARCH_RANK_MAX + 1).subquery()
+            broad = conn.execute(select(func.count()).select_from(capped)).scalar() > SEARCH_RANK_MAX
+            stmt = stmt.order_by(_search_index.c.rowid.desc() if broad else rank)
+            rows = conn.execute(stmt).all()
+        data = np.array(rows, dtype=object).reshape(len(rows), len(columns) + 1)
+        return apply_schema(pd.DataFrame({c: _typed_column(c, data[:, i]) for i, c in enumerate(columns + ['rank'])}))
+
+    def find_near_duplicates(self, window_days: int = NEAR_DUP_WINDOW_DAYS, threshold: float = NEAR_DUP_THRESHOLD) -> pd.DataFrame:
+        """Near-duplicate pairs among visible rows, for review or ``merge_duplicates``."""
+        stmt = select(
+            Transaction.id, Transaction.date, Transaction.amount, Transaction.account, Transaction.description
+        ).where(Transaction.duplicate_of.is_(None))
+        with self.engine.connect() as conn:
+            df = pd.read_sql(stmt, conn)
+        return find_near_duplicates(df, window_days=window_days, threshold=threshold)
+
+    def merge_duplicates(self, pairs: pd.DataFrame) -> int:
+        """Hide each ``duplicate_id`` behind its ``keep_id``. The row stays stored, so re-imports still dedupe."""
+        if pairs.empty:
+            return 0
+        stmt = (
+            update(Transaction.__table__)
+            .where(Transaction.__table__.c.id == bindparam('dup'), Transaction.__table__.c.duplicate_of.is_(None))
+            .values(duplicate_of=bindparam('keep'))
+        )
+        params = [{'dup': int(d), 'keep': int(k)} for k, d in zip(pairs['keep_id'], pairs['duplicate_id'])]
+        with self.engine.begin() as conn:
+            merged = conn.execute(stmt, params).rowcount
+            if merged:
+                refresh_rollups(conn, self._stored_months(conn, Transaction.__table__.c.id, [p['dup'] for p in params]))
+        return merged
+
+    def link_transfers(self, start_date=None, end_date=None, window_days: int = TRANSFER_WINDOW_DAYS) -> int:
+        """Match unlinked rows dated in [start_date, end_date] (padded by the window) as transfers.
+
+        Only pairs with corroborating descriptions are linked (see ``match_transfers``),
+        and rows the user unlinked before are skipped. Both legs get ``transfer_id``
+        pointing at each other. Returns the number of pairs linked.
+        """
+        t = Transaction.__table__
+        excluded = select(TransferExclusion.__table__.c.tx_id)
+        stmt = select(t.c.id, t.c.date, t.c.amount, t.c.account, t.c.description).where(
+            t.c.duplicate_of.is_(None), t.c.transfer_id.is_(None), t.c.id.not_in(excluded)
+        )
+        pad = pd.Timedelta(days=window_days)
+        if start_date is not None:
+            stmt = stmt.where(t.c.date >= (pd.Timestamp(start_date) - pad).to_pydatetime())
+        if end_date is not None:
+            stmt = stmt.where(t.c.date < (pd.Timestamp(end_date) + pad + pd.Timedelta(days=1)).to_pydatetime())
+        with self.engine.begin() as conn:
+            df = pd.read_sql(stmt, conn)
+            pairs = match_transfers(df, window_days=window_days)
+            if pairs.empty:
+                return 0
+            out_ids, in_ids = pairs['out_id'].tolist(), pairs['in_id'].tolist()
+            link = update(t).where(t.c.id == bindparam('row')).values(transfer_id=bindparam('other'))
+            conn.execute(link, [{'row': int(a), 'other': int(b)} for a, b in zip(out_ids + in_ids, in_ids + out_ids)])
+            linked = pd.to_datetime(df.loc[df['id'].isin(out_ids + in_ids), 'date'])
+            refresh_rollups(conn, linked.dt.strftime('%Y-%m').unique())
+        return len(pairs)
+
+    def list_transfers(self, start_date=None, end_date=None) -> pd.DataFrame:
+        """Linked transfer pairs (outflow leg first) with both descriptions, newest first."""
+        t = Transaction.__table__
+        leg = t.alias('leg')
+        stmt = (
+            select(
+                t.c.id.label('out_id'), leg.c.id.label('in_id'), t.c.date, (-t.c.amount).label('amount'),
+                t.c.account.label('out_account'), leg.c.account.label('in_account'),
+                t.c.description.label('out_description'), leg.c.description.label('in_description'),
+            )
+            .join(leg, leg.c.id == t.c.transfer_id)
+            .where(t.c.amount < 0)
+            .order_by(t.c.date.desc())
+        )
+        if start_date is not None:
+            stmt = stmt.where(t.c.date >= pd.Timestamp(start_date).to_pydatetime())
+        if end_date is not None:
+            stmt = stmt.where(t.c.date < _day_after(end_date).to_pydatetime())
+        with self.engine.connect() as conn:
+            return pd.read_sql(stmt, conn)
+
+    def unlink_transfers(self, ids) -> int:
+        """Unlink the transfer pairs containing ``ids`` and keep both legs out of future matching.
+
+        The rows count as spend and income again. Returns the number of rows unlinked.
+        """
+        t = Transaction.__table__
+        ids = [int(i) for i in ids]
+        if not ids:
+            return 0
+        with self.engine.begin() as conn:
+            legs = set(ids)
+            for i in range(0, len(ids), LOOKUP_BATCH):
+                chunk = ids[i:i + LOOKUP_BATCH]
+                legs.update(r for (r,) in conn.execute(select(t.c.transfer_id).where(t.c.id.in_(chunk), t.c.transfer_id.is_not(None))))
+            legs = sorted(legs)
+            months = self._stored_months(conn, t.c.id, legs)
+            unlinked = 0
+            for i in range(0, len(legs), LOOKUP_BATCH):
+                chunk = legs[i:i + LOOKUP_BATCH]
+                unlinked += conn.execute(update(t).where(t.c.id.in_(chunk), t.c.transfer_id.is_not(None)).values(transfer_id=None)).rowcount
+            conn.execute(
+                sqlite_insert(TransferExclusion.__table__).on_conflict_do_nothing(),
+                [{'tx_id': i} for i in legs],
+            )
+            refresh_rollups(conn, months)
+        return unlinked
+
+    @staticmethod
+    def _stored_months(conn, key_column, values) -> set:
+        """'YYYY-MM' of every transaction whose ``key_column`` is in ``values``."""
+        month = func.substr(type_coerce(Transaction.__table__.c.date, String), 1, 7)
+        values = list(values)
+        months = set()
+        for i in range(0, len(values), LOOKUP_BATCH):
+            stmt = select(month).where(key_column.in_(values[i:i + LOOKUP_BATCH])).distinct()
+            months.update(m for (m,) in conn.execute(stmt))
+        return months
+
+    def rebuild_rollups(self, months=None) -> int:
+        """Recompute the monthly rollups from transactions ('YYYY-MM' ``months``, or all).
+
+        Inserts keep them current; this is for backfills and rows written
+        outside the repository. Returns the number of rollup rows stored.
+        """
+        with self.engine.begin() as conn:
+            refresh_rollups(conn, months)
+            return conn.exec_driver_sql("SELECT count(*) FROM rollups").scalar()
+
+    def rollup_summary(self, start_date=None, end_date=None) -> pd.DataFrame:
+        """Aggregates per (month, account, category, merchant, sign) for whole days [start_date, end_date].
+
+        Months wholly inside the range are read from the rollups; the partial
+        months at either end are grouped from their transactions the same way,
+        so the result equals grouping every visible, non-transfer row in the
+        range. ``month`` is the month start; missing key parts are None.
+        """
+        lo = pd.Timestamp(start_date).normalize() if start_date is not None else None
+        hi = _day_after(end_date) if end_date is not None else None
+        first = lo if lo is None or lo.day == 1 else lo + pd.offsets.MonthBegin()
+        stop = hi.to_period('M').start_time if hi is not None else None
+        between = 'date >= ? AND date < ?'
+        with self.engine.connect() as conn:
+            if first is not None and stop is not None and first >= stop:
+                rows = rollup_rows(conn, between, (_day(lo), _day(hi)))
+            else:
+                bounds = [(op, b.strftime('%Y-%m')) for op, b in (('>=', first), ('<', stop)) if b is not None]
+                where = ' AND '.join(f"month {op} ?" for op, _ in bounds) or '1'
+                rows = conn.exec_driver_sql(
+                    f"SELECT {', '.join(ROLLUP_KEYS + ROLLUP_MEASURES)} FROM rollups WHERE {where}", tuple(b for _, b in bounds)
+                ).all()
+                if lo is not None and lo < first:
+                    rows += rollup_rows(conn, between, (_day(lo), _day(first)))
+                if hi is not None and stop < hi:
+                    rows += rollup_rows(conn, between, (_day(stop), _day(hi)))
+        out = pd.DataFrame(rows, columns=list(ROLLUP_KEYS + ROLLUP_MEASURES)).astype(
+            {'sign': 'int64', 'row_count': 'int64', **{c: 'float64' for c in ROLLUP_MEASURES[1:]}}
+        )
+        out['month'] = pd.to_datetime(out['month'], format='%Y-%m')
+        for col in ('account', 'category', 'merchant'):
+            out[col] = out[col].astype(object).mask(out[col] == '')
+        return out
+
+    def debit_outliers(self, start_date, end_date, threshold: float, limit: int = ANOMALY_LIMIT) -> pd.DataFrame:
+        """Visible, non-transfer debits below ``threshold`` dated in whole days [start_date, end_date], lowest first."""
+        t = Transaction.__table__.c
+        columns = list(FETCH_COLUMNS)
+        stmt = (
+            select(*(type_coerce(t[c], String).label(c) if c == 'date' else t[c] for c in columns))
+            .where(t.duplicate_of.is_(None), t.transfer_id.is_(None), t.amount < threshold)
+            .order_by(t.amount)
+            .limit(limit)
+        )
+        # Unary + keeps SQLite off the date index, so it walks the amount index
+        # from the lowest debit and stops after ``limit`` rows in range
+        if start_date is not None:
+            stmt = stmt.where(text("+transactions.date >= :lo").bindparams(lo=_day(pd.Timestamp(start_date))))
+        if end_date is not None:
+            stmt = stmt.where(text("+transactions.date < :hi").bindparams(hi=_day(_day_after(end_date))))
+        with self.engine.connect() as conn:
+            rows = conn.execute(stmt).all()
+        data = np.array(rows, dtype=object).reshape(len(rows), len(columns))
+        return apply_schema(pd.DataFrame({c: _typed_column(c, data[:, i]) for i, c in enumerate(columns)}))
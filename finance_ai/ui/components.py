@@ -1,7 +1,16 @@
+import json
+
 import streamlit as st
 import pandas as pd
 import altair as alt
 
+from finance_ai.config import CONFIG
+from finance_ai.ingestion.profiles import SIGN_CONVENTIONS
+from finance_ai.intelligence.categorizer import correct_categories, update_rules
+from finance_ai.intelligence.ml_categorizer import train_in_background
+from finance_ai.intelligence.rules import RULE_KINDS, active_rules
+from finance_ai.processing.dedupe import NEAR_DUP_THRESHOLD, NEAR_DUP_WINDOW_DAYS
+
 
 def render_overview_cards(metrics: dict):
     total_spend = metrics.get('total_spend', 0.0)
@@ -43,12 +52,160 @@ def render_charts(df: pd.DataFrame, metrics: dict):
         st.dataframe(anomalies[['date','description','amount','category','merchant']].sort_values('amount'))
 
 
-def render_transactions_table(df: pd.DataFrame):
+def render_transactions_table(df: pd.DataFrame, ranked: bool = False, repo=None):
     if df is None or df.empty:
         st.info("No transactions in the selected period.")
         return
+    df = df.drop(columns='rank') if ranked else df.sort_values('date', ascending=False)
+    if repo is None:
+        st.dataframe(df, use_container_width=True, height=420)
+        return
+    # Category is editable; a correction applies to every row with the same description
+    categories = sorted({v for _, v in active_rules().tables['category']} | set(df['category'].dropna().astype(str)))
+    df = editable_categories(df)
+    edited = st.data_editor(
+        df,
+        use_container_width=True,
+        height=420,
+        disabled=[c for c in df.columns if c != 'category'],
+        column_config={'category': st.column_config.SelectboxColumn("category", options=categories)},
+        key="tx_editor",
+    )
+    corrections = category_corrections(df, edited)
+    if corrections and st.button(f"Save {len(corrections)} category corrections", key="tx_correct"):
+        updated = correct_categories(repo, corrections)
+        train_in_background(repo)
+        st.success(f"Updated {updated} transactions; the category model is retraining in the background.")
+
+
+def editable_categories(df: pd.DataFrame) -> pd.DataFrame:
+    # A Categorical column only accepts its existing categories, so picking a new one would fail
+    return df.assign(category=df['category'].astype(object))
+
+
+def category_corrections(df: pd.DataFrame, edited: pd.DataFrame) -> dict:
+    """{description: category} for the rows whose category was changed in the editor."""
+    changed = edited['category'].ne(df['category']) & edited['category'].notna()
+    return dict(zip(edited.loc[changed, 'description'], edited.loc[changed, 'category']))
+
+def render_bank_profiles(repo):
+    profiles = repo.list_profiles()
+    if not profiles:
+        st.caption("No bank layouts learned yet. They are recorded the first time a CSV layout is ingested.")
+        return
     st.dataframe(
-        df.sort_values('date', ascending=False),
+        pd.DataFrame(profiles)[['signature', 'date_format', 'decimal', 'thousands', 'sign_convention', 'source', 'updated_at']],
+        use_container_width=True,
+    )
+    by_sig = {p['signature']: p for p in profiles}
+    sig = st.selectbox("Profile", list(by_sig), key="profile_select")
+    p = by_sig[sig]
+    with st.form("profile_override"):
+        date_format = st.text_input("Date format (strftime)", value=p['date_format'] or "")
+        c1, c2, c3 = st.columns(3)
+        decimal = c1.text_input("Decimal separator", value=p['decimal'])
+        thousands = c2.text_input("Thousands separator", value=p['thousands'] or "")
+        sign = c3.selectbox("Sign convention", SIGN_CONVENTIONS, index=SIGN_CONVENTIONS.index(p['sign_convention']))
+        mapping = st.text_area("Column mapping (source column -> canonical)", value=json.dumps(p['mapping'], indent=2))
+        if st.form_submit_button("Save override"):
+            try:
+                repo.save_profile({
+                    **p,
+                    'mapping': json.loads(mapping),
+                    'date_format': date_format or None,
+                    'decimal': decimal or ".",
+                    'thousands': thousands or None,
+                    'sign_convention': sign,
+                    'source': 'user',
+                })
+                st.success("Profile saved.")
+            except ValueError as e:
+                st.error(f"Invalid mapping: {e}")
+    if st.button("Forget this profile", key="profile_delete"):
+        repo.delete_profile(sig)
+        st.success("Profile removed; it will be re-learned on the next upload.")
+
+
+def render_near_duplicates(repo):
+    c1, c2 = st.columns(2)
+    window = c1.number_input("Day window", min_value=0, max_value=30, value=NEAR_DUP_WINDOW_DAYS, key="dup_window")
+    threshold = c2.slider("Description similarity", 0.5, 1.0, NEAR_DUP_THRESHOLD, 0.05, key="dup_threshold")
+    # The scan reads every transaction, so it runs on request rather than on each rerun
+    if st.button("Find duplicates", key="dup_find"):
+        st.session_state["dup_pairs"] = repo.find_near_duplicates(window_days=int(window), threshold=threshold)
+    pairs = st.session_state.get("dup_pairs")
+    if pairs is None:
+        st.caption("Scan stored transactions for charges that appear twice.")
+        return
+    if pairs.empty:
+        st.caption("No near-duplicate transactions found.")
+        return
+    pairs = pairs.copy()
+    pairs.insert(0, 'merge', False)
+    edited = st.data_editor(
+        pairs,
+        use_container_width=True,
+        hide_index=True,
+        disabled=[c for c in pairs.columns if c != 'merge'],
+        key="dup_editor",
+    )
+    if st.button("Merge selected", key="dup_merge"):
+        merged = repo.merge_duplicates(edited[edited['merge']])
+        # Merged rows are hidden now; the next scan starts from the new state
+        del st.session_state["dup_pairs"]
+        st.success(f"Merged {merged} duplicate transactions.")
+
+
+def render_transfers(repo):
+    pairs = repo.list_transfers()
+    if pairs.empty:
+        st.caption("No linked transfers.")
+        return
+    pairs.insert(0, 'unlink', False)
+    edited = st.data_editor(
+        pairs,
         use_container_width=True,
-        height=420
+        hide_index=True,
+        disabled=[c for c in pairs.columns if c != 'unlink'],
+        key="transfer_editor",
+    )
+    if st.button("Unlink selected", key="transfer_unlink"):
+        unlinked = repo.unlink_transfers(edited.loc[edited['unlink'], 'out_id'])
+        st.success(f"Unlinked {unlinked // 2} transfers; they count as spending and income again.")
+
+
+def render_rules_editor(repo):
+    tables = repo.load_rules()
+    rows = [{'kind': kind, 'keyword': k, 'value': v} for kind in RULE_KINDS for k, v in tables.get(kind, [])]
+    st.caption(
+        f"Rules version {repo.get_rule_version()}. Within each kind the first matching keyword wins; "
+        "'subcategory' rows map a category (keyword) to its subcategory (value)."
     )
+    edited = st.data_editor(
+        pd.DataFrame(rows, columns=['kind', 'keyword', 'value']),
+        num_rows="dynamic",
+        use_container_width=True,
+        hide_index=True,
+        column_config={'kind': st.column_config.SelectboxColumn("kind", options=list(RULE_KINDS), required=True)},
+        key="rules_editor",
+    )
+    if st.button("Save rules", key="rules_save"):
+        edited = edited.dropna(subset=['kind', 'keyword', 'value'])
+        new_tables, duplicates = {}, []
+        for kind, group in edited.groupby('kind', sort=False):
+            # A keyword may appear once per kind; the first row wins, as it would when matching
+            pairs = {}
+            for k, v in zip(group['keyword'], group['value']):
+                k = str(k).strip().lower() if kind != 'subcategory' else str(k).strip()
+                if k in pairs:
+                    duplicates.append(f"{kind}: {k}")
+                else:
+                    pairs[k] = str(v).strip()
+            new_tables[kind] = list(pairs.items())
+        if duplicates:
+            st.warning("Kept the first row for duplicate keywords: " + ", ".join(duplicates))
+        result = update_rules(repo, new_tables, CONFIG.category_model_path)
+        st.success(
+            f"Saved rules version {result['version']}: re-categorized {result['rows']} transactions "
+            f"across {result['descriptions']} descriptions."
+        )
@@ -0,0 +1,30 @@
+import datetime
+
+import pytest
+
+from finance_ai.ingestion.pipeline import IngestionPipeline
+from finance_ai.intelligence.categorizer import correct_categories
+from finance_ai.storage.db import init_db
+from finance_ai.storage.repository import TransactionRepository
+
+from test_pipeline import _frame
+
+components = pytest.importorskip("finance_ai.ui.components", exc_type=ImportError)
+
+
+def test_correction_to_a_category_not_in_the_frame(tmp_path):
+    engine, SessionLocal = init_db(str(tmp_path / "finance.db"))
+    repo = TransactionRepository(engine=engine, SessionLocal=SessionLocal)
+    repo.insert_transactions(IngestionPipeline(repo).prepare(_frame()))
+    df = repo.fetch_transactions(datetime.date(2025, 1, 1), datetime.date(2025, 1, 31))
+    assert 'Travel' not in set(df['category'].dropna())
+
+    df = components.editable_categories(df)
+    edited = df.copy()
+    edited.loc[edited['description'] == 'STARBUCKS 1234', 'category'] = 'Travel'
+    corrections = components.category_corrections(df, edited)
+    assert corrections == {'STARBUCKS 1234': 'Travel'}
+
+    assert correct_categories(repo, corrections) == 1
+    df = repo.fetch_transactions(datetime.date(2025, 1, 1), datetime.date(2025, 1, 31))
+    assert df.loc[df['description'] == 'STARBUCKS 1234', 'category'].iloc[0] == 'Travel'
@@ -0,0 +1,29 @@
+import pandas as pd
+
+from finance_ai.ingestion.pipeline import IngestionPipeline
+
+
+def _frame():
+    return pd.DataFrame({
+        'date': ['2025-01-02', '2025-01-03', '2025-01-03'],
+        'description': ['STARBUCKS 1234', 'AMAZON Mktp US*AB12', 'Payroll ACME Corp'],
+        'amount': [-4.75, -23.40, 2500.00],
+        'type': ['debit', 'debit', 'credit'],
+        'account': ['Checking'] * 3,
+        'currency': ['USD'] * 3,
+    })
+
+
+def test_prepare_without_repo():
+    pipeline = IngestionPipeline()
+    out = pipeline.prepare(_frame())
+    assert len(out) == 3
+    assert out.loc[out['description'] == 'STARBUCKS 1234', 'category'].iloc[0] == 'Coffee'
+    # Keys from the first call count as known
+    assert pipeline.prepare(_frame()).empty
+
+
+def test_prepare_with_explicit_seen_set():
+    seen = set()
+    assert len(IngestionPipeline().prepare(_frame(), seen=seen)) == 3
+    assert len(seen) == 3
@@ -0,0 +1,39 @@
+import io
+
+from finance_ai.ingestion.profiles import header_signature, profile_for
+
+EUROPEAN = (
+    "date;description;amount;type;account\n"
+    "05.01.2024;REWE Markt;1.234,50;debit;Giro\n"
+    "06.01.2024;Gehalt;2.500,00;credit;Giro\n"
+).encode("latin-1")
+US = (
+    b'date,description,amount,type,account\n'
+    b'2024-02-01,Coffee,-4.50,debit,chk\n'
+    b'2024-02-02,Rent,"-1,234.50",debit,chk\n'
+)
+HEADER = ["date", "description", "amount", "type", "account"]
+
+
+def test_signature_includes_delimiter():
+    assert header_signature(HEADER, ";") != header_signature(HEADER, ",")
+
+
+def test_stored_profile_that_does_not_fit_is_reinferred():
+    european, is_new, mismatch = profile_for(io.BytesIO(EUROPEAN), {}.get)
+    assert is_new and mismatch is None
+    assert (european.decimal, european.thousands, european.date_format) == (",", ".", "%d.%m.%Y")
+    # The same profile stored under the header alone, as before delimiters were part of the key
+    stored = {header_signature(HEADER): {**european.model_dump(), "signature": header_signature(HEADER)}}
+    profile, is_new, mismatch = profile_for(io.BytesIO(US), stored.get)
+    assert is_new and mismatch is not None
+    assert (profile.decimal, profile.thousands, profile.date_format) == (".", ",", "%Y-%m-%d")
+    assert profile.signature == header_signature(HEADER, ",")
+
+
+def test_stored_profile_that_fits_is_used():
+    european, _, _ = profile_for(io.BytesIO(EUROPEAN), {}.get)
+    stored = {european.signature: european.model_dump()}
+    profile, is_new, mismatch = profile_for(io.BytesIO(EUROPEAN), stored.get)
+    assert not is_new and mismatch is None
+    assert profile == european